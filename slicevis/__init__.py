@@ -1,5 +1,9 @@
-__all__ = ["image", "load", "plot", "stats", "widget", "utilities"]
+__all__ = ["image", "load", "metrics", "plot", "stats", "widget", "utilities"]
 
 from .image import Image
 from .load import load_image
-from .widget import SliceWidget
+from .diskcache import VolumeCache
+from .stream import NiftiStream
+from .metrics import compare_segmentations
+from .render import SliceRenderer, export_slices
+from .widget import SliceWidget, OrthogonalView
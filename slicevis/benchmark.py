@@ -0,0 +1,348 @@
+import contextlib
+import io
+import os
+import platform
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+import nibabel
+import numpy as np
+import plotly.io as pio
+from slicevis.cache import payload_nbytes
+from slicevis.load import load_image
+from slicevis.metrics import compare_segmentations
+from slicevis.render import overlay_rgba
+from slicevis.transport import colorscale_lut, encode_image, render_rgb
+
+__all__ = ["synthetic_volumes", "run_benchmarks"]
+
+_AXES = {0: "sagittal", 1: "coronal", 2: "axial"}
+
+
+def synthetic_volumes(shape=(256, 256, 160), num_classes=8, seed=0):
+    """Generates an image with a segmentation and a slightly different validation.
+
+    The image is a smooth intensity ramp with noise, the segmentation consists of
+    one random ellipsoid per class (later classes overwrite earlier ones) and the
+    validation segmentation is the segmentation shifted by one voxel along every axis.
+
+    Args:
+        shape (tuple, optional): volume shape. Defaults to (256, 256, 160).
+        num_classes (int, optional): number of classes besides unclassified.
+            Defaults to 8.
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        tuple: (int16 image, uint8 segmentation, uint8 validation) 3D volumes
+    """
+    rng = np.random.default_rng(seed)
+    grid = np.ogrid[tuple(slice(0, n) for n in shape)]
+    image = sum(g * (200.0 / n) for g, n in zip(grid, shape))
+    image = (image + rng.normal(0, 50, shape)).astype(np.int16)
+
+    seg = np.zeros(shape, dtype=np.uint8)
+    for c in range(1, num_classes + 1):
+        center = [rng.uniform(0.2, 0.8) * n for n in shape]
+        radii = [rng.uniform(0.05, 0.2) * n for n in shape]
+        inside = sum(((g - m) / r) ** 2 for g, m, r in zip(grid, center, radii)) <= 1
+        seg[inside] = c
+    validation = np.roll(seg, 1, axis=(0, 1, 2))
+    return image, seg, validation
+
+
+def run_benchmarks(
+    shape=(256, 256, 160),
+    num_classes=8,
+    repeat=5,
+    scrub_steps=32,
+    examples=None,
+    widget_options=None,
+):
+    """Runs the benchmark suite headless (without a browser or Jupyter kernel).
+
+    Synthetic volumes are written as NIfTI files to a temporary directory and
+    loaded like user data. The suite times loading (with the peak of traced memory),
+    widget construction, axis switches, slider scrubbing with a cold and a warm slice
+    cache, overlay construction, the metrics of the validation segmentation and
+    reports the payload size per frame of every transport. Segmentation pairs in the
+    examples directory are loaded and compared as well.
+
+    Args:
+        shape (tuple, optional): shape of the synthetic volumes. Defaults to
+            (256, 256, 160).
+        num_classes (int, optional): number of synthetic classes. Defaults to 8.
+        repeat (int, optional): repetitions of every timing. Defaults to 5.
+        scrub_steps (int, optional): consecutive slices per scrubbing pass.
+            Defaults to 32.
+        examples (str, optional): directory of the bundled example data. Defaults
+            to None (skipped).
+        widget_options (dict, optional): arguments of SliceWidget. Defaults to
+            synchronous updates (debounce 0) without prefetching and previews.
+
+    Returns:
+        dict: "environment", "config" and "results", a list of records with the
+            benchmark and case names, timing statistics in seconds and extra
+            measurements (JSON serializable)
+    """
+    config = {
+        "shape": list(shape),
+        "num_classes": num_classes,
+        "repeat": repeat,
+        "scrub_steps": scrub_steps,
+        "widget_options": dict(
+            {"debounce": 0, "prefetch_depth": 0, "pyramid_levels": 0},
+            **(widget_options or {}),
+        ),
+    }
+    results = []
+    image, seg, validation = synthetic_volumes(shape, num_classes)
+    with tempfile.TemporaryDirectory() as directory:
+        files = {}
+        for name, volume in (
+            ("image", image),
+            ("segmentation", seg),
+            ("validation", validation),
+        ):
+            files[name] = os.path.join(directory, name + ".nii.gz")
+            nibabel.save(nibabel.Nifti1Image(volume, np.eye(4)), files[name])
+
+        for name, file in files.items():
+            results += _load_benchmarks("synthetic " + name, file, repeat)
+        results += _widget_benchmarks(
+            files, config["widget_options"], repeat, scrub_steps
+        )
+        results.append(
+            _record(
+                "metrics",
+                "synthetic",
+                _timed(lambda: compare_segmentations(seg, validation), repeat),
+            )
+        )
+    if examples is not None:
+        results += _example_benchmarks(examples, repeat)
+    return {"environment": _environment(), "config": config, "results": results}
+
+
+def _widget_benchmarks(files, options, repeat, scrub_steps):
+    """Benchmarks of SliceWidget navigation with synthetic data."""
+    from slicevis.widget import SliceWidget  # imports ipywidgets and plotly widgets
+
+    results = []
+    image3D = load_image(files["image"]).get_timepoint(0)
+
+    def construct():
+        with contextlib.redirect_stdout(io.StringIO()):  # headless display
+            return SliceWidget(image3D, **options)
+
+    results.append(_record("widget", "construct", _timed(construct, repeat)))
+    widget = construct()
+    for layer in ("segmentation", "validation"):
+        is_validation = layer == "validation"
+        start = time.perf_counter()
+        widget._run_load(files[layer], is_validation, threading.Event())
+        results.append(
+            _record("widget", "load " + layer, [time.perf_counter() - start])
+        )
+
+    # axis switches (cold cache), as clicks on the axis buttons
+    buttons = {0: widget.b_sagittal, 1: widget.b_coronal, 2: widget.b_axial}
+    for axis in (0, 1, 2):
+        times = []
+        for _ in range(repeat):
+            buttons[(axis + 1) % 3].click()
+            widget._cache.clear()
+            start = time.perf_counter()
+            buttons[axis].click()
+            if widget._shown[0] != axis:  # slider value unchanged: no update yet
+                widget._update2D(None)
+            times.append(time.perf_counter() - start)
+        results.append(_record("axis switch", _AXES[axis], times))
+
+    # slider scrubbing, every step renders synchronously without debounce
+    for axis in (0, 1, 2):
+        buttons[axis].click()
+        size = widget._view_shape()[axis]
+        first = max(0, size // 2 - scrub_steps // 2)
+        indices = list(range(first, min(size, first + scrub_steps)))
+        outside = first - 1 if first > 0 else min(size - 1, indices[-1] + 1)
+        for case in ("cold", "warm"):
+            times = []
+            widget.slider.value = outside  # every step below changes the slice
+            if case == "cold":
+                widget._cache.clear()
+            for i in indices:
+                start = time.perf_counter()
+                widget.slider.value = i
+                times.append(time.perf_counter() - start)
+            results.append(
+                _record("scrub", _AXES[axis] + " " + case, times, steps=len(indices))
+            )
+
+    # overlay construction and payload per frame
+    window = widget._window
+    lut = colorscale_lut("gray")
+    for axis in (0, 1, 2):
+        index = widget._view_shape()[axis] // 2
+        frame = widget._prepare_frame(axis, index)
+        results.append(
+            _record(
+                "prepare frame",
+                _AXES[axis],
+                _timed(lambda: widget._prepare_frame(axis, index), repeat),
+                frame_bytes=payload_nbytes(frame),
+            )
+        )
+        results.append(
+            _record(
+                "overlay image",
+                _AXES[axis],
+                _timed(lambda: widget._overlay_payload(frame), repeat),
+            )
+        )
+        results.append(
+            _record(
+                "overlay markers",
+                _AXES[axis],
+                _timed(lambda: widget._marker_payload(frame), repeat),
+            )
+        )
+        layers = [
+            (frame["validation"], widget._lut_validation, None),
+            (frame["seg"], widget._lut, None),
+        ]
+        results.append(
+            _record(
+                "overlay outline",
+                _AXES[axis],
+                _timed(lambda: overlay_rgba(layers, outline=True), repeat),
+            )
+        )
+
+        buttons[axis].click()
+        widget.slider.value = index
+        payload = {"json": len(pio.to_json(widget.widget))}
+        rgb = render_rgb(frame["image"], *window, lut, frame.get("overlay"))
+        for transport in ("png", "jpeg"):
+            payload[transport] = len(encode_image(rgb, transport))
+        # PNG overlay layer of the json transport: filled regions vs. outlines
+        for mode, outline in (("filled overlay", False), ("outline overlay", True)):
+            rgba = overlay_rgba(layers, outline=outline)
+            if rgba is not None:
+                payload[mode] = len(encode_image(rgba, "png"))
+        results.append(_record("payload", _AXES[axis], [], bytes=payload))
+
+    results.append(
+        _record("metrics", "widget", _timed(widget._compute_dice_score, repeat))
+    )
+    stats = widget.get_stats()  # the widget's own instrumentation of all runs
+    results.append(_record("widget stages", "all", [], **stats))
+    widget._prefetcher.shutdown()
+    return results
+
+
+def _example_benchmarks(examples, repeat):
+    """Loads the bundled example files and compares the lung segmentation pair."""
+    results = []
+    for name in sorted(os.listdir(examples)):
+        if name.endswith((".nii", ".nii.gz", ".gff", ".segff")):
+            is_segmentation = "label" in name or "prediction" in name
+            is_segmentation = is_segmentation or name.endswith(".segff")
+            file = os.path.join(examples, name)
+            results += _load_benchmarks(name, file, repeat, is_segmentation)
+
+    prediction = os.path.join(examples, "lung_prediction.nii.gz")
+    reference = os.path.join(examples, "lung_label.nii.gz")
+    if os.path.exists(prediction) and os.path.exists(reference):
+        pred = load_image(prediction, is_segmentation=True).get_timepoint(0)
+        ref = load_image(reference, is_segmentation=True).get_timepoint(0)
+        results.append(
+            _record(
+                "metrics",
+                "lung example",
+                _timed(lambda: compare_segmentations(pred, ref), repeat),
+            )
+        )
+    return results
+
+
+def _load_benchmarks(case, file, repeat, is_segmentation=None):
+    """Times load_image in the default, lazy and (for segmentations) sparse mode."""
+    if is_segmentation is None:
+        is_segmentation = "image" not in case
+    modes = {"default": {}, "lazy": {"lazy": True}}
+    if is_segmentation:
+        modes["sparse"] = {"sparse": True}
+    results = []
+    for mode, options in modes.items():
+        times, peaks = [], []
+        for _ in range(repeat):
+            tracemalloc.start()
+            start = time.perf_counter()
+            image = load_image(file, is_segmentation=is_segmentation, **options)
+            times.append(time.perf_counter() - start)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            del image
+        results.append(
+            _record(
+                "load",
+                case + " " + mode,
+                times,
+                file_bytes=os.path.getsize(file),
+                peak_bytes=max(peaks),
+            )
+        )
+    return results
+
+
+def _timed(function, repeat):
+    """Calls a function repeatedly and returns the durations in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _record(benchmark, case, times, **extra):
+    """Builds a result record with timing statistics."""
+    record = {"benchmark": benchmark, "case": case, "n": len(times)}
+    if times:
+        record["seconds"] = {
+            "min": min(times),
+            "median": statistics.median(times),
+            "mean": statistics.mean(times),
+            "max": max(times),
+        }
+    record.update(extra)
+    return record
+
+
+def _environment():
+    """Describes the software and hardware of a run."""
+    try:
+        from importlib.metadata import version
+
+        slicevis_version = version("slicevis")
+    except Exception:  # not installed, e.g. run from a source tree
+        slicevis_version = None
+    environment = {
+        "slicevis": slicevis_version,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    try:
+        import resource
+
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        environment["max_rss_kib"] = usage.ru_maxrss  # KiB on Linux
+    except ImportError:  # not available on Windows
+        pass
+    return environment
+
@@ -0,0 +1,105 @@
+from collections import OrderedDict
+import threading
+import numpy as np
+
+__all__ = ["SliceCache"]
+
+
+class SliceCache:
+    """Bounded least-recently-used cache for prepared slices."""
+
+    def __init__(self, max_bytes=256 * 2**20) -> None:
+        """Constructor
+
+        Args:
+            max_bytes (int, optional): memory budget in bytes, 0 disables caching.
+                Defaults to 256 MiB.
+        """
+        self.max_bytes = int(max_bytes)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (payload, nbytes)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """Returns a cached payload and marks it as recently used.
+
+        Args:
+            key (hashable): the cache key
+
+        Returns:
+            object: the payload (None if not cached)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, payload):
+        """Stores a payload and evicts the least recently used entries beyond the budget.
+
+        Payloads larger than the whole budget are not stored.
+
+        Args:
+            key (hashable): the cache key
+            payload (object): the payload, its size is estimated by payload_nbytes
+        """
+        nbytes = payload_nbytes(payload)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (payload, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+
+    def clear(self):
+        """Removes all entries."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def hit_rate(self):
+        """Returns the fraction of lookups that were answered from the cache.
+
+        Returns:
+            float: hit rate in [0, 1] (0 if there were no lookups)
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def payload_nbytes(payload):
+    """Estimates the memory used by the arrays and encoded data in a (nested) payload.
+
+    Args:
+        payload (object): ndarray, str or bytes (e.g. base64 encoded images), or
+            dict/list/tuple containing them
+
+    Returns:
+        int: number of bytes
+    """
+    if isinstance(payload, np.ndarray):
+        return payload.nbytes
+    if isinstance(payload, (str, bytes)):
+        return len(payload)
+    if isinstance(payload, dict):
+        return sum(payload_nbytes(value) for value in payload.values())
+    if isinstance(payload, (list, tuple)):
+        return sum(payload_nbytes(value) for value in payload)
+    return 0
@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import sys
+import pandas as pd
+from slicevis.metrics import evaluate_cohort
+
+__all__ = ["evaluate_main", "benchmark_main"]
+
+
+def evaluate_main(argv=None):
+    """Console script slicevis-evaluate: Dice and other metrics of a cohort.
+
+    The file pairs are given on the command line (prediction, reference, prediction,
+    reference, ...) or as a CSV file with the columns prediction and reference (and
+    optionally case). The tidy table of evaluate_cohort is written as CSV and the mean
+    Dice per class is printed. Cases that could not be evaluated are listed on stderr
+    (exit status 1), the others are written nevertheless.
+
+    Args:
+        argv (list, optional): command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: exit status
+    """
+    parser = argparse.ArgumentParser(
+        prog="slicevis-evaluate",
+        description="Computes per-class overlap metrics of segmentation file pairs.",
+    )
+    parser.add_argument(
+        "files", nargs="*", help="prediction and reference files, alternating"
+    )
+    parser.add_argument(
+        "--pairs", help="CSV file with the columns prediction, reference (and case)"
+    )
+    parser.add_argument("-o", "--output", default="metrics.csv", help="output CSV file")
+    parser.add_argument(
+        "-j", "--processes", type=int, default=None, help="number of processes"
+    )
+    parser.add_argument(
+        "--ignore",
+        type=int,
+        nargs="*",
+        default=[0],
+        help="class indices to leave out (default: 0)",
+    )
+    parser.add_argument(
+        "--dense", action="store_true", help="load segmentations densely"
+    )
+    args = parser.parse_args(argv)
+
+    if len(args.files) % 2:
+        parser.error("files must be given as prediction/reference pairs")
+    pairs = list(zip(args.files[0::2], args.files[1::2]))
+    cases = None
+    if args.pairs is not None:
+        table = pd.read_csv(args.pairs)
+        pairs += list(zip(table["prediction"], table["reference"]))
+        if "case" in table and not args.files:
+            cases = list(table["case"].astype(str))
+    if not pairs:
+        parser.error("no file pairs given")
+
+    metrics = evaluate_cohort(
+        pairs,
+        cases,
+        ignore=tuple(args.ignore),
+        processes=args.processes,
+        sparse=not args.dense,
+    )
+    metrics.to_csv(args.output, index=False)
+    if "dice" in metrics:  # not if every case failed
+        print(metrics.groupby("class", sort=False)["dice"].mean().to_string())
+    if "error" in metrics:
+        failed = metrics[metrics["error"].notna()]
+        for case, error in zip(failed["case"], failed["error"]):
+            print("Failed " + str(case) + ": " + str(error), file=sys.stderr)
+        return 1
+    return 0
+
+
+def benchmark_main(argv=None):
+    """Console script slicevis-benchmark: runs the benchmark suite headless.
+
+    The results are written as JSON (see run_benchmarks), so that runs of different
+    versions can be compared.
+
+    Args:
+        argv (list, optional): command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: exit status
+    """
+    from slicevis.benchmark import run_benchmarks  # imports the widget modules
+
+    parser = argparse.ArgumentParser(
+        prog="slicevis-benchmark",
+        description="Times loading, navigation and overlays with synthetic data.",
+    )
+    parser.add_argument(
+        "--shape",
+        type=int,
+        nargs=3,
+        default=[256, 256, 160],
+        help="shape of the synthetic volumes",
+    )
+    parser.add_argument("--classes", type=int, default=8, help="number of classes")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions")
+    parser.add_argument(
+        "--scrub-steps", type=int, default=32, help="slices per scrubbing pass"
+    )
+    parser.add_argument(
+        "--examples",
+        default="examples" if os.path.isdir("examples") else None,
+        help="directory of the example data (default: ./examples if present)",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=["json", "png", "jpeg"],
+        default="json",
+        help="transport of the benchmarked widget",
+    )
+    parser.add_argument("-o", "--output", help="output JSON file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        tuple(args.shape),
+        args.classes,
+        args.repeat,
+        args.scrub_steps,
+        args.examples,
+        {"transport": args.transport},
+    )
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(evaluate_main())
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+__all__ = ["VolumeCache", "CacheEntry"]
+
+
+class VolumeCache:
+    """Persistent on-disk cache of decoded volumes and data derived from them.
+
+    Every entry is a directory named after the source path, its modification time,
+    its size and the decoding options. It holds the decoded 4D volume as a .npy file,
+    which is opened memory-mapped, the image metadata and any number of derived
+    arrays (e.g. label indices). When the cache grows beyond its budget, the least
+    recently used entries are deleted.
+    """
+
+    def __init__(self, directory, max_bytes=16 * 2**30) -> None:
+        """Constructor
+
+        Args:
+            directory (str): the cache directory (created if missing)
+            max_bytes (int, optional): size budget in bytes. Defaults to 16 GiB.
+        """
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = int(max_bytes)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def entry(self, filename, **options):
+        """Returns the entry of a source file (which may not be stored yet).
+
+        Args:
+            filename (str): the source file
+            options: decoding options that change the stored volume (e.g. dtype)
+
+        Returns:
+            CacheEntry: the entry
+        """
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        source = {
+            "path": path,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "options": {name: str(value) for name, value in sorted(options.items())},
+        }
+        digest = hashlib.sha1(json.dumps(source, sort_keys=True).encode()).hexdigest()
+        return CacheEntry(self, os.path.join(self.directory, digest))
+
+    def nbytes(self):
+        """Returns the size of all entries.
+
+        Returns:
+            int: number of bytes
+        """
+        return sum(_directory_size(path) for path in self._entries())
+
+    def evict(self, keep=None):
+        """Deletes the least recently used entries until the cache fits its budget.
+
+        Args:
+            keep (CacheEntry, optional): entry that is never deleted. Defaults to None.
+        """
+        entries = [(os.path.getmtime(path), path) for path in self._entries()]
+        sizes = {path: _directory_size(path) for _, path in entries}
+        total = sum(sizes.values())
+        for _, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if keep is not None and path == keep.path:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= sizes[path]
+
+    def clear(self):
+        """Deletes all entries."""
+        for path in self._entries():
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _entries(self):
+        """Lists the entry directories (temporary directories excluded)."""
+        return [
+            entry.path
+            for entry in os.scandir(self.directory)
+            if entry.is_dir() and not entry.name.startswith(".")
+        ]
+
+
+class CacheEntry:
+    """One cached source file: its volume, metadata and derived arrays."""
+
+    def __init__(self, cache, path) -> None:
+        """Constructor
+
+        Args:
+            cache (VolumeCache): the cache that holds the entry
+            path (str): the entry directory
+        """
+        self.cache = cache
+        self.path = path
+
+    def exists(self):
+        """Returns whether the volume of the entry is stored.
+
+        Returns:
+            bool: True if the entry can be loaded
+        """
+        return os.path.exists(os.path.join(self.path, "meta.json"))
+
+    def load(self):
+        """Opens the stored volume memory-mapped and marks the entry as recently used.
+
+        Returns:
+            tuple: (volume as read-only memmap, metadata dict, scaling tuple)
+        """
+        with open(os.path.join(self.path, "meta.json")) as f:
+            meta = json.load(f)
+        volume = np.load(os.path.join(self.path, "volume.npy"), mmap_mode="r")
+        os.utime(self.path)
+        return volume, meta["metadata"], tuple(meta["scaling"])
+
+    def store(self, volume, metadata, scaling):
+        """Stores a 4D volume timepoint by timepoint, then evicts old entries.
+
+        The entry is written to a temporary directory and moved into place at once, so
+        interrupted writes never leave a partial entry.
+
+        Args:
+            volume (array-like): the 4D volume (e.g. an ndarray or a LazyVolume)
+            metadata (dict): JSON serializable image metadata
+            scaling (tuple): (slope, intercept) of the stored values
+        """
+        tmp = tempfile.mkdtemp(prefix=".tmp", dir=self.cache.directory)
+        try:
+            first = np.asarray(volume[..., 0])
+            out = np.lib.format.open_memmap(
+                os.path.join(tmp, "volume.npy"),
+                mode="w+",
+                dtype=first.dtype,
+                shape=tuple(volume.shape),
+            )
+            out[..., 0] = first
+            for t in range(1, volume.shape[3]):
+                out[..., t] = np.asarray(volume[..., t])
+            out.flush()
+            del out
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump({"metadata": metadata, "scaling": list(scaling)}, f)
+            shutil.rmtree(self.path, ignore_errors=True)
+            os.replace(tmp, self.path)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.cache.evict(keep=self)
+
+    def get_arrays(self, name):
+        """Loads derived arrays.
+
+        Args:
+            name (str): name of the derived data
+
+        Returns:
+            dict: the arrays (None if not stored)
+        """
+        path = os.path.join(self.path, name + ".npz")
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return {key: data[key] for key in data.files}
+
+    def put_arrays(self, name, arrays):
+        """Stores derived arrays (only if the volume of the entry is stored).
+
+        Args:
+            name (str): name of the derived data
+            arrays (dict): the arrays by name
+        """
+        if not self.exists():
+            return
+        fd, tmp = tempfile.mkstemp(suffix=".npz", dir=self.path)
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, os.path.join(self.path, name + ".npz"))
+
+
+def _directory_size(path):
+    """Returns the size of the files in a directory."""
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
@@ -1,17 +1,24 @@
+import itertools
+import operator
 import numpy as np
+from slicevis.intensity import IntensityStats
 
-__all__ = ["Image"]
+__all__ = ["Image", "LazyVolume", "SparseLabels"]
 
 
 class Image:
     """Class for four-dimensional images."""
 
-    def __init__(self, data=np.ndarray((1, 1, 1, 1)), metadata=None) -> None:
+    def __init__(
+        self, data=np.ndarray((1, 1, 1, 1)), metadata=None, scaling=(1.0, 0.0)
+    ) -> None:
         """Constructor
 
         Args:
-            data (ndarray, optional): the 4D image. Defaults to np.ndarray((1, 1, 1, 1)).
+            data (ndarray, optional): the 4D image (or a LazyVolume). Defaults to np.ndarray((1, 1, 1, 1)).
             metadata (dict, optional): associated metadata dictionary. Defaults to None.
+            scaling (tuple, optional): (slope, intercept) that maps the stored values to
+                real values, applied on demand. Defaults to (1.0, 0.0).
 
         Raises:
             ValueError: if image data is not 4D
@@ -22,17 +29,100 @@ class Image:
         if metadata == None:
             metadata = {}
         self.metadata = metadata
+        self.scaling = (float(scaling[0]), float(scaling[1]))
+        self.cache_entry = None  # CacheEntry if loaded through a VolumeCache
+        self._intensity_stats = {}  # timepoint -> IntensityStats
 
-    def get_timepoint(self, t=0):
+    def is_lazy(self):
+        """Returns whether the voxels are read from disk on demand.
+
+        Returns:
+            bool: True if the data is a LazyVolume
+        """
+        return isinstance(self.data, LazyVolume)
+
+    def is_sparse(self):
+        """Returns whether the voxels are stored block-sparse.
+
+        Returns:
+            bool: True if the data is a SparseLabels volume
+        """
+        return isinstance(self.data, SparseLabels)
+
+    def is_scaled(self):
+        """Returns whether the stored values need scaling to obtain real values.
+
+        Returns:
+            bool: True if the slope is not 1 or the intercept is not 0
+        """
+        return self.scaling != (1.0, 0.0)
+
+    def apply_scaling(self, array):
+        """Maps stored values to real values.
+
+        Args:
+            array (ndarray): stored values (e.g. a slice of the image)
+
+        Returns:
+            ndarray: the scaled values (unchanged if the image is not scaled)
+        """
+        array = np.asarray(array)
+        if not self.is_scaled():
+            return array
+        dtype = np.float64 if array.dtype == np.float64 else np.float32
+        slope, intercept = self.scaling
+        return (array * dtype(slope) + dtype(intercept)).astype(dtype, copy=False)
+
+    def get_timepoint(self, t=0, scaled=True):
         """Returns the 3D image data at timepoint t.
 
+        For lazy images, the result is a LazyVolume that reads slices on demand, for
+        sparse images a SparseLabels volume that shares the blocks of the image.
+
         Args:
             t (int, optional): the timepoint. Defaults to 0.
+            scaled (bool, optional): apply the intensity scaling. Defaults to True.
 
         Returns:
             ndarray: 3D image data
         """
-        return np.asarray(self.data[:, :, :, t])
+        if self.is_lazy():
+            return self.data.view(Ellipsis, t)
+        if self.is_sparse():
+            return self.data.select(3, t)
+        volume = np.asarray(self.data[:, :, :, t])
+        if scaled:
+            volume = self.apply_scaling(volume)
+        return volume
+
+    def get_intensity_stats(self, t=0):
+        """Returns the intensity statistics of a timepoint (computed only once).
+
+        The statistics are computed in one streaming pass over the stored values and
+        kept on the image. Images loaded through a VolumeCache also store them in
+        their cache entry, so later sessions do not scan the voxels at all.
+
+        Args:
+            t (int, optional): the timepoint. Defaults to 0.
+
+        Returns:
+            IntensityStats: range, histogram and percentiles of the real values
+        """
+        stats = self._intensity_stats.get(t)
+        if stats is not None:
+            return stats
+        name = "intensity_t" + str(t)
+        arrays = None if self.cache_entry is None else self.cache_entry.get_arrays(name)
+        if arrays is not None:
+            stats = IntensityStats.from_arrays(arrays)
+        else:
+            stats = IntensityStats.from_volume(
+                self.get_timepoint(t, scaled=False), scaling=self.scaling
+            )
+            if self.cache_entry is not None:
+                self.cache_entry.put_arrays(name, stats.to_arrays())
+        self._intensity_stats[t] = stats
+        return stats
 
     def get_class_names(self):
         """Returns the class names for segmentations.
@@ -51,3 +141,364 @@ class Image:
         """
         if "isSegmentation" in self.metadata:
             return self.metadata["ClassColors"]
+
+
+class LazyVolume:
+    """Array-like view on an on-disk array (e.g. a nibabel ArrayProxy).
+
+    Indexing reads only the requested voxels from the source and returns an ndarray,
+    view() returns another LazyVolume without reading anything.
+    """
+
+    def __init__(self, source, key=None) -> None:
+        """Constructor
+
+        Args:
+            source (array-like): object with shape, ndim and numpy-style basic indexing
+            key (tuple, optional): per source axis an int or a range. Defaults to everything.
+        """
+        self.source = source
+        if key is None:
+            key = tuple(range(n) for n in source.shape)
+        self._key = tuple(key)
+        self._dtype = None
+
+    @property
+    def shape(self):
+        return tuple(len(k) for k in self._key if isinstance(k, range))
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def dtype(self):
+        """Data type of the values returned by indexing (read from a single voxel)."""
+        if self._dtype is None:
+            corner = tuple(k if isinstance(k, int) else k[0] for k in self._key)
+            self._dtype = np.asarray(self.source[corner]).dtype
+        return self._dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    def view(self, *item):
+        """Returns a lazy sub-volume.
+
+        Args:
+            item: integers, slices and Ellipsis as in numpy basic indexing
+
+        Returns:
+            LazyVolume: the sub-volume
+        """
+        return LazyVolume(self.source, self._compose(item))
+
+    def __getitem__(self, item):
+        if not isinstance(item, tuple):
+            item = (item,)
+        key = self._compose(item)
+        slicer = tuple(k if isinstance(k, int) else _range_to_slice(k) for k in key)
+        return np.asarray(self.source[slicer])
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[...]
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def _compose(self, item):
+        """Applies numpy-style basic indexing to the current key."""
+        free = [i for i, k in enumerate(self._key) if isinstance(k, range)]
+        if sum(it is Ellipsis for it in item) > 1:
+            raise IndexError("an index can only have a single ellipsis")
+        if Ellipsis in item:
+            pos = item.index(Ellipsis)
+            fill = len(free) - (len(item) - 1)
+            item = item[:pos] + (slice(None),) * fill + item[pos + 1 :]
+        if len(item) > len(free):
+            raise IndexError("too many indices for LazyVolume")
+        item = tuple(item) + (slice(None),) * (len(free) - len(item))
+
+        key = list(self._key)
+        for axis, it in zip(free, item):
+            if isinstance(it, slice):
+                key[axis] = key[axis][it]
+            else:
+                key[axis] = key[axis][int(it)]  # raises IndexError if out of range
+        return tuple(key)
+
+
+class SparseLabels:
+    """Block-sparse label volume.
+
+    The volume is split into blocks (e.g. 32 voxels along every axis). Blocks that
+    contain only background (0) are not stored, blocks with a single label are stored
+    as that label and only the remaining blocks are stored densely, as the smallest
+    unsigned integer type that holds all labels. Indexing decodes only the blocks that
+    intersect the requested region, so slices along any axis are cheap.
+    """
+
+    def __init__(self, shape, dtype, block, blocks=None) -> None:
+        """Constructor
+
+        Args:
+            shape (tuple): shape of the volume
+            dtype (dtype): unsigned integer type of the labels
+            block (tuple): block size along every axis
+            blocks (dict, optional): block grid index -> ndarray (a 0-d array for
+                uniform blocks), missing blocks are background. Defaults to None.
+        """
+        self.shape = tuple(int(n) for n in shape)
+        self.dtype = np.dtype(dtype)
+        self.block = tuple(int(b) for b in block)
+        self._blocks = {} if blocks is None else blocks
+
+    @classmethod
+    def from_dense(cls, volume, block=32, progress=None):
+        """Encodes a label volume.
+
+        The volume is read in slabs that span the first two axes, so array proxies
+        (e.g. nibabel's dataobj) never have to be loaded completely.
+
+        Args:
+            volume (array-like): the labels, any object with shape and basic indexing
+            block (int or tuple, optional): block size, for all or for every axis.
+                Defaults to 32.
+            progress (callable, optional): function (encoded slabs, total slabs)
+                called after every slab, may raise to abort. Defaults to None.
+
+        Raises:
+            ValueError: if the volume contains negative or non-integer labels
+
+        Returns:
+            SparseLabels: the encoded volume
+        """
+        shape = tuple(volume.shape)
+        if isinstance(block, int):
+            block = (block,) * len(shape)
+        block = tuple(max(1, min(int(b), n)) for b, n in zip(block, shape))
+        grid = [range(-(-n // b)) for n, b in zip(shape, block)]
+
+        blocks = {}
+        high = 0
+        total = int(np.prod([len(g) for g in grid[2:]]))
+        # slabs in on-disk order of NIfTI files (last axis outermost)
+        for done, outer in enumerate(itertools.product(*reversed(grid[2:])), 1):
+            outer = tuple(reversed(outer))
+            slab_key = (slice(None), slice(None)) + tuple(
+                slice(i * b, (i + 1) * b) for i, b in zip(outer, block[2:])
+            )
+            slab = _as_label_array(volume[slab_key])
+            for inner in itertools.product(*grid[:2]):
+                key = tuple(slice(i * b, (i + 1) * b) for i, b in zip(inner, block))
+                data = slab[key[:2]]
+                low, top = data.min(), data.max()
+                if top == 0:
+                    continue
+                high = max(high, int(top))
+                if low == top:  # uniform block
+                    data = np.array(top)
+                else:
+                    data = data.astype(np.min_scalar_type(int(top)))
+                blocks[inner + outer] = data
+            if progress is not None:
+                progress(done, total)
+
+        dtype = np.min_scalar_type(high)
+        for key, data in blocks.items():
+            blocks[key] = data.astype(dtype, copy=False)
+        return cls(shape, dtype, block, blocks)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        """Number of bytes of the stored blocks."""
+        return sum(data.nbytes for data in self._blocks.values())
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, item):
+        item = _expand_index(item, self.ndim)
+        ranges = []
+        for axis, (it, n) in enumerate(zip(item, self.shape)):
+            if isinstance(it, slice):
+                ranges.append(range(n)[it])
+            else:
+                i = operator.index(it)
+                if not -n <= i < n:
+                    raise IndexError("index out of range for SparseLabels")
+                ranges.append(range(i % n, i % n + 1))
+        # decode with ascending indices and reverse negative steps at the end
+        ascending = [r if r.step > 0 else r[::-1] for r in ranges]
+        out = np.zeros([len(r) for r in ascending], dtype=self.dtype)
+        if out.size:
+            parts = [_block_parts(r, b) for r, b in zip(ascending, self.block)]
+            for combination in itertools.product(*parts):
+                data = self._blocks.get(tuple(part[0] for part in combination))
+                if data is None:
+                    continue
+                out_key = tuple(part[1] for part in combination)
+                if data.ndim == 0:
+                    out[out_key] = data
+                else:
+                    out[out_key] = data[tuple(part[2] for part in combination)]
+
+        key = []  # drop integer axes, restore negative steps
+        for it, r in zip(item, ranges):
+            if not isinstance(it, slice):
+                key.append(0)
+            else:
+                key.append(slice(None, None, 1 if r.step > 0 else -1))
+        return out[tuple(key)]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[...]
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def select(self, axis, index):
+        """Returns the sub-volume at an index of an axis without decoding it.
+
+        Args:
+            axis (int): the axis
+            index (int): the index along axis
+
+        Returns:
+            SparseLabels: volume with one dimension less, sharing the blocks
+        """
+        n, b = self.shape[axis], self.block[axis]
+        if not 0 <= index < n:
+            raise IndexError("index out of range for SparseLabels")
+        blocks = {}
+        for key, data in self._blocks.items():
+            if key[axis] != index // b:
+                continue
+            if data.ndim:
+                data = np.take(data, index % b, axis=axis)
+            blocks[key[:axis] + key[axis + 1 :]] = data
+        shape = self.shape[:axis] + self.shape[axis + 1 :]
+        block = self.block[:axis] + self.block[axis + 1 :]
+        return SparseLabels(shape, self.dtype, block, blocks)
+
+    def blocks(self):
+        """Iterates over the stored (non-background) blocks.
+
+        Yields:
+            tuple: (block grid index, slices of the block in the volume, data), data
+                is a 0-d array for uniform blocks
+        """
+        for key, data in self._blocks.items():
+            slices = tuple(
+                slice(i * b, min((i + 1) * b, n))
+                for i, b, n in zip(key, self.block, self.shape)
+            )
+            yield key, slices, data
+
+    def max(self, axis=None, out=None, **kwargs):
+        """Returns the largest label (numpy.max support, whole volume only)."""
+        if axis is not None or out is not None:
+            return np.max(np.asarray(self), axis=axis, out=out, **kwargs)
+        return max([data.max() for data in self._blocks.values()], default=0)
+
+    def min(self, axis=None, out=None, **kwargs):
+        """Returns the smallest label (numpy.min support, whole volume only)."""
+        if axis is not None or out is not None:
+            return np.min(np.asarray(self), axis=axis, out=out, **kwargs)
+        if self._has_background():
+            return self.dtype.type(0)
+        return min(data.min() for data in self._blocks.values())
+
+    def unique(self):
+        """Returns the sorted labels of the volume (including 0 if present).
+
+        Returns:
+            ndarray: the unique labels
+        """
+        values = [np.unique(data) for data in self._blocks.values()]
+        if self._has_background():
+            values.append(np.zeros(1, dtype=self.dtype))
+        if not values:
+            return np.zeros(0, dtype=self.dtype)
+        return np.unique(np.concatenate(values))
+
+    def _has_background(self):
+        """Returns whether a missing block or a stored block contains label 0."""
+        grid = int(np.prod([-(-n // b) for n, b in zip(self.shape, self.block)]))
+        if len(self._blocks) < grid:
+            return True
+        return any(data.ndim and not data.all() for data in self._blocks.values())
+
+
+def _expand_index(item, ndim):
+    """Expands a basic index (ints, slices, one Ellipsis) to one entry per axis."""
+    if not isinstance(item, tuple):
+        item = (item,)
+    if sum(it is Ellipsis for it in item) > 1:
+        raise IndexError("an index can only have a single ellipsis")
+    if Ellipsis in item:
+        pos = item.index(Ellipsis)
+        item = item[:pos] + (slice(None),) * (ndim - len(item) + 1) + item[pos + 1 :]
+    if len(item) > ndim:
+        raise IndexError("too many indices for SparseLabels")
+    return tuple(item) + (slice(None),) * (ndim - len(item))
+
+
+def _block_parts(r, b):
+    """Splits an ascending range of indices into the blocks it touches.
+
+    Args:
+        r (range): ascending indices along one axis
+        b (int): block size along that axis
+
+    Returns:
+        list: (block index, slice of the output, slice within the block) tuples
+    """
+    parts = []
+    pos = 0
+    while pos < len(r):
+        i = r[pos] // b
+        end = min(len(r), pos + -(-((i + 1) * b - r[pos]) // r.step))
+        first, last = r[pos] - i * b, r[end - 1] - i * b
+        parts.append((i, slice(pos, end), slice(first, last + 1, r.step)))
+        pos = end
+    return parts
+
+
+def _as_label_array(data):
+    """Converts a slab to non-negative integer labels.
+
+    Raises:
+        ValueError: if the slab contains negative or non-integer labels
+    """
+    data = np.asarray(data)
+    if data.dtype.kind == "b":
+        return data.astype(np.uint8)
+    if data.size and data.min() < 0:
+        raise ValueError("Segmentation labels must be non-negative.")
+    if data.dtype.kind == "f":
+        rounded = np.rint(data)
+        if not np.array_equal(rounded, data):
+            raise ValueError("Segmentation labels must be integers.")
+        data = rounded.astype(np.uint64)
+    return data
+
+
+def _range_to_slice(r):
+    """Converts a range into an equivalent slice."""
+    stop = r.stop
+    if r.step < 0 and stop < 0:
+        stop = None
+    return slice(r.start, stop, r.step)
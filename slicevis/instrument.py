@@ -0,0 +1,122 @@
+from collections import deque
+import contextlib
+import threading
+import time
+import numpy as np
+
+__all__ = ["StageTimings", "LATENCY_BUCKETS", "BYTE_BUCKETS"]
+
+# upper bucket edges of latency histograms in seconds (the last bucket is open)
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+# upper bucket edges of size histograms in bytes (e.g. payload per frame)
+BYTE_BUCKETS = tuple(2**k for k in range(10, 26, 2))  # 1 KiB ... 32 MiB
+
+
+class StageTimings:
+    """Thread-safe recorder of per-stage latencies and other per-frame values.
+
+    Every stage (e.g. "prepare" or "overlay") keeps a count, a total and a latency
+    histogram over all samples, and the most recent samples for percentiles. Values
+    that are not durations (e.g. payload bytes) are recorded the same way, with
+    bucket edges in their own unit.
+    """
+
+    def __init__(self, window=1000) -> None:
+        """Constructor
+
+        Args:
+            window (int, optional): number of recent samples per stage used for
+                percentiles. Defaults to 1000.
+        """
+        self.window = int(window)
+        # name -> [count, total, maximum, recent, histogram, bucket edges]
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, value, buckets=LATENCY_BUCKETS):
+        """Adds a sample.
+
+        Args:
+            stage (str): the stage name
+            value (float): duration in seconds (or another per-frame value)
+            buckets (tuple, optional): upper histogram bucket edges in the unit of
+                value, only used by the first sample of a stage. Defaults to
+                LATENCY_BUCKETS.
+        """
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                edges = tuple(buckets)
+                histogram = [0] * (len(edges) + 1)
+                entry = [0, 0.0, 0.0, deque(maxlen=self.window), histogram, edges]
+                self._stages[stage] = entry
+            entry[0] += 1
+            entry[1] += value
+            entry[2] = max(entry[2], value)
+            entry[3].append(value)
+            entry[4][int(np.searchsorted(entry[5], value))] += 1
+
+    @contextlib.contextmanager
+    def measure(self, stage):
+        """Records the duration of a with block (also if it raises).
+
+        Args:
+            stage (str): the stage name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def stages(self):
+        """Returns the names of the recorded stages.
+
+        Returns:
+            list: stage names in the order they were first recorded
+        """
+        with self._lock:
+            return list(self._stages)
+
+    def summary(self, stage):
+        """Summarizes the samples of a stage.
+
+        Args:
+            stage (str): the stage name
+
+        Returns:
+            dict: count, mean, max and the 50th, 90th and 99th percentile of the
+                recent samples, the histogram counts per bucket edge (plus one open
+                bucket) and the "buckets" edges; None if the stage was never recorded
+        """
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                return None
+            count, total, maximum, recent, histogram, edges = entry
+            recent = np.array(recent, dtype=np.float64)
+            histogram = list(histogram)
+        p50, p90, p99 = np.percentile(recent, [50, 90, 99])
+        return {
+            "count": count,
+            "mean": total / count,
+            "max": maximum,
+            "p50": float(p50),
+            "p90": float(p90),
+            "p99": float(p99),
+            "histogram": histogram,
+            "buckets": list(edges),
+        }
+
+    def summaries(self):
+        """Summarizes all stages.
+
+        Returns:
+            dict: summary per stage name, see summary
+        """
+        return {stage: self.summary(stage) for stage in self.stages()}
+
+    def reset(self):
+        """Discards all samples."""
+        with self._lock:
+            self._stages.clear()
@@ -0,0 +1,170 @@
+import numpy as np
+
+__all__ = ["IntensityStats", "WINDOW_PRESETS"]
+
+# common CT windows as (level, width) in Hounsfield units
+WINDOW_PRESETS = {
+    "CT soft tissue": (40.0, 400.0),
+    "CT lung": (-600.0, 1500.0),
+    "CT bone": (400.0, 1800.0),
+    "CT brain": (40.0, 80.0),
+    "CT mediastinum": (50.0, 350.0),
+    "CT liver": (60.0, 160.0),
+}
+
+
+class IntensityStats:
+    """Global intensity statistics of a volume: range, histogram and percentiles.
+
+    The histogram is built in a streaming pass over slabs along the last axis (the
+    on-disk order of NIfTI files), so lazy volumes are read sequentially and never
+    held in memory completely. Integer volumes of up to 16 bits get one bin per value
+    (exact percentiles) and are read once, other volumes need a second pass for a
+    fixed number of bins over their range. Percentiles and windows are then derived
+    from the histogram without touching the voxels again.
+    """
+
+    def __init__(self, edges, counts, minimum, maximum) -> None:
+        """Constructor
+
+        Args:
+            edges (ndarray): the bin edges (one more than counts)
+            counts (ndarray): the number of voxels per bin
+            minimum (float): the smallest value
+            maximum (float): the largest value
+        """
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.min = float(minimum)
+        self.max = float(maximum)
+        self.count = int(self.counts.sum())
+
+    @classmethod
+    def from_volume(cls, volume, bins=4096, chunk_size=16, scaling=(1.0, 0.0)):
+        """Computes the statistics of a volume slab by slab.
+
+        Args:
+            volume (array-like): the volume (e.g. an ndarray or a LazyVolume)
+            bins (int, optional): number of bins for float and wide integer volumes.
+                Defaults to 4096.
+            chunk_size (int, optional): number of slices along the last axis per
+                slab. Defaults to 16.
+            scaling (tuple, optional): (slope, intercept) that maps the stored values
+                to real values. Defaults to (1.0, 0.0).
+
+        Returns:
+            IntensityStats: the statistics of the real values
+        """
+        n = volume.shape[-1]
+        slabs = [
+            (Ellipsis, slice(start, start + chunk_size))
+            for start in range(0, n, chunk_size)
+        ]
+        dtype = np.dtype(volume.dtype)
+        if dtype.kind in "biu" and dtype.itemsize <= 2:  # one bin per value
+            offset = int(np.iinfo(dtype).min) if dtype.kind == "i" else 0
+            size = 2 ** (8 * dtype.itemsize) if dtype.kind != "b" else 2
+            counts = np.zeros(size, dtype=np.int64)
+            for slab in slabs:
+                values = np.asarray(volume[slab]).ravel().astype(np.int64) - offset
+                counts += np.bincount(values, minlength=size)
+            present = np.nonzero(counts)[0]
+            if len(present) == 0:
+                return cls([0.0, 1.0], [0], 0, 0).scaled(scaling)
+            first, last = present[0], present[-1]
+            edges = np.arange(first, last + 2, dtype=np.float64) + offset - 0.5
+            stats = cls(edges, counts[first : last + 1], first + offset, last + offset)
+            return stats.scaled(scaling)
+
+        minimum, maximum = np.inf, -np.inf
+        for slab in slabs:
+            values = np.asarray(volume[slab])
+            values = values[np.isfinite(values)]
+            if values.size:
+                minimum = min(minimum, float(values.min()))
+                maximum = max(maximum, float(values.max()))
+        if minimum > maximum:  # empty or no finite values
+            return cls([0.0, 1.0], [0], 0, 0).scaled(scaling)
+        edges = np.linspace(minimum, maximum, bins + 1)
+        if minimum == maximum:
+            edges = np.array([minimum - 0.5, maximum + 0.5])
+        counts = np.zeros(len(edges) - 1, dtype=np.int64)
+        for slab in slabs:
+            values = np.asarray(volume[slab]).ravel()
+            counts += np.histogram(values[np.isfinite(values)], edges)[0]
+        return cls(edges, counts, minimum, maximum).scaled(scaling)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Restores statistics that were saved with to_arrays.
+
+        Args:
+            arrays (dict): the arrays as returned by to_arrays
+
+        Returns:
+            IntensityStats: the statistics
+        """
+        minimum, maximum = arrays["range"]
+        return cls(arrays["edges"], arrays["counts"], minimum, maximum)
+
+    def to_arrays(self):
+        """Returns the statistics as named arrays (e.g. for np.savez).
+
+        Returns:
+            dict: edges, counts and range
+        """
+        return {
+            "edges": self.edges,
+            "counts": self.counts,
+            "range": np.array([self.min, self.max]),
+        }
+
+    def scaled(self, scaling):
+        """Maps the statistics of stored values to real values.
+
+        Args:
+            scaling (tuple): (slope, intercept)
+
+        Returns:
+            IntensityStats: the statistics of the scaled values (self if unscaled)
+        """
+        slope, intercept = float(scaling[0]), float(scaling[1])
+        if (slope, intercept) == (1.0, 0.0):
+            return self
+        edges = self.edges * slope + intercept
+        bounds = sorted([self.min * slope + intercept, self.max * slope + intercept])
+        counts = self.counts
+        if slope < 0:  # keep the edges ascending
+            edges, counts = edges[::-1], counts[::-1]
+        return IntensityStats(edges, counts, *bounds)
+
+    def percentile(self, q):
+        """Estimates percentiles from the histogram (linear within a bin).
+
+        Args:
+            q (float or array-like): percentiles in [0, 100]
+
+        Returns:
+            float or ndarray: the percentiles, clipped to the value range
+        """
+        if self.count == 0:
+            return np.full(np.shape(q), self.min)[()]
+        cumulative = np.concatenate([[0], np.cumsum(self.counts)]) / self.count
+        fractions = np.asarray(q, dtype=np.float64) / 100
+        values = np.interp(fractions, cumulative, self.edges)
+        return np.clip(values, self.min, self.max)[()]
+
+    def auto_window(self, low=0.5, high=99.5):
+        """Returns a window between two percentiles, which ignores outliers.
+
+        Args:
+            low (float, optional): lower percentile. Defaults to 0.5.
+            high (float, optional): upper percentile. Defaults to 99.5.
+
+        Returns:
+            tuple: (min, max) of the window
+        """
+        lower, upper = self.percentile([low, high])
+        if upper <= lower:  # (nearly) constant volume
+            return self.min, max(self.max, self.min + 1.0)
+        return float(lower), float(upper)
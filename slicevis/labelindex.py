@@ -0,0 +1,211 @@
+import numpy as np
+
+__all__ = ["LabelIndex"]
+
+
+class LabelIndex:
+    """Per-slice index of the labels in a segmentation volume.
+
+    For every axis and slice it records which labels are present, their voxel counts
+    and their bounding boxes, so that overlays only visit the labels of a slice inside
+    their boxes and empty slices are skipped. The index is built in one pass over the
+    volume, slab by slab, and only looks at labelled (non-zero) voxels.
+    """
+
+    def __init__(self, volume) -> None:
+        """Constructor, builds the index.
+
+        Args:
+            volume (ndarray): 3D volume of non-negative integer labels, 0 = unlabelled
+        """
+        self.shape = tuple(volume.shape)
+        self.labels = _nonzero_labels(volume)  # sorted, column of every label
+        n = len(self.labels)
+        # counts[axis][slice, column], boxes[axis][slice, column] = (r0, r1, c0, c1)
+        self.counts = [np.zeros((s, n), dtype=np.int64) for s in self.shape]
+        self.boxes = []
+        for axis, s in enumerate(self.shape):
+            rows, cols = [self.shape[k] for k in range(3) if k != axis]
+            box = np.empty((s, n, 4), dtype=np.int64)
+            box[..., 0::2] = [rows, cols]  # minima start above every index
+            box[..., 1::2] = -1
+            self.boxes.append(box)
+        for i in range(self.shape[0]):
+            self._add_slab(i, np.asarray(volume[i]))
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Restores an index that was saved with to_arrays.
+
+        Args:
+            arrays (dict): the arrays as returned by to_arrays
+
+        Returns:
+            LabelIndex: the index
+        """
+        index = cls.__new__(cls)
+        index.shape = tuple(int(n) for n in arrays["shape"])
+        index.labels = arrays["labels"]
+        index.counts = [arrays["counts" + str(axis)] for axis in range(3)]
+        index.boxes = [arrays["boxes" + str(axis)] for axis in range(3)]
+        return index
+
+    def to_arrays(self):
+        """Returns the index as named arrays (e.g. for np.savez).
+
+        Returns:
+            dict: shape, labels, counts0-2 and boxes0-2
+        """
+        arrays = {"shape": np.array(self.shape), "labels": self.labels}
+        for axis in range(3):
+            arrays["counts" + str(axis)] = self.counts[axis]
+            arrays["boxes" + str(axis)] = self.boxes[axis]
+        return arrays
+
+    def present(self, axis, index):
+        """Returns the labels of a slice.
+
+        Args:
+            axis (int): the slice axis
+            index (int): the slice index
+
+        Returns:
+            ndarray: the sorted labels with at least one voxel in the slice
+        """
+        return self.labels[np.nonzero(self.counts[axis][index])[0]]
+
+    def is_empty(self, axis, index):
+        """Returns whether a slice contains no labelled voxel.
+
+        Args:
+            axis (int): the slice axis
+            index (int): the slice index
+
+        Returns:
+            bool: True if the slice is empty
+        """
+        return not self.counts[axis][index].any()
+
+    def count(self, axis, index, label):
+        """Returns the number of voxels of a label in a slice.
+
+        Args:
+            axis (int): the slice axis
+            index (int): the slice index
+            label (int): the label
+
+        Returns:
+            int: the voxel count (0 if the label does not exist)
+        """
+        column = self._column(label)
+        return 0 if column is None else int(self.counts[axis][index, column])
+
+    def bbox(self, axis, index, label):
+        """Returns the bounding box of a label in a slice.
+
+        Rows and columns are the remaining axes of the volume in ascending order.
+
+        Args:
+            axis (int): the slice axis
+            index (int): the slice index
+            label (int): the label
+
+        Returns:
+            tuple: inclusive (row_min, row_max, col_min, col_max), None if absent
+        """
+        column = self._column(label)
+        if column is None or self.counts[axis][index, column] == 0:
+            return None
+        return tuple(int(v) for v in self.boxes[axis][index, column])
+
+    def slice_bbox(self, axis, index):
+        """Returns the bounding box of all labels in a slice.
+
+        Args:
+            axis (int): the slice axis
+            index (int): the slice index
+
+        Returns:
+            tuple: inclusive (row_min, row_max, col_min, col_max), None if empty
+        """
+        present = self.counts[axis][index] > 0
+        if not present.any():
+            return None
+        box = self.boxes[axis][index, present]
+        return (
+            int(box[:, 0].min()),
+            int(box[:, 1].max()),
+            int(box[:, 2].min()),
+            int(box[:, 3].max()),
+        )
+
+    def next_slice(self, axis, index, label, step=1):
+        """Finds the closest slice beyond index that contains a label.
+
+        Args:
+            axis (int): the slice axis
+            index (int): the current slice index (not included in the search)
+            label (int): the label
+            step (int, optional): 1 searches upwards, -1 downwards. Defaults to 1.
+
+        Returns:
+            int: the slice index (None if there is no such slice)
+        """
+        column = self._column(label)
+        if column is None:
+            return None
+        slices = np.nonzero(self.counts[axis][:, column])[0]
+        if step > 0:
+            slices = slices[slices > index]
+            return int(slices[0]) if len(slices) else None
+        slices = slices[slices < index]
+        return int(slices[-1]) if len(slices) else None
+
+    def _column(self, label):
+        """Returns the column of a label in counts and boxes (None if absent)."""
+        column = int(np.searchsorted(self.labels, label))
+        if column < len(self.labels) and self.labels[column] == label:
+            return column
+        return None
+
+    def _add_slab(self, i, slab):
+        """Adds the labelled voxels of volume[i] to the index of all three axes."""
+        rows, cols = np.nonzero(slab)
+        if len(rows) == 0:
+            return
+        columns = np.searchsorted(self.labels, slab[rows, cols])
+
+        # axis 0: slice i, rows and columns are volume axes 1 and 2
+        self.counts[0][i] += np.bincount(columns, minlength=len(self.labels))
+        box = self.boxes[0][i]
+        np.minimum.at(box[:, 0], columns, rows)
+        np.maximum.at(box[:, 1], columns, rows)
+        np.minimum.at(box[:, 2], columns, cols)
+        np.maximum.at(box[:, 3], columns, cols)
+
+        # axes 1 and 2: slices rows / cols, with i as the row and the other as column
+        for axis, where, other in ((1, rows, cols), (2, cols, rows)):
+            np.add.at(self.counts[axis], (where, columns), 1)
+            box = self.boxes[axis]
+            box[where, columns, 0] = np.minimum(box[where, columns, 0], i)
+            box[where, columns, 1] = i  # slabs are visited in ascending order
+            np.minimum.at(box[:, :, 2], (where, columns), other)
+            np.maximum.at(box[:, :, 3], (where, columns), other)
+
+
+def _nonzero_labels(volume):
+    """Returns the sorted non-zero labels of a volume, slab by slab.
+
+    Args:
+        volume (ndarray): the label volume
+
+    Returns:
+        ndarray: the sorted unique labels without 0
+    """
+    labels = np.unique(
+        np.concatenate(
+            [np.unique(np.asarray(volume[i])) for i in range(volume.shape[0])]
+            or [np.zeros(0, dtype=np.int64)]
+        )
+    )
+    return labels[labels != 0]
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+import threading
+import numpy as np
+
+__all__ = ["AxisLayoutCache"]
+
+
+class AxisLayoutCache:
+    """Contiguous per-axis copies of volumes for fast slicing in every direction.
+
+    A slice along an axis that does not vary slowest in memory touches one cache line
+    per voxel. For such axes a transposed copy is built in the background, in which
+    every slice is one contiguous block. Copies are kept within a memory budget and the
+    least recently requested ones are dropped first. Until a copy is ready (and for
+    volumes that are not in memory) slices are read from the volume itself.
+    """
+
+    def __init__(self, max_bytes=512 * 2**20, background=True) -> None:
+        """Constructor
+
+        Args:
+            max_bytes (int, optional): memory budget of all copies in bytes, 0 disables
+                the copies. Defaults to 512 MiB.
+            background (bool, optional): build copies on a background thread instead of
+                in prepare. Defaults to True.
+        """
+        self.max_bytes = int(max_bytes)
+        self.background = background
+        self.nbytes = 0
+        self._volumes = {}  # name -> volume
+        self._copies = OrderedDict()  # (name, axis) -> copy, least recent first
+        self._building = set()  # (name, axis) of copies that are being built
+        self._lock = threading.Lock()
+
+    def set_volume(self, name, volume):
+        """Registers a volume and drops the copies of the previous one.
+
+        Args:
+            name (str): name of the layer (e.g. "image")
+            volume (ndarray): the 3D volume, None removes the layer
+        """
+        with self._lock:
+            if self._volumes.get(name) is volume:
+                return
+            for key in [key for key in self._copies if key[0] == name]:
+                self.nbytes -= self._copies.pop(key).nbytes
+            if volume is None:
+                self._volumes.pop(name, None)
+            else:
+                self._volumes[name] = volume
+
+    def prepare(self, name, axis):
+        """Makes sure that a contiguous copy for an axis exists or is being built.
+
+        Nothing is built if slices along axis are already contiguous, if the volume is
+        not an in-memory ndarray or if the copy exceeds the whole budget.
+
+        Args:
+            name (str): name of the layer
+            axis (int): the slice axis
+        """
+        with self._lock:
+            key = (name, axis)
+            volume = self._volumes.get(name)
+            if key in self._copies:
+                self._copies.move_to_end(key)
+                return
+            if key in self._building or not self._needs_copy(volume, axis):
+                return
+            self._building.add(key)
+        if self.background:
+            threading.Thread(
+                target=self._build, args=(key, volume), daemon=True
+            ).start()
+        else:
+            self._build(key, volume)
+
+    def get_slice(self, name, volume, axis, index):
+        """Extracts a 2D slice, from the contiguous copy if it is available.
+
+        Args:
+            name (str): name of the layer
+            volume (ndarray): the volume, the copy is only used if it was made of it
+            axis (int): the slice axis
+            index (int): the slice index
+
+        Returns:
+            ndarray: the 2D slice, remaining axes in ascending order
+        """
+        with self._lock:
+            copy = None
+            if self._volumes.get(name) is volume:
+                copy = self._copies.get((name, axis))
+        if copy is not None:
+            return copy[index]
+        key = [slice(None)] * 3
+        key[axis] = index
+        return volume[tuple(key)]
+
+    def clear(self):
+        """Removes all copies and volumes."""
+        with self._lock:
+            self._volumes.clear()
+            self._copies.clear()
+            self.nbytes = 0
+
+    def _needs_copy(self, volume, axis):
+        """Returns whether slices along axis would be gathered from strided memory."""
+        if not isinstance(volume, np.ndarray) or volume.nbytes > self.max_bytes:
+            return False
+        strides = [abs(s) for s in volume.strides]
+        return strides[axis] < max(strides)
+
+    def _build(self, key, volume):
+        """Worker: copies the volume with axis first and stores it within the budget."""
+        try:
+            copy = np.ascontiguousarray(np.moveaxis(volume, key[1], 0))
+            with self._lock:
+                if self._volumes.get(key[0]) is not volume:  # replaced meanwhile
+                    return
+                while self._copies and self.nbytes + copy.nbytes > self.max_bytes:
+                    _, evicted = self._copies.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+                self._copies[key] = copy
+                self.nbytes += copy.nbytes
+        finally:
+            with self._lock:
+                self._building.discard(key)
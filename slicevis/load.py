@@ -1,30 +1,137 @@
 import nibabel
 import pygff
 import os
-from slicevis.image import Image
+import time
+from slicevis.image import Image, LazyVolume, SparseLabels
+from slicevis.diskcache import VolumeCache
+from slicevis.stream import NiftiStream, is_nifti_file
 import numpy as np
 import plotly.colors as pc
 
-__all__ = ["load_image"]
+__all__ = ["load_image", "compact_labels"]
 
 
-def load_image(filename, is_segmentation=False):
+def load_image(
+    filename,
+    is_segmentation=False,
+    lazy=False,
+    dtype="native",
+    sparse=False,
+    cache=None,
+    progress=None,
+    timings=None,
+):
     """Loads a four-dimensional image of variable file type.
 
+    In lazy mode, NIfTI voxels stay on disk (memory-mapped for uncompressed files) and
+    are only read when a timepoint or slice is indexed. GFF files are always decoded
+    completely by pygff, but the channel selection is a view and never copied.
+
+    The dtype policy controls the voxel type in memory:
+    "native" keeps the on-disk type and stores the NIfTI slope/intercept in
+    Image.scaling, which is applied on demand (e.g. by Image.get_timepoint).
+    "float" reproduces nibabel's get_fdata (scaled float64). Any numpy dtype scales
+    the data and casts it to that type.
+    Segmentations are always stored as the smallest unsigned integer type that holds
+    all labels. With sparse=True they are stored block-sparse (see SparseLabels) and
+    NIfTI segmentations are encoded slab by slab without a dense copy in memory.
+
+    With a cache, the decoded volume and its metadata are stored on the first load and
+    later loads of the unchanged file open the stored volume memory-mapped instead of
+    decoding the file again. The entry is available as Image.cache_entry, e.g. for
+    derived data.
+
+    Single-file NIfTI images (.nii, .nii.gz) are decompressed in chunks directly into
+    the target array (see NiftiStream), which reports its progress to the progress
+    callback. Use NiftiStream directly to show the first timepoint while the rest of
+    the file is still being decoded.
+
     Args:
         filename (str): the filename
         is_segmentation (bool, optional): flag for segmentation files. Defaults to False.
+        lazy (bool, optional): read voxels on demand. Defaults to False.
+        dtype (str or dtype, optional): "native", "float" or a numpy dtype. Defaults to "native".
+        sparse (bool, optional): store segmentations block-sparse (ignored for images
+            and in lazy mode). Defaults to False.
+        cache (VolumeCache or str, optional): cache (directory) of decoded volumes.
+            Defaults to None (no caching).
+        progress (callable, optional): function (done, total) that is called while
+            the file is decoded (in bytes, in slabs for sparse segmentations) and
+            once when loading is complete. It may raise to abort loading. Defaults
+            to None.
+        timings (StageTimings, optional): records the load time as stage "load".
+            Defaults to None.
 
     Returns:
         Image: the 4D image as an instance of the Image class (defined in image.py)
     """
+    start = time.perf_counter()
+    if cache is None:
+        image = _decode_image(filename, is_segmentation, lazy, dtype, sparse, progress)
+    else:
+        image = _load_cached(
+            filename, is_segmentation, lazy, dtype, sparse, progress, cache
+        )
+    if timings is not None:
+        timings.record("load", time.perf_counter() - start)
+    if progress is not None:
+        progress(1, 1)
+    return image
+
+
+def _load_cached(filename, is_segmentation, lazy, dtype, sparse, progress, cache):
+    """Loads an image through a VolumeCache, see load_image for the arguments.
+
+    Returns:
+        Image: the 4D image with its cache entry
+    """
+    if isinstance(cache, str):
+        cache = VolumeCache(cache)
+    # lazy volumes are stored as the proxy reads them (scaled, labels not compacted)
+    entry = cache.entry(
+        filename, is_segmentation=is_segmentation, dtype=dtype, lazy=lazy
+    )
+    if not entry.exists():
+        image = _decode_image(filename, is_segmentation, lazy, dtype, sparse, progress)
+        entry.store(image.data, image.metadata, image.scaling)
+        if not image.is_lazy():  # already in memory
+            image.cache_entry = entry
+            return image
+
+    data, metadata, scaling = entry.load()
+    if is_segmentation and sparse:
+        data = SparseLabels.from_dense(
+            data, block=(32, 32, 32, 1), progress=progress
+        )
+    image = Image(data, metadata, scaling)
+    image.cache_entry = entry
+    return image
+
+
+def _decode_image(filename, is_segmentation, lazy, dtype, sparse, progress=None):
+    """Decodes an image file, see load_image for the arguments.
+
+    Returns:
+        Image: the 4D image
+    """
     _, ext = os.path.splitext(filename)
     image = Image()
 
     # load GFF files using gffio
     if (ext == ".gff") or (ext == ".segff"):
+        if progress is not None:  # pygff decodes the file in one call
+            progress(0, 1)
         gff = pygff.load(filename)
-        image = Image(gff[:, :, :, :, 0])  # ignore channels
+        data = gff[:, :, :, :, 0]  # ignore channels
+        if ext == ".segff" and sparse:
+            data = SparseLabels.from_dense(data, block=(32, 32, 32, 1))
+        elif ext == ".segff":
+            data = compact_labels(data)
+        elif dtype == "float":
+            data = data.astype(np.float64)
+        elif dtype != "native":
+            data = data.astype(dtype)
+        image = Image(data)
         if ext == ".segff":  # GFF segmentation file
             # get class names and colors from metadata
             classes = gff.info.meta["Project info"]["ClassNames"].split("|")
@@ -45,23 +152,100 @@ def load_image(filename, is_segmentation=False):
             image.metadata["ClassColors"] = tmp
     else:  # use nibabel
         nbl = nibabel.load(filename)
-        if nbl.ndim == 3:
-            tmp = nbl.get_fdata()
-            tmp = tmp[..., np.newaxis]
-            image = Image(tmp)
+        if is_segmentation and sparse and not lazy:  # scaled slabs of the proxy
+            proxy = nbl.dataobj
+            if nbl.ndim == 3:
+                proxy = proxy.reshape(proxy.shape + (1,))
+            image = Image(
+                SparseLabels.from_dense(
+                    proxy, block=(32, 32, 32, 1), progress=progress
+                )
+            )
+        elif lazy:  # the proxy scales every slice it reads
+            proxy = nbl.dataobj
+            if nbl.ndim == 3:
+                proxy = proxy.reshape(proxy.shape + (1,))
+            image = Image(LazyVolume(proxy))
         else:
-            image = Image(nbl.get_fdata())
+            if (dtype == "native" or is_segmentation) and is_nifti_file(filename):
+                stream = NiftiStream(filename, progress=progress, image=nbl)
+                stream.run()
+                tmp = stream.data  # already 4D
+                scaling = stream.scaling
+            elif dtype == "native" or is_segmentation:
+                tmp = np.asarray(nbl.dataobj.get_unscaled())
+                scaling = (nbl.dataobj.slope, nbl.dataobj.inter)
+            elif dtype == "float":
+                tmp = nbl.get_fdata()
+                scaling = (1.0, 0.0)
+            else:
+                tmp = np.asarray(nbl.dataobj, dtype=dtype)  # scaled
+                scaling = (1.0, 0.0)
+            if tmp.ndim == 3:
+                tmp = tmp[..., np.newaxis]
+            image = Image(tmp, scaling=scaling)
 
         if is_segmentation:
+            if not image.is_lazy() and not image.is_sparse():
+                image = Image(compact_labels(image.apply_scaling(image.data)))
             image.metadata["isSegmentation"] = True
             image.metadata["Classes"] = {}
             image.metadata["ClassColors"] = {}
 
-            indices = np.unique(image.data)
+            indices = _unique_labels(image)
+            palette = pc.qualitative.Plotly  # cycled for label maps with many labels
             for i in indices:
                 image.metadata["Classes"][str(int(i))] = int(i)
                 image.metadata["ClassColors"][str(int(i))] = "rgb" + str(
-                    pc.hex_to_rgb(pc.qualitative.Plotly[int(i)])
+                    pc.hex_to_rgb(palette[int(i) % len(palette)])
                 )
 
     return image
+
+
+def compact_labels(data):
+    """Stores a label volume as the smallest unsigned integer type that holds all labels.
+
+    Args:
+        data (ndarray): the label volume
+
+    Raises:
+        ValueError: if the volume contains negative or non-integer labels
+
+    Returns:
+        ndarray: the labels as uint8, uint16, uint32 or uint64 (no copy if already compact)
+    """
+    data = np.asarray(data)
+    if data.size == 0:
+        return data.astype(np.uint8)
+    if data.dtype.kind == "b":
+        return data.astype(np.uint8)
+    low, high = np.min(data), np.max(data)
+    if low < 0:
+        raise ValueError("Segmentation labels must be non-negative.")
+    if data.dtype.kind == "f":
+        rounded = np.rint(data)
+        if not np.array_equal(rounded, data):
+            raise ValueError("Segmentation labels must be integers.")
+        data = rounded
+    return data.astype(np.min_scalar_type(int(high)), copy=False)
+
+
+def _unique_labels(image):
+    """Returns the sorted unique values of an image, reading one timepoint at a time.
+
+    Args:
+        image (Image): the image
+
+    Returns:
+        ndarray: the unique values
+    """
+    if image.is_sparse():
+        return image.data.unique()
+    if not image.is_lazy():
+        return np.unique(image.data)
+    values = [
+        np.unique(np.asarray(image.get_timepoint(t)))
+        for t in range(image.data.shape[3])
+    ]
+    return np.unique(np.concatenate(values))
@@ -0,0 +1,255 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
+import pandas as pd
+from slicevis.image import SparseLabels
+from slicevis.load import load_image
+
+__all__ = [
+    "confusion_matrix",
+    "metrics_from_confusion",
+    "compare_segmentations",
+    "evaluate_cohort",
+]
+
+
+def confusion_matrix(prediction, reference, num_labels=None, chunk_size=16):
+    """Counts all pairs of labels of two segmentations in a single pass.
+
+    The volumes are processed in slabs along the last axis (the on-disk order of
+    NIfTI files), so that only one slab of combined label codes is held in memory at
+    a time. Without num_labels the matrix grows with the largest label seen so far,
+    so no extra pass over the volumes is needed. Two SparseLabels volumes with the
+    same blocks are compared block by block instead, and blocks that are background
+    in both only add to entry [0, 0].
+
+    Args:
+        prediction (ndarray or SparseLabels): the segmentation to be evaluated
+        reference (ndarray or SparseLabels): the ground truth segmentation (same shape)
+        num_labels (int, optional): number of labels, larger labels are left out.
+            Defaults to the largest label + 1.
+        chunk_size (int, optional): number of slices along the last axis per slab.
+            Defaults to 16.
+
+    Raises:
+        ValueError: if the shapes do not match or labels are negative
+
+    Returns:
+        ndarray: (num_labels, num_labels) matrix, entry [i, j] is the number of
+            voxels labelled i in the prediction and j in the reference
+    """
+    if prediction.shape != reference.shape:
+        raise ValueError("Segmentation shape mismatch.")
+
+    if (
+        isinstance(prediction, SparseLabels)
+        and isinstance(reference, SparseLabels)
+        and prediction.block == reference.block
+    ):
+        if num_labels is None:  # from the stored blocks only
+            num_labels = int(max(prediction.max(), reference.max())) + 1
+        return _sparse_confusion_matrix(prediction, reference, num_labels)
+
+    n = 1 if num_labels is None else num_labels
+    counts = np.zeros((n, n), dtype=np.int64)
+    for start in range(0, prediction.shape[-1], chunk_size):
+        key = (Ellipsis, slice(start, start + chunk_size))
+        pred = _as_labels(prediction[key])
+        ref = _as_labels(reference[key])
+        if pred.size == 0:
+            continue
+        if pred.min() < 0 or ref.min() < 0:
+            raise ValueError("Labels must be non-negative.")
+        if num_labels is None:
+            top = int(max(pred.max(), ref.max())) + 1
+            if top > n:  # grow the matrix for the new labels
+                counts = np.pad(counts, (0, top - n))
+                n = top
+        else:  # drop labels beyond num_labels instead of mixing them up
+            valid = (pred < n) & (ref < n)
+            pred, ref = pred[valid], ref[valid]
+        codes = pred * n + ref
+        counts += np.bincount(codes, minlength=n * n).reshape(n, n)
+    return counts
+
+
+def metrics_from_confusion(confusion, class_names=None, ignore=(0,)):
+    """Derives per-class overlap metrics from a confusion matrix.
+
+    Args:
+        confusion (ndarray): matrix as returned by confusion_matrix
+        class_names (dict, optional): class names and indices. Defaults to all labels.
+        ignore (tuple, optional): class indices to leave out. Defaults to (0,) (unclassified).
+
+    Returns:
+        DataFrame: one row per class (indexed by name) with the columns index, dice,
+            iou, precision, recall, volume, reference_volume, tp, fp and fn
+    """
+    if class_names is None:
+        class_names = {str(i): i for i in range(confusion.shape[0])}
+    names = [name for name, index in class_names.items() if index not in ignore]
+    indices = np.array([class_names[name] for name in names], dtype=np.intp)
+
+    # classes that occur in neither volume have zero counts
+    size = max(confusion.shape[0], indices.max() + 1 if indices.size else 0)
+    padded = np.zeros((size, size), dtype=np.int64)
+    padded[: confusion.shape[0], : confusion.shape[1]] = confusion
+
+    tp = np.diagonal(padded)[indices]
+    volume = padded.sum(axis=1)[indices]  # voxels per class in prediction
+    reference_volume = padded.sum(axis=0)[indices]
+    fp = volume - tp
+    fn = reference_volume - tp
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        table = pd.DataFrame(
+            {
+                "index": indices,
+                "dice": 2 * tp / (volume + reference_volume),
+                "iou": tp / (tp + fp + fn),
+                "precision": tp / volume,
+                "recall": tp / reference_volume,
+                "volume": volume,
+                "reference_volume": reference_volume,
+                "tp": tp,
+                "fp": fp,
+                "fn": fn,
+            },
+            index=pd.Index(names, name="class"),
+        )
+    return table
+
+
+def compare_segmentations(prediction, reference, class_names=None, ignore=(0,)):
+    """Computes Dice, IoU, volume, precision and recall for every class.
+
+    Args:
+        prediction (ndarray): the segmentation to be evaluated
+        reference (ndarray): the ground truth segmentation (same shape)
+        class_names (dict, optional): class names and indices. Defaults to all labels.
+        ignore (tuple, optional): class indices to leave out. Defaults to (0,) (unclassified).
+
+    Returns:
+        DataFrame: per-class metrics, see metrics_from_confusion
+    """
+    confusion = confusion_matrix(prediction, reference)  # a single pass
+    return metrics_from_confusion(confusion, class_names, ignore)
+
+
+def evaluate_cohort(
+    pairs, cases=None, class_names=None, ignore=(0,), processes=None, sparse=True
+):
+    """Computes per-class metrics for many prediction/reference file pairs.
+
+    The cases are evaluated in parallel worker processes, each of which loads one
+    pair with load_image at a time. With sparse=True the segmentations are stored
+    block-sparse (NIfTI files are encoded slab by slab), so that the memory of every
+    worker is bounded by the labelled blocks of one case. All timepoints of 4D
+    segmentations are evaluated. A case that cannot be evaluated (e.g. a missing
+    file or a shape mismatch) does not abort the others, it is reported in the
+    error column instead.
+
+    Args:
+        pairs (list): (prediction file, reference file) per case
+        cases (list, optional): case names. Defaults to the prediction file names.
+        class_names (dict, optional): class names and indices. Defaults to the classes
+            of the reference (and prediction) file of every case.
+        ignore (tuple, optional): class indices to leave out. Defaults to (0,) (unclassified).
+        processes (int, optional): number of worker processes, 1 evaluates in this
+            process. Defaults to the number of CPUs.
+        sparse (bool, optional): load the segmentations block-sparse. Defaults to True.
+
+    Raises:
+        ValueError: if the number of case names does not match the number of pairs
+
+    Returns:
+        DataFrame: tidy table with one row per case, timepoint and class and the
+            columns case, t and class followed by those of metrics_from_confusion;
+            if cases failed, one row per failed case with the exception in the
+            additional column error
+    """
+    pairs = [tuple(pair) for pair in pairs]
+    if cases is None:
+        cases = [os.path.basename(prediction) for prediction, _ in pairs]
+    if len(cases) != len(pairs):
+        raise ValueError("Number of case names does not match the number of pairs.")
+
+    args = [
+        (case, prediction, reference, class_names, ignore, sparse)
+        for case, (prediction, reference) in zip(cases, pairs)
+    ]
+    if processes == 1:
+        tables = [_evaluate_case(arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            tables = list(executor.map(_evaluate_case, args))
+    if not tables:
+        return pd.DataFrame(columns=["case", "t", "class", "index", "dice"])
+    return pd.concat(tables, ignore_index=True)
+
+
+def _evaluate_case(args):
+    """Worker: evaluates one case of evaluate_cohort, errors are returned as a row."""
+    case = args[0]
+    try:
+        return _compare_case(*args)
+    except Exception as err:
+        return pd.DataFrame(
+            {"case": [case], "error": [type(err).__name__ + ": " + str(err)]}
+        )
+
+
+def _compare_case(case, prediction_file, reference_file, class_names, ignore, sparse):
+    """Loads and compares the segmentations of one case of evaluate_cohort."""
+    prediction = load_image(prediction_file, is_segmentation=True, sparse=sparse)
+    reference = load_image(reference_file, is_segmentation=True, sparse=sparse)
+    if prediction.data.shape != reference.data.shape:
+        raise ValueError("Segmentation shape mismatch: " + str(case))
+    if class_names is None:  # reference names win over prediction names
+        class_names = dict(prediction.get_class_names() or {})
+        class_names.update(reference.get_class_names() or {})
+
+    tables = []
+    for t in range(reference.data.shape[3]):
+        table = compare_segmentations(
+            prediction.get_timepoint(t),
+            reference.get_timepoint(t),
+            class_names or None,
+            ignore,
+        ).reset_index()
+        table.insert(0, "t", t)
+        table.insert(0, "case", case)
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+
+def _sparse_confusion_matrix(prediction, reference, num_labels):
+    """Counts label pairs of two SparseLabels volumes with identical blocks."""
+    counts = np.zeros(num_labels * num_labels, dtype=np.int64)
+    blocks = {}  # block grid index -> (slices, prediction block, reference block)
+    for key, slices, data in prediction.blocks():
+        blocks[key] = (slices, data, None)
+    for key, slices, data in reference.blocks():
+        blocks[key] = (slices, blocks.get(key, (None, None))[1], data)
+
+    visited = 0
+    for slices, pred, ref in blocks.values():
+        shape = tuple(s.stop - s.start for s in slices)
+        pred = _as_labels(np.broadcast_to(0 if pred is None else pred, shape))
+        ref = _as_labels(np.broadcast_to(0 if ref is None else ref, shape))
+        valid = (pred < num_labels) & (ref < num_labels)
+        codes = pred[valid] * num_labels + ref[valid]
+        counts += np.bincount(codes, minlength=num_labels * num_labels)
+        visited += pred.size
+    counts[0] += prediction.size - visited  # background in both volumes
+    return counts.reshape(num_labels, num_labels)
+
+
+def _as_labels(array):
+    """Converts a slab of labels to an integer array suitable for np.bincount."""
+    array = np.asarray(array)
+    if array.dtype.kind == "b":
+        return array.astype(np.intp).ravel()
+    if array.dtype.kind not in "iu":
+        array = np.rint(array)
+    return array.astype(np.intp, copy=False).ravel()
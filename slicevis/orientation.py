@@ -0,0 +1,170 @@
+import numpy as np
+
+__all__ = ["Orientation"]
+
+
+class Orientation:
+    """Composable rotation/flip state of a 3D view on a volume.
+
+    View axis k shows volume axis perm[k], reversed if flips[k]. Rotations and flips
+    only change this state; it is applied to extracted 2D slices, so the volume itself
+    is never re-wrapped. Instances are immutable and hashable (usable in cache keys).
+    """
+
+    def __init__(self, perm=(0, 1, 2), flips=(False, False, False)) -> None:
+        """Constructor
+
+        Args:
+            perm (tuple, optional): volume axis of every view axis. Defaults to (0, 1, 2).
+            flips (tuple, optional): whether a view axis is reversed. Defaults to no flips.
+        """
+        self.perm = tuple(int(p) for p in perm)
+        self.flips = tuple(bool(f) for f in flips)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Orientation)
+            and self.perm == other.perm
+            and self.flips == other.flips
+        )
+
+    def __hash__(self):
+        return hash((self.perm, self.flips))
+
+    def __repr__(self):
+        return "Orientation(perm=" + str(self.perm) + ", flips=" + str(self.flips) + ")"
+
+    def rotate(self, axes):
+        """Returns the orientation rotated by 90 degrees (like np.rot90(view, axes=axes)).
+
+        Args:
+            axes (list): the two view axes of the rotation plane
+
+        Returns:
+            Orientation: the new orientation
+        """
+        a, b = axes
+        perm = list(self.perm)
+        flips = list(self.flips)
+        perm[a], perm[b] = self.perm[b], self.perm[a]
+        flips[a], flips[b] = not self.flips[b], self.flips[a]
+        return Orientation(perm, flips)
+
+    def flip(self, axis):
+        """Returns the orientation flipped along a view axis (like np.flip(view, axis)).
+
+        Args:
+            axis (int): the view axis
+
+        Returns:
+            Orientation: the new orientation
+        """
+        flips = list(self.flips)
+        flips[axis] = not flips[axis]
+        return Orientation(self.perm, flips)
+
+    def shape(self, shape):
+        """Returns the shape of the view.
+
+        Args:
+            shape (tuple): shape of the volume
+
+        Returns:
+            tuple: shape of the view
+        """
+        return tuple(shape[p] for p in self.perm)
+
+    def source_index(self, axis, index, shape):
+        """Maps a slice of the view to a slice of the volume.
+
+        Args:
+            axis (int): view axis
+            index (int): slice index along the view axis
+            shape (tuple): shape of the volume
+
+        Returns:
+            tuple: (volume axis, volume index)
+        """
+        source_axis = self.perm[axis]
+        if self.flips[axis]:
+            index = shape[source_axis] - 1 - index
+        return source_axis, index
+
+    def source_voxel(self, view_index, shape):
+        """Maps a voxel of the view to a voxel of the volume.
+
+        Args:
+            view_index (tuple): 3D voxel index in the view
+            shape (tuple): shape of the volume
+
+        Returns:
+            tuple: 3D voxel index in the volume
+        """
+        index = [0, 0, 0]
+        for k in range(3):
+            i = int(view_index[k])
+            if self.flips[k]:
+                i = shape[self.perm[k]] - 1 - i
+            index[self.perm[k]] = i
+        return tuple(index)
+
+    def orient_slice(self, slice2D, axis):
+        """Transforms a volume slice into the corresponding view slice.
+
+        Only strides change (no copy), so the cost is independent of the volume size.
+
+        Args:
+            slice2D (ndarray): slice of the volume along self.perm[axis], with the
+                remaining volume axes in ascending order
+            axis (int): view axis
+
+        Returns:
+            ndarray: the view slice
+        """
+        rows, cols = [k for k in range(3) if k != axis]
+        if self.perm[rows] > self.perm[cols]:
+            slice2D = slice2D.T
+        if self.flips[rows]:
+            slice2D = slice2D[::-1, :]
+        if self.flips[cols]:
+            slice2D = slice2D[:, ::-1]
+        return slice2D
+
+    def orient_box(self, box, axis, shape):
+        """Transforms a bounding box of a volume slice into the view slice.
+
+        Args:
+            box (tuple): inclusive (row_min, row_max, col_min, col_max) in the volume
+                slice, see orient_slice
+            axis (int): view axis
+            shape (tuple): shape of the volume
+
+        Returns:
+            tuple: inclusive (row_min, row_max, col_min, col_max) in the view slice
+        """
+        rows, cols = [k for k in range(3) if k != axis]
+        r0, r1, c0, c1 = box
+        if self.perm[rows] > self.perm[cols]:
+            r0, r1, c0, c1 = c0, c1, r0, r1
+        if self.flips[rows]:
+            n = shape[self.perm[rows]]
+            r0, r1 = n - 1 - r1, n - 1 - r0
+        if self.flips[cols]:
+            n = shape[self.perm[cols]]
+            c0, c1 = n - 1 - c1, n - 1 - c0
+        return r0, r1, c0, c1
+
+    def apply(self, volume):
+        """Applies the orientation to a whole volume (returns a strided view).
+
+        Args:
+            volume (ndarray): the 3D volume
+
+        Returns:
+            ndarray: the view
+        """
+        view = np.transpose(volume, self.perm)
+        for k in range(3):
+            if self.flips[k]:
+                view = np.flip(view, axis=k)
+        return view
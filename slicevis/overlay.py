@@ -0,0 +1,135 @@
+import numpy as np
+import plotly.colors as pc
+
+__all__ = [
+    "parse_color",
+    "overlay_classes",
+    "build_label_lut",
+    "label_to_rgba",
+    "composite_rgba",
+]
+
+WHITE = "rgb(255,255,255)"
+
+
+def parse_color(color):
+    """Converts a Plotly color string to an RGB tuple.
+
+    Args:
+        color (str): color as "rgb(r,g,b)", "rgba(r,g,b,a)" or "#rrggbb"
+
+    Returns:
+        tuple: (r, g, b) integers in [0, 255]
+    """
+    color = str(color).strip()
+    if color.startswith("#"):
+        return tuple(int(c) for c in pc.hex_to_rgb(color))
+    values = color[color.index("(") + 1 : color.index(")")].split(",")
+    return tuple(int(float(v)) for v in values[:3])
+
+
+def overlay_classes(class_names, class_colors, primary_names=None, primary_colors=None):
+    """Resolves the classes of a segmentation that are painted on top of the image.
+
+    Validation segmentations (primary_names given) take the names and colors of the
+    primary segmentation's classes with the same index, so that matching classes look
+    alike. A validation segmentation with a single class is painted in white.
+
+    Args:
+        class_names (dict): class name -> label index
+        class_colors (dict): class name -> color
+        primary_names (dict, optional): class names of the primary segmentation, only
+            for validation segmentations. Defaults to None.
+        primary_colors (dict, optional): class colors of the primary segmentation.
+            Defaults to None.
+
+    Returns:
+        list: (index, name, color) tuples, unclassified (0) excluded, colors missing
+            in both segmentations are white
+    """
+    primary = {}
+    for name, index in (primary_names or {}).items():
+        primary.setdefault(index, name)
+    classes = []
+    for name, index in class_names.items():
+        if index == 0:  # unclassified
+            continue
+        color = class_colors.get(name, WHITE)
+        if primary_names is not None:
+            if len(class_names) == 2:  # white if only one class
+                color = WHITE
+            elif index in primary:
+                name = primary[index]
+                color = (primary_colors or {}).get(name, color)
+        classes.append((index, name, color))
+    return classes
+
+
+def build_label_lut(classes, opacity=1.0):
+    """Builds an RGBA lookup table that maps label values to colors.
+
+    The table has one extra transparent row at the end, so that labels above the
+    largest class index can be clipped onto it.
+
+    Args:
+        classes (list): list of (index, color) tuples, color as accepted by parse_color
+        opacity (float, optional): opacity of all classes. Defaults to 1.0.
+
+    Returns:
+        ndarray: (max_index + 2, 4) uint8 lookup table
+    """
+    max_index = max([int(index) for index, _ in classes], default=0)
+    lut = np.zeros((max_index + 2, 4), dtype=np.uint8)
+    alpha = int(round(255 * opacity))
+    for index, color in classes:
+        if int(index) < 0:
+            continue
+        lut[int(index), :3] = parse_color(color)
+        lut[int(index), 3] = alpha
+    return lut
+
+
+def label_to_rgba(labels, lut):
+    """Colors a label image with a lookup table.
+
+    Args:
+        labels (ndarray): 2D label image
+        lut (ndarray): lookup table as returned by build_label_lut
+
+    Returns:
+        ndarray: RGBA image of shape labels.shape + (4,) and type uint8
+    """
+    labels = np.asarray(labels)
+    if labels.dtype.kind not in "iu":
+        labels = labels.astype(np.intp)
+    # out of range labels end up in the transparent last (or the background) row
+    return np.take(lut, labels, axis=0, mode="clip")
+
+
+def composite_rgba(layers):
+    """Alpha-composites RGBA images on top of each other.
+
+    Args:
+        layers (list): RGBA uint8 images of identical shape, bottom layer first
+
+    Returns:
+        ndarray: the composited RGBA uint8 image (None if layers is empty)
+    """
+    layers = [layer for layer in layers if layer is not None]
+    if len(layers) == 0:
+        return None
+    if len(layers) == 1:
+        return layers[0]
+
+    out_rgb = np.zeros(layers[0].shape[:-1] + (3,), dtype=np.float32)
+    out_alpha = np.zeros(layers[0].shape[:-1] + (1,), dtype=np.float32)
+    for layer in layers:  # "over" operator with premultiplied colors
+        alpha = layer[..., 3:].astype(np.float32) / 255
+        out_rgb = layer[..., :3] * alpha + out_rgb * (1 - alpha)
+        out_alpha = alpha + out_alpha * (1 - alpha)
+
+    rgba = np.empty(layers[0].shape, dtype=np.uint8)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rgba[..., :3] = np.nan_to_num(out_rgb / out_alpha).round()
+    rgba[..., 3:] = (out_alpha * 255).round()
+    return rgba
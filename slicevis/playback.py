@@ -0,0 +1,135 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import threading
+import time
+
+__all__ = ["PlaybackPipeline"]
+
+
+class PlaybackPipeline:
+    """Plays timepoints at a target frame rate from a buffer of prepared frames.
+
+    Producer threads prepare (e.g. extract and encode) the next frames ahead of time,
+    a consumer thread publishes one frame per tick. A frame that is not ready when it
+    is due is waited for. Afterwards the timepoints whose ticks have passed meanwhile
+    are dropped, so that playback keeps its pace, or (without dropping) playback
+    continues at a lower frame rate.
+    """
+
+    def __init__(
+        self, prepare, publish, fps=10.0, buffer_size=8, workers=2, drop_frames=True
+    ) -> None:
+        """Constructor
+
+        Args:
+            prepare (callable): function (t) -> frame, must be thread-safe
+            publish (callable): function (t, frame) that shows a frame
+            fps (float, optional): target frame rate. Defaults to 10.
+            buffer_size (int, optional): number of frames prepared ahead. Defaults to 8.
+            workers (int, optional): number of producer threads. Defaults to 2.
+            drop_frames (bool, optional): skip timepoints to catch up after late frames
+                instead of lowering the frame rate. Defaults to True.
+        """
+        self.prepare = prepare
+        self.publish = publish
+        self.fps = float(fps)
+        self.buffer_size = max(1, int(buffer_size))
+        self.workers = max(1, int(workers))
+        self.drop_frames = drop_frames
+        self.dropped = 0  # frames skipped since start
+        self.shown = 0  # frames published since start
+        self._times = deque(maxlen=30)  # publish times for the measured frame rate
+        self._running = False
+        self._thread = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def is_running(self):
+        """Returns whether playback is active.
+
+        Returns:
+            bool: True while playing
+        """
+        return self._running
+
+    def start(self, first, count):
+        """Starts looping over the timepoints first, first + 1, ..., count - 1, 0, ...
+
+        Args:
+            first (int): the first timepoint
+            count (int): number of timepoints
+        """
+        self.stop()
+        self.dropped = 0
+        self.shown = 0
+        self._times.clear()
+        self._running = True
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._thread = threading.Thread(
+            target=self._play, args=(first, count), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stops playback after the current frame."""
+        self._running = False
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def measured_fps(self):
+        """Returns the frame rate of the recently published frames.
+
+        Returns:
+            float: frames per second (0 before two frames were shown)
+        """
+        with self._lock:
+            if len(self._times) < 2:
+                return 0.0
+            span = self._times[-1] - self._times[0]
+            return (len(self._times) - 1) / span if span > 0 else 0.0
+
+    def _play(self, first, count):
+        """Consumer thread: publishes one buffered frame per tick."""
+        executor = self._executor
+        pending = {}  # t -> Future, at most buffer_size frames ahead
+        t = first
+        deadline = time.monotonic()
+        while self._running:
+            for k in range(self.buffer_size):  # keep the buffer full
+                ahead = (t + k) % count
+                if ahead not in pending:
+                    pending[ahead] = executor.submit(self.prepare, ahead)
+            future = pending.pop(t)
+            interval = 1.0 / self.fps if self.fps > 0 else 0.0
+
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            frame = future.result()  # waits if the frame is late
+            if not self._running:
+                break
+            self.publish(t, frame)
+            self.shown += 1
+            with self._lock:
+                self._times.append(time.monotonic())
+
+            # skip the timepoints whose ticks passed while waiting
+            skip = 0
+            if self.drop_frames and interval > 0:
+                late = time.monotonic() - deadline
+                skip = min(int(late // interval), count - 1)
+            for k in range(1, skip + 1):
+                late_future = pending.pop((t + k) % count, None)
+                if late_future is not None:
+                    late_future.cancel()
+                self.dropped += 1
+            t = (t + 1 + skip) % count
+            deadline += (1 + skip) * interval
+            if time.monotonic() > deadline + interval:  # far behind: do not catch up
+                deadline = time.monotonic()
+
+        for future in pending.values():  # frames that will not be shown
+            future.cancel()
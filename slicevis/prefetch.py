@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+import threading
+
+__all__ = ["SlicePrefetcher"]
+
+
+class SlicePrefetcher:
+    """Prepares slices ahead of time on a thread pool and stores them in a SliceCache."""
+
+    def __init__(self, prepare, cache, depth=2, workers=2) -> None:
+        """Constructor
+
+        Args:
+            prepare (callable): function (*args) -> payload, must be thread-safe
+            cache (SliceCache): cache that receives the prepared payloads
+            depth (int, optional): number of slices prepared on each side of the
+                current slice, 0 disables prefetching. Defaults to 2.
+            workers (int, optional): number of worker threads. Defaults to 2.
+        """
+        self.prepare = prepare
+        self.cache = cache
+        self.depth = int(depth)
+        self.workers = int(workers)
+        self._executor = None
+        self._pending = {}  # key -> Future
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def prefetch(self, make_request, index, size):
+        """Schedules the neighbours index-depth ... index+depth of a slice.
+
+        Slices closest to index are submitted first.
+
+        Args:
+            make_request (callable): function (index) -> (cache key, prepare arguments)
+            index (int): the current slice index
+            size (int): number of slices along the axis
+        """
+        if self.depth <= 0 or self.workers <= 0:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="slicevis-prefetch"
+            )
+
+        for offset in range(1, self.depth + 1):
+            for neighbour in (index + offset, index - offset):
+                if 0 <= neighbour < size:
+                    self._submit(*make_request(neighbour))
+
+    def result(self, key):
+        """Waits for a slice that is currently being prepared.
+
+        Slices that are still queued behind other jobs are not waited for: they are
+        cancelled, so that the caller prepares them right away.
+
+        Args:
+            key (hashable): the cache key
+
+        Returns:
+            object: the payload (None if the slice was not scheduled, still queued or
+                was cancelled)
+        """
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                return None
+            if future.cancel():  # not started yet
+                self._pending.pop(key, None)
+                return None
+        try:
+            return future.result()
+        except CancelledError:
+            return None
+
+    def cancel(self):
+        """Cancels all scheduled slices, e.g. after the view changed.
+
+        Slices that are already being prepared finish, but are not stored.
+        """
+        with self._lock:
+            self._generation += 1
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+
+    def shutdown(self):
+        """Cancels all scheduled slices and stops the worker threads."""
+        self.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _submit(self, key, args):
+        """Submits a single slice unless it is cached or already scheduled."""
+        if key in self.cache:
+            return
+        with self._lock:
+            if key in self._pending:
+                return
+            generation = self._generation
+            future = self._executor.submit(self._run, key, args, generation)
+            self._pending[key] = future
+
+    def _run(self, key, args, generation):
+        """Worker: prepares a slice and stores it if it is still wanted."""
+        try:
+            payload = self.prepare(*args)
+            if generation == self._generation:
+                # store before leaving _pending, so that no lookup misses the slice
+                self.cache.put(key, payload)
+        finally:  # also if prepare raises, so that the slice is scheduled again
+            with self._lock:
+                if generation == self._generation:
+                    self._pending.pop(key, None)
+        return payload
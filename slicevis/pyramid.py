@@ -0,0 +1,146 @@
+import threading
+import numpy as np
+
+__all__ = ["Pyramid"]
+
+
+class Pyramid:
+    """Multi-resolution pyramid of a 3D volume.
+
+    Level k has 2**k times fewer voxels along every axis. In "mean" mode the levels
+    are block averages that are built once (optionally on a background thread), until
+    then and in "nearest" mode every 2**k-th voxel of the volume is used, which needs
+    no extra memory and suits label volumes.
+    """
+
+    def __init__(self, volume, levels=1, mode="mean", background=True) -> None:
+        """Constructor
+
+        Args:
+            volume (ndarray): the 3D volume (or any array-like with basic indexing)
+            levels (int, optional): number of coarse levels. Defaults to 1.
+            mode (str, optional): "mean" or "nearest". Defaults to "mean".
+            background (bool, optional): build "mean" levels on a background thread
+                instead of on first use. Defaults to True.
+
+        Raises:
+            ValueError: if mode is unknown
+        """
+        if mode not in ("mean", "nearest"):
+            raise ValueError("mode must be 'mean' or 'nearest'")
+        self.volume = volume
+        self.levels = int(levels)
+        self.mode = mode
+        self._built = [volume]  # block averages, index = level
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._thread = None
+        if mode == "mean" and self.levels > 0 and background:
+            self._thread = threading.Thread(target=self.build, daemon=True)
+            self._thread.start()
+
+    @staticmethod
+    def factor(level):
+        """Returns the downsampling factor of a level.
+
+        Args:
+            level (int): the level
+
+        Returns:
+            int: 2**level
+        """
+        return 2**level
+
+    def shape(self, level):
+        """Returns the shape of a level.
+
+        Args:
+            level (int): the level
+
+        Returns:
+            tuple: ceil(n / 2**level) for every axis
+        """
+        f = self.factor(level)
+        return tuple(-(-n // f) for n in self.volume.shape)
+
+    def is_built(self):
+        """Returns whether all averaged levels are available.
+
+        Returns:
+            bool: True if nothing remains to be built
+        """
+        return self.mode == "nearest" or len(self._built) > self.levels
+
+    def build(self):
+        """Builds all averaged levels (no-op in "nearest" mode or after cancel)."""
+        if self.mode != "mean":
+            return
+        with self._lock:
+            while len(self._built) <= self.levels:
+                level = _downsample_mean(self._built[-1], self._cancelled)
+                if level is None:
+                    return
+                self._built.append(level)
+
+    def cancel(self):
+        """Stops building averaged levels, e.g. when the pyramid was superseded.
+
+        Levels that are not built yet keep using the nearest neighbour fallback.
+        """
+        self._cancelled.set()
+
+    def get_slice(self, axis, index, level=0):
+        """Extracts a 2D slice at a given level.
+
+        Args:
+            axis (int): the slice axis
+            index (int): the slice index in full resolution coordinates
+            level (int, optional): the level. Defaults to 0 (full resolution).
+
+        Returns:
+            ndarray: the 2D slice, of shape self.shape(level) without axis
+        """
+        level = min(level, self.levels)
+        f = self.factor(level)
+        key = [slice(None)] * 3
+        if level < len(self._built):  # appended atomically, so no lock is needed
+            key[axis] = index // f
+            return self._built[level][tuple(key)]
+
+        key = [slice(None, None, f)] * 3  # nearest neighbour fallback
+        key[axis] = (index // f) * f
+        return self.volume[tuple(key)]
+
+
+def _downsample_mean(volume, cancelled=None):
+    """Averages blocks of 2x2x2 voxels, slab by slab to bound temporary memory.
+
+    Trailing blocks of odd-sized axes are averaged with replicated edge voxels.
+
+    Args:
+        volume (ndarray): the 3D volume
+        cancelled (Event, optional): checked before every slab. Defaults to None.
+
+    Returns:
+        ndarray: float32 volume of shape ceil(n / 2) (None if cancelled)
+    """
+    shape = tuple(-(-n // 2) for n in volume.shape)
+    out = np.empty(shape, dtype=np.float32)
+    for i in range(shape[0]):
+        if cancelled is not None and cancelled.is_set():
+            return None
+        slab = np.asarray(volume[2 * i : 2 * i + 2], dtype=np.float32)
+        pad = [(0, 2 - slab.shape[0])] + [(0, n % 2) for n in slab.shape[1:]]
+        if any(p[1] for p in pad):
+            slab = np.pad(slab, pad, mode="edge")
+        out[i] = (
+            slab[0, 0::2, 0::2]
+            + slab[0, 1::2, 0::2]
+            + slab[0, 0::2, 1::2]
+            + slab[0, 1::2, 1::2]
+            + slab[1, 0::2, 0::2]
+            + slab[1, 1::2, 0::2]
+            + slab[1, 0::2, 1::2]
+            + slab[1, 1::2, 1::2]
+        ) / 8
+    return out
@@ -0,0 +1,493 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
+from PIL import Image as PILImage
+from slicevis.intensity import IntensityStats
+from slicevis.load import load_image
+from slicevis.orientation import Orientation
+from slicevis.overlay import (
+    build_label_lut,
+    composite_rgba,
+    label_to_rgba,
+    overlay_classes,
+)
+from slicevis.transport import colorscale_lut, render_rgb
+
+__all__ = [
+    "SEG_OPACITY",
+    "VALIDATION_OPACITY",
+    "SEG_OUTLINE_OPACITY",
+    "VALIDATION_OUTLINE_OPACITY",
+    "SliceRenderer",
+    "class_pixels",
+    "indexed_rgba",
+    "label_outlines",
+    "outline_rgba",
+    "overlay_rgba",
+    "save_png",
+    "export_slices",
+]
+
+SEG_OPACITY = 0.5  # opacity of segmentation overlays
+VALIDATION_OPACITY = 0.3  # opacity of validation overlays (drawn below)
+SEG_OUTLINE_OPACITY = 1.0  # outlines are thin, so they can be opaque
+VALIDATION_OUTLINE_OPACITY = 0.6
+
+
+class SliceRenderer:
+    """Headless renderer of image slices with segmentation overlays.
+
+    It extracts oriented slices, composites the overlays and applies window and
+    colormap exactly like SliceWidget with an encoded transport, but needs no Jupyter
+    front-end. Rendered slices are RGB uint8 arrays, which can be tiled to montages
+    and written as PNG files.
+    """
+
+    def __init__(
+        self,
+        image3D,
+        seg3D=None,
+        validation3D=None,
+        classes=None,
+        validation_classes=None,
+        colormap="gray",
+        window=None,
+        orientation=None,
+        outline=False,
+    ) -> None:
+        """Constructor
+
+        Args:
+            image3D (ndarray): the 3D image (or an array-like with basic indexing)
+            seg3D (ndarray, optional): segmentation of the same shape. Defaults to None.
+            validation3D (ndarray, optional): validation segmentation of the same
+                shape. Defaults to None.
+            classes (list, optional): (index, color) of the segmentation classes,
+                unclassified excluded. Defaults to all labels in white.
+            validation_classes (list, optional): (index, color) of the validation
+                classes. Defaults to all labels in white.
+            colormap (str, optional): name of a Plotly colorscale. Defaults to "gray".
+            window (tuple or str, optional): (min, max) intensity window, or "auto"
+                for the 0.5th to 99.5th percentile. Defaults to the intensity range of
+                the image.
+            orientation (Orientation, optional): rotations/flips of the view.
+                Defaults to none.
+            outline (bool, optional): draw the class outlines instead of filled
+                regions. Defaults to False.
+
+        Raises:
+            ValueError: if a volume is not 3D or the shapes do not match
+        """
+        if image3D.ndim != 3:
+            raise ValueError("input image must be 3D")
+        for volume in (seg3D, validation3D):
+            if volume is not None and volume.shape != image3D.shape:
+                raise ValueError("Segmentation shape mismatch.")
+        self.image3D = image3D
+        self.seg3D = seg3D
+        self.validation3D = validation3D
+        self.orientation = Orientation() if orientation is None else orientation
+        if window is None or window == "auto":  # one streaming pass over the image
+            stats = IntensityStats.from_volume(image3D)
+            window = (stats.min, stats.max) if window is None else stats.auto_window()
+        self.window = (float(window[0]), float(window[1]))
+        self.color_lut = colorscale_lut(colormap)
+        self.outline = outline
+        opacities = (SEG_OPACITY, VALIDATION_OPACITY)
+        if outline:
+            opacities = (SEG_OUTLINE_OPACITY, VALIDATION_OUTLINE_OPACITY)
+        self.lut = _class_lut(seg3D, classes, opacities[0])
+        self.lut_validation = _class_lut(validation3D, validation_classes, opacities[1])
+
+    @classmethod
+    def from_files(
+        cls, image_file, segmentation_file=None, validation_file=None, t=0, **kwargs
+    ):
+        """Loads the volumes (one timepoint) and their class colors with load_image.
+
+        The image is loaded into memory, since every rendered slice of a compressed
+        file would decompress it again. Classes are resolved like in SliceWidget (see
+        overlay_classes), so validation layers use the colors of the segmentation.
+
+        Args:
+            image_file (str): the image file
+            segmentation_file (str, optional): the segmentation file. Defaults to None.
+            validation_file (str, optional): the validation file. Defaults to None.
+            t (int, optional): the timepoint. Defaults to 0.
+            kwargs: further arguments of the constructor (e.g. colormap, window)
+
+        Returns:
+            SliceRenderer: the renderer
+        """
+        image3D = load_image(image_file).get_timepoint(t)
+        volumes = {}
+        names, colors = {}, {}  # classes of the segmentation
+        for name, file in (
+            ("seg3D", segmentation_file),
+            ("validation3D", validation_file),
+        ):
+            if file is None:
+                continue
+            seg_image = load_image(file, is_segmentation=True)
+            volumes[name] = seg_image.get_timepoint(t)
+            if name == "seg3D":
+                names = seg_image.get_class_names() or {}
+                colors = seg_image.get_class_colors() or {}
+                classes = overlay_classes(names, colors)
+                kwargs.setdefault("classes", [(c, color) for c, _, color in classes])
+            else:
+                classes = overlay_classes(
+                    seg_image.get_class_names() or {},
+                    seg_image.get_class_colors() or {},
+                    names,
+                    colors,
+                )
+                kwargs.setdefault(
+                    "validation_classes", [(c, color) for c, _, color in classes]
+                )
+        return cls(image3D, **volumes, **kwargs)
+
+    def shape(self):
+        """Returns the shape of the (rotated/flipped) view.
+
+        Returns:
+            tuple: the view shape
+        """
+        return self.orientation.shape(self.image3D.shape)
+
+    def extract(self, axis, index):
+        """Extracts the oriented slices of all volumes.
+
+        Args:
+            axis (int): the slice axis (of the view)
+            index (int): the slice index (of the view)
+
+        Returns:
+            dict: "image", "seg" and "validation" slices (None if not given)
+        """
+        source_axis, source_index = self.orientation.source_index(
+            axis, index, self.image3D.shape
+        )
+        key = [slice(None)] * 3
+        key[source_axis] = source_index
+        frame = {}
+        for layer, volume in (
+            ("image", self.image3D),
+            ("seg", self.seg3D),
+            ("validation", self.validation3D),
+        ):
+            frame[layer] = None
+            if volume is not None:
+                slice2D = np.asarray(volume[tuple(key)])
+                frame[layer] = self.orientation.orient_slice(slice2D, axis)
+        return frame
+
+    def render(self, axis, index):
+        """Renders a slice with its overlays.
+
+        Args:
+            axis (int): the slice axis (of the view)
+            index (int): the slice index (of the view)
+
+        Returns:
+            ndarray: RGB uint8 image
+        """
+        frame = self.extract(axis, index)
+        overlay = overlay_rgba(
+            [
+                (frame["validation"], self.lut_validation, None),
+                (frame["seg"], self.lut, None),
+            ],
+            self.outline,
+        )
+        return render_rgb(frame["image"], *self.window, self.color_lut, overlay)
+
+    def montage(self, axis, indices, columns=None, padding=2):
+        """Renders several slices into one tiled image.
+
+        Args:
+            axis (int): the slice axis (of the view)
+            indices (list): the slice indices, row by row
+            columns (int, optional): number of tiles per row. Defaults to a roughly
+                square grid.
+            padding (int, optional): black pixels between tiles. Defaults to 2.
+
+        Raises:
+            ValueError: if no slice indices are given
+
+        Returns:
+            ndarray: RGB uint8 image
+        """
+        indices = list(indices)
+        if not indices:
+            raise ValueError("A montage needs at least one slice index.")
+        if columns is None:
+            columns = int(np.ceil(np.sqrt(len(indices))))
+        columns = max(1, min(columns, len(indices)))
+        rows = -(-len(indices) // columns)
+        height, width = [n for k, n in enumerate(self.shape()) if k != axis]
+        out = np.zeros(
+            (
+                rows * height + (rows - 1) * padding,
+                columns * width + (columns - 1) * padding,
+                3,
+            ),
+            dtype=np.uint8,
+        )
+        for i, index in enumerate(indices):
+            r, c = divmod(i, columns)
+            y, x = r * (height + padding), c * (width + padding)
+            out[y : y + height, x : x + width] = self.render(axis, index)
+        return out
+
+
+def save_png(rgb, path):
+    """Writes an RGB(A) uint8 image as a PNG file.
+
+    Args:
+        rgb (ndarray): the image
+        path (str): the file name
+    """
+    PILImage.fromarray(np.ascontiguousarray(rgb)).save(path, format="PNG")
+
+
+def export_slices(
+    jobs, output_dir, processes=None, montage=True, count=16, axes=(2,), **kwargs
+):
+    """Renders slices of many volumes to PNG files in parallel worker processes.
+
+    Every job describes one case as a dict with the keys "image" (file name) and
+    optionally "segmentation", "validation", "name" (file name prefix, defaults to the
+    image file name), "axes" and "slices" (indices, defaults to count evenly spaced
+    slices per axis). Either one montage per case and axis is written, or one frame
+    per slice.
+
+    Args:
+        jobs (list): the cases
+        output_dir (str): directory of the PNG files (created if missing)
+        processes (int, optional): number of worker processes, 1 renders in this
+            process. Defaults to the number of CPUs.
+        montage (bool, optional): write montages instead of frame sequences.
+            Defaults to True.
+        count (int, optional): default number of slices per axis. Defaults to 16.
+        axes (tuple, optional): default slice axes. Defaults to (2,) (axial).
+        kwargs: further arguments of SliceRenderer (e.g. colormap, window)
+
+    Returns:
+        list: the written file names of every job
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    args = [(job, output_dir, montage, count, axes, kwargs) for job in jobs]
+    if processes == 1:
+        return [_export_job(arg) for arg in args]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(_export_job, args))
+
+
+def _export_job(args):
+    """Worker: renders one case of export_slices."""
+    job, output_dir, montage, count, axes, kwargs = args
+    renderer = SliceRenderer.from_files(
+        job["image"], job.get("segmentation"), job.get("validation"), **kwargs
+    )
+    name = job.get("name")
+    if name is None:
+        name = os.path.basename(job["image"]).split(".")[0]
+
+    written = []
+    for axis in job.get("axes", axes):
+        size = renderer.shape()[axis]
+        indices = job.get("slices")
+        if indices is None:  # evenly spaced, excluding the outermost slices
+            n = min(count, size)
+            indices = np.linspace(0, size - 1, n + 2)[1:-1].round().astype(int)
+        if len(indices) == 0:  # nothing to write for this axis
+            continue
+        prefix = os.path.join(output_dir, name + "_axis" + str(axis))
+        if montage:
+            save_png(renderer.montage(axis, indices), prefix + ".png")
+            written.append(prefix + ".png")
+            continue
+        for index in indices:
+            path = prefix + "_" + str(int(index)).zfill(4) + ".png"
+            save_png(renderer.render(axis, int(index)), path)
+            written.append(path)
+    return written
+
+
+def class_pixels(labels2D, c, labels=None):
+    """Returns the pixel indices of a class in a label slice.
+
+    Args:
+        labels2D (ndarray): the label slice
+        c (int): the class index
+        labels (tuple, optional): present labels and their bounding boxes, see
+            SliceWidget._slice_labels. Defaults to None (scan the whole slice).
+
+    Returns:
+        tuple: (rows, columns) index arrays
+    """
+    if labels is not None:
+        present, boxes = labels
+        if c not in present:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty
+        if c in boxes:
+            r0, r1, c0, c1 = boxes[c]
+            rows, cols = np.nonzero(labels2D[r0 : r1 + 1, c0 : c1 + 1] == c)
+            return rows + r0, cols + c0
+    return np.nonzero(labels2D == c)
+
+
+def indexed_rgba(labels2D, lut, labels=None):
+    """Colors a label slice, skipping empty slices and pixels outside all labels.
+
+    Args:
+        labels2D (ndarray): the label slice
+        lut (ndarray): lookup table as returned by build_label_lut
+        labels (tuple, optional): present labels and their bounding boxes, see
+            SliceWidget._slice_labels. Defaults to None (color the whole slice).
+
+    Returns:
+        ndarray: the RGBA image (None if the slice has no labels)
+    """
+    box = _labelled_box(labels2D, labels)
+    if box is None:
+        return None
+    r0, r1, c0, c1 = box
+    if (r0, c0) == (0, 0) and (r1 + 1, c1 + 1) == labels2D.shape:
+        return label_to_rgba(labels2D, lut)
+    rgba = np.zeros(labels2D.shape + (4,), dtype=np.uint8)
+    rgba[r0 : r1 + 1, c0 : c1 + 1] = label_to_rgba(
+        labels2D[r0 : r1 + 1, c0 : c1 + 1], lut
+    )
+    return rgba
+
+
+def label_outlines(labels2D, continued=None):
+    """Keeps only the boundary pixels of every labelled region of a slice.
+
+    A labelled pixel is on the boundary if one of its four neighbours has another
+    label; pixels outside the slice count as unlabelled, unless the slice is a
+    cropped part of a larger one. There the pixels beyond the crop are assumed to
+    continue the labels of the edge, so that regions extending past it get no
+    outline along it. All pixels are compared at once with shifted views of the
+    padded slice.
+
+    Args:
+        labels2D (ndarray): the label slice
+        continued (tuple, optional): whether the slice continues beyond its (top,
+            bottom, left, right) edge. Defaults to None (the whole slice).
+
+    Returns:
+        ndarray: the labels of the boundary pixels, 0 elsewhere
+    """
+    padded = np.pad(labels2D, 1)
+    if continued is not None:  # repeat the edges (corners are never compared)
+        top, bottom, left, right = continued
+        if top:
+            padded[0, 1:-1] = labels2D[0]
+        if bottom:
+            padded[-1, 1:-1] = labels2D[-1]
+        if left:
+            padded[1:-1, 0] = labels2D[:, 0]
+        if right:
+            padded[1:-1, -1] = labels2D[:, -1]
+    edge = padded[:-2, 1:-1] != labels2D
+    edge |= padded[2:, 1:-1] != labels2D
+    edge |= padded[1:-1, :-2] != labels2D
+    edge |= padded[1:-1, 2:] != labels2D
+    return np.where(edge, labels2D, 0).astype(labels2D.dtype, copy=False)
+
+
+def outline_rgba(labels2D, lut, labels=None, continued=None):
+    """Colors the outlines of the labelled regions of a slice.
+
+    Only the bounding box of all labels is examined, outside it every pixel is
+    unlabelled, so that the outlines inside are the same as for the whole slice.
+
+    Args:
+        labels2D (ndarray): the label slice
+        lut (ndarray): lookup table as returned by build_label_lut
+        labels (tuple, optional): present labels and their bounding boxes, see
+            SliceWidget._slice_labels. Defaults to None (examine the whole slice).
+        continued (tuple, optional): edges of a cropped slice, see label_outlines.
+            Defaults to None (the whole slice).
+
+    Returns:
+        ndarray: the RGBA image (None if the slice has no labels)
+    """
+    box = _labelled_box(labels2D, labels)
+    if box is None:
+        return None
+    r0, r1, c0, c1 = box
+    if continued is not None:  # only edges of the box on a continued slice edge
+        rows, cols = labels2D.shape
+        touches = (r0 == 0, r1 == rows - 1, c0 == 0, c1 == cols - 1)
+        continued = tuple(a and b for a, b in zip(continued, touches))
+    rgba = np.zeros(labels2D.shape + (4,), dtype=np.uint8)
+    rgba[r0 : r1 + 1, c0 : c1 + 1] = label_to_rgba(
+        label_outlines(labels2D[r0 : r1 + 1, c0 : c1 + 1], continued), lut
+    )
+    return rgba
+
+
+def overlay_rgba(layers, outline=False, continued=None):
+    """Builds the segmentation overlay of a slice as a single RGBA image.
+
+    Args:
+        layers (list): (label slice, lookup table, labels) per layer, bottom first;
+            layers whose slice is None are left out, labels as in indexed_rgba
+        outline (bool, optional): draw the outlines of the labelled regions instead
+            of filling them. Defaults to False.
+        continued (tuple, optional): edges of cropped slices for outlines, see
+            label_outlines. Defaults to None (whole slices).
+
+    Returns:
+        ndarray: the composited RGBA image (None without labelled pixels)
+    """
+    if outline:
+        rgba = [
+            outline_rgba(labels2D, lut, labels, continued)
+            for labels2D, lut, labels in layers
+            if labels2D is not None
+        ]
+    else:
+        rgba = [
+            indexed_rgba(labels2D, lut, labels)
+            for labels2D, lut, labels in layers
+            if labels2D is not None
+        ]
+    return composite_rgba(rgba)
+
+
+def _labelled_box(labels2D, labels):
+    """Returns the inclusive box (r0, r1, c0, c1) around all labels of a slice.
+
+    Without labels, or without boxes (coarse slices), the whole slice is returned;
+    None if the slice is known to contain no labels.
+    """
+    full = (0, labels2D.shape[0] - 1, 0, labels2D.shape[1] - 1)
+    if labels is None:
+        return full
+    present, boxes = labels
+    if len(present) == 0:
+        return None
+    if len(boxes) == 0:  # no boxes for coarse slices
+        return full
+    return (
+        min(box[0] for box in boxes.values()),
+        max(box[1] for box in boxes.values()),
+        min(box[2] for box in boxes.values()),
+        max(box[3] for box in boxes.values()),
+    )
+
+
+def _class_lut(volume, classes, opacity):
+    """Builds the lookup table of a segmentation (None without segmentation)."""
+    if volume is None:
+        return None
+    if classes is None:  # every label in white
+        labels = np.unique(np.asarray(volume))
+        classes = [(c, "rgb(255,255,255)") for c in labels if c != 0]
+    return build_label_lut(classes, opacity)
@@ -0,0 +1,120 @@
+import contextlib
+import threading
+
+__all__ = ["UpdateScheduler"]
+
+
+class UpdateScheduler:
+    """Coalesces bursts of update requests and renders only the latest one.
+
+    Every request restarts a debounce timer. When it expires, the most recent request
+    is prepared and published. A frame is dropped before publishing if a newer request
+    arrived while it was being prepared.
+    """
+
+    def __init__(self, prepare, publish, interval=0.05) -> None:
+        """Constructor
+
+        Args:
+            prepare (callable): function (request) -> frame, runs on a timer thread
+            publish (callable): function (request, frame) that shows the frame
+            interval (float, optional): debounce interval in seconds, 0 renders every
+                request synchronously. Defaults to 0.05.
+        """
+        self.prepare = prepare
+        self.publish = publish
+        self.interval = float(interval)
+        self.skipped = 0  # requests that were never shown
+        self._latest = None
+        self._serial = 0  # increases with every request
+        self._pending = False  # a request is waiting for the timer
+        self._timer = None
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+
+    def request(self, value):
+        """Requests an update, superseding any request that was not shown yet.
+
+        Args:
+            value (object): the request (e.g. the slice index)
+        """
+        if self.interval <= 0:
+            self._render(value, None)
+            return
+
+        with self._lock:
+            if self._pending:
+                self.skipped += 1  # the waiting request is replaced
+            self._latest = value
+            self._serial += 1
+            self._pending = True
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.interval, self._fire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Renders the waiting request immediately (if any)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self._fire()
+
+    def render_now(self, value):
+        """Renders a request synchronously, superseding waiting and in-flight requests.
+
+        Args:
+            value (object): the request
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending = False
+            self._latest = value
+            self._serial += 1
+            serial = self._serial
+        self._render(value, serial)
+
+    @contextlib.contextmanager
+    def hold(self):
+        """Blocks rendering while a with block runs.
+
+        Used while the state that prepare reads is replaced. A frame that is being
+        rendered is finished first.
+        """
+        with self._render_lock:
+            yield
+
+    def cancel(self):
+        """Discards the waiting request."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._pending:
+                self.skipped += 1
+            self._pending = False
+
+    def _fire(self):
+        """Timer callback: renders the latest request."""
+        with self._lock:
+            if not self._pending:
+                return
+            self._pending = False
+            self._timer = None
+            value, serial = self._latest, self._serial
+        self._render(value, serial)
+
+    def _render(self, value, serial):
+        """Prepares a frame and publishes it unless a newer request arrived meanwhile."""
+        with self._render_lock:  # one frame at a time, in request order
+            frame = self.prepare(value)
+            with self._lock:
+                stale = serial is not None and serial != self._serial
+                if stale:
+                    self.skipped += 1
+            if not stale:
+                self.publish(value, frame)
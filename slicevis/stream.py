@@ -0,0 +1,161 @@
+import threading
+import nibabel
+from nibabel.openers import ImageOpener
+import numpy as np
+from slicevis.image import Image
+
+__all__ = ["NiftiStream", "is_nifti_file"]
+
+
+class NiftiStream:
+    """Decodes a single-file NIfTI image (.nii or .nii.gz) in chunks.
+
+    The voxels are decompressed chunk by chunk directly into a preallocated array in
+    the on-disk (Fortran) order, so no second copy of the volume is made. Progress is
+    reported through a callback. Since the first timepoint, and within it the first
+    z slabs, arrive first, they can be used while the rest of the file is decoded on a
+    background thread (see start and wait).
+    """
+
+    def __init__(
+        self, filename, chunk_bytes=16 * 2**20, progress=None, image=None
+    ) -> None:
+        """Constructor, reads the header and allocates the volume.
+
+        Args:
+            filename (str): the NIfTI file
+            chunk_bytes (int, optional): bytes decompressed per step. Defaults to 16 MiB.
+            progress (callable, optional): function (loaded bytes, total bytes) called
+                after every chunk. Defaults to None.
+            image (Nifti1Image, optional): the file opened with nibabel.load, so that
+                the header is not read again. Defaults to None.
+        """
+        nbl = nibabel.load(filename) if image is None else image
+        shape = tuple(nbl.shape)
+        if len(shape) == 3:
+            shape = shape + (1,)
+        self.filename = filename
+        self.chunk_bytes = int(chunk_bytes)
+        self.progress = progress
+        self.offset = int(nbl.dataobj.offset)  # the header of a loaded image says 0
+        self.scaling = (nbl.dataobj.slope, nbl.dataobj.inter)
+        self.data = np.empty(shape, dtype=nbl.header.get_data_dtype(), order="F")
+        self.total = self.data.nbytes
+        self.loaded = 0
+        self.error = None
+        self._cancelled = False
+        self._thread = None
+        self._changed = threading.Condition()
+
+    def run(self):
+        """Decodes the whole file in the calling thread.
+
+        Raises:
+            EOFError: if the file ends before the volume is complete
+        """
+        try:
+            flat = self.data.reshape(-1, order="F").view(np.uint8)  # no copy
+            buffer = memoryview(flat)
+            with ImageOpener(self.filename, "rb") as opener:
+                opener.seek(self.offset)
+                while self.loaded < self.total and not self._cancelled:
+                    end = min(self.loaded + self.chunk_bytes, self.total)
+                    n = opener.fobj.readinto(buffer[self.loaded : end])
+                    if not n:
+                        raise EOFError("NIfTI file is truncated: " + self.filename)
+                    with self._changed:
+                        self.loaded += n
+                        self._changed.notify_all()
+                    if self.progress is not None:
+                        self.progress(self.loaded, self.total)
+        except BaseException as error:
+            with self._changed:
+                self.error = error
+                self._changed.notify_all()
+            raise
+
+    def start(self):
+        """Decodes the file on a background thread.
+
+        Returns:
+            NiftiStream: self
+        """
+        self._thread = threading.Thread(target=self._run_quietly, daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Stops decoding after the current chunk (the volume stays incomplete)."""
+        self._cancelled = True
+
+    def done(self):
+        """Returns whether the whole volume is decoded.
+
+        Returns:
+            bool: True if complete
+        """
+        return self.loaded >= self.total
+
+    def wait(self, t=None, z=None):
+        """Blocks until a part of the volume is decoded.
+
+        Args:
+            t (int, optional): timepoint, None waits for all of them. Defaults to None.
+            z (int, optional): z slab within the timepoint, None waits for the whole
+                timepoint. Defaults to None.
+
+        Raises:
+            Exception: the error that stopped decoding
+        """
+        needed = self.total
+        if t is not None:
+            x, y, nz, _ = self.data.shape
+            slabs = t * nz + (nz if z is None else z + 1)
+            needed = slabs * x * y * self.data.itemsize
+        with self._changed:
+            while self.loaded < needed:
+                if self.error is not None:
+                    raise self.error
+                if self._cancelled:
+                    raise RuntimeError("NIfTI decoding was cancelled.")
+                self._changed.wait(0.1)
+
+    def timepoint(self, t=0):
+        """Returns a timepoint as soon as it is decoded.
+
+        Args:
+            t (int, optional): the timepoint. Defaults to 0.
+
+        Returns:
+            ndarray: the (unscaled) 3D volume, a view on the streamed array
+        """
+        self.wait(t)
+        return self.data[..., t]
+
+    def image(self):
+        """Returns the complete image once decoding has finished.
+
+        Returns:
+            Image: the 4D image with the stored values and the NIfTI scaling
+        """
+        self.wait()
+        return Image(self.data, scaling=self.scaling)
+
+    def _run_quietly(self):
+        """Thread target: errors are re-raised by wait instead."""
+        try:
+            self.run()
+        except BaseException:
+            pass
+
+
+def is_nifti_file(filename):
+    """Returns whether a file is a single-file NIfTI image.
+
+    Args:
+        filename (str): the filename
+
+    Returns:
+        bool: True for .nii and .nii.gz files
+    """
+    return str(filename).lower().endswith((".nii", ".nii.gz"))
@@ -0,0 +1,92 @@
+import base64
+import io
+import numpy as np
+import plotly.colors as pc
+from PIL import Image as PILImage
+from slicevis.overlay import parse_color, composite_rgba
+
+__all__ = ["colorscale_lut", "window_to_uint8", "render_rgb", "encode_image"]
+
+
+def colorscale_lut(colorscale, n=256):
+    """Samples a Plotly colorscale into an RGB lookup table.
+
+    Args:
+        colorscale (str or list): name of a Plotly colorscale or a colorscale list
+        n (int, optional): number of entries. Defaults to 256.
+
+    Returns:
+        ndarray: (n, 3) uint8 lookup table
+    """
+    if isinstance(colorscale, str):
+        colorscale = pc.get_colorscale(colorscale)
+    colors = pc.sample_colorscale(colorscale, np.linspace(0, 1, n))
+    return np.array([parse_color(c) for c in colors], dtype=np.uint8)
+
+
+def window_to_uint8(image, cmin, cmax):
+    """Maps intensities to 0 ... 255 with a linear window.
+
+    Args:
+        image (ndarray): the 2D slice
+        cmin (float): intensity mapped to 0
+        cmax (float): intensity mapped to 255
+
+    Returns:
+        ndarray: uint8 image
+    """
+    image = np.asarray(image, dtype=np.float32)
+    scale = 255 / (cmax - cmin) if cmax > cmin else 0.0
+    return np.clip((image - cmin) * scale, 0, 255).round().astype(np.uint8)
+
+
+def render_rgb(image, cmin, cmax, lut, overlay=None):
+    """Applies window, colormap and an optional RGBA overlay to a slice.
+
+    Args:
+        image (ndarray): the 2D slice
+        cmin (float): lower window bound
+        cmax (float): upper window bound
+        lut (ndarray): RGB lookup table as returned by colorscale_lut
+        overlay (ndarray, optional): RGBA overlay of the same size. Defaults to None.
+
+    Returns:
+        ndarray: RGB uint8 image
+    """
+    u8 = window_to_uint8(image, cmin, cmax)
+    if len(lut) != 256:
+        u8 = (u8.astype(np.uint16) * (len(lut) - 1) // 255).astype(np.uint8)
+    rgb = lut[u8]
+    if overlay is None:
+        return rgb
+    base = np.empty(rgb.shape[:-1] + (4,), dtype=np.uint8)
+    base[..., :3] = rgb
+    base[..., 3] = 255
+    return composite_rgba([base, overlay])[..., :3]
+
+
+def encode_image(rgb, image_format="png", quality=90):
+    """Encodes an RGB(A) image as a base64 data URI.
+
+    Args:
+        rgb (ndarray): RGB or RGBA uint8 image
+        image_format (str, optional): "png" or "jpeg". Defaults to "png".
+        quality (int, optional): JPEG quality. Defaults to 90.
+
+    Raises:
+        ValueError: if the format is unknown
+
+    Returns:
+        str: "data:image/...;base64,..." URI
+    """
+    buffer = io.BytesIO()
+    if image_format == "png":
+        PILImage.fromarray(rgb).save(buffer, format="PNG", compress_level=6)
+    elif image_format == "jpeg":
+        PILImage.fromarray(np.ascontiguousarray(rgb[..., :3])).save(
+            buffer, format="JPEG", quality=quality
+        )
+    else:
+        raise ValueError("image_format must be 'png' or 'jpeg'")
+    encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
+    return "data:image/" + image_format + ";base64," + encoded
@@ -2,9 +2,36 @@ import matplotlib.pyplot as plt
 import plotly.express as px
 import plotly.graph_objects as go
 from ipywidgets import widgets
+from IPython.display import display
 import numpy as np
+import contextlib
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 from slicevis.image import Image
 from slicevis.load import load_image
+from slicevis.overlay import build_label_lut, overlay_classes
+from slicevis.metrics import compare_segmentations
+from slicevis.cache import SliceCache, payload_nbytes
+from slicevis.prefetch import SlicePrefetcher
+from slicevis.scheduler import UpdateScheduler
+from slicevis.pyramid import Pyramid
+from slicevis.transport import colorscale_lut, render_rgb, encode_image
+from slicevis.orientation import Orientation
+from slicevis.layout import AxisLayoutCache
+from slicevis.labelindex import LabelIndex
+from slicevis.playback import PlaybackPipeline
+from slicevis.instrument import BYTE_BUCKETS, StageTimings
+from slicevis.intensity import IntensityStats, WINDOW_PRESETS
+from slicevis.render import (
+    SEG_OPACITY,
+    VALIDATION_OPACITY,
+    SEG_OUTLINE_OPACITY,
+    VALIDATION_OUTLINE_OPACITY,
+    class_pixels,
+    overlay_rgba,
+)
 
 is_debug = False  # global debug flag
 
@@ -12,20 +39,100 @@ is_debug = False  # global debug flag
 class SliceWidget:
     """Class for widgets that offers interactive visualization of slices in 3D dataset"""
 
-    def __init__(self, image3D, debug=False):
+    def __init__(
+        self,
+        image3D,
+        debug=False,
+        overlay_mode="image",
+        cache_bytes=256 * 2**20,
+        layout_bytes=512 * 2**20,
+        prefetch_depth=2,
+        prefetch_workers=2,
+        debounce=0.05,
+        pyramid_levels=1,
+        settle_delay=0.25,
+        transport="json",
+        sparse_segmentations=False,
+        cache_dir=None,
+        playback_fps=10.0,
+        playback_buffer=8,
+        drop_frames=True,
+        show_stats=False,
+        crop_to_view=True,
+    ):
         """Constructor for SliceWidget. Configures GUI layout and connects callbacks.
 
         Args:
-            image3D (_type_): the 3D dataset
+            image3D (ndarray or Image): the 3D dataset, or a 4D dataset (time last, as
+                an array or an Image) that adds a time slider and playback
             debug (bool, optional): enable Debug output mode. Defaults to False.
+            overlay_mode (str, optional): "image" draws segmentations as one RGBA image
+                layer, "markers" draws one scatter trace per class, "outline" draws
+                only the class boundaries as one PNG encoded RGBA layer. Defaults to
+                "image".
+            cache_bytes (int, optional): memory budget of the cache of prepared slices,
+                0 disables it. Defaults to 256 MiB.
+            layout_bytes (int, optional): memory budget of contiguous per-axis copies of
+                the volumes, which make sagittal and coronal slicing as fast as axial
+                slicing, 0 disables them. Defaults to 512 MiB.
+            prefetch_depth (int, optional): number of neighbouring slices on each side
+                that are prepared in the background, 0 disables prefetching. Defaults to 2.
+            prefetch_workers (int, optional): number of prefetch threads. Defaults to 2.
+            debounce (float, optional): slider events within this many seconds are
+                coalesced and only the latest slice is shown, 0 shows every slice.
+                Defaults to 0.05.
+            pyramid_levels (int, optional): number of coarse resolution levels, the
+                coarsest one is shown during rapid navigation, 0 always shows full
+                resolution. Defaults to 1.
+            settle_delay (float, optional): seconds without navigation after which the
+                full resolution slice replaces the preview. Defaults to 0.25.
+            transport (str, optional): "json" sends slices as heatmap values, "png" and
+                "jpeg" apply window and colormap in Python and send one compressed 8-bit
+                image per slice (overlays included). Defaults to "json".
+            sparse_segmentations (bool, optional): store loaded segmentations
+                block-sparse (see SparseLabels), which saves memory for volumes that
+                are mostly background. Defaults to False.
+            cache_dir (str, optional): directory of a persistent cache of decoded
+                segmentations and their label indices (see VolumeCache). Defaults to
+                None (no caching).
+            playback_fps (float, optional): target frame rate of time playback.
+                Defaults to 10.
+            playback_buffer (int, optional): number of timepoints that are prepared
+                ahead during playback. Defaults to 8.
+            drop_frames (bool, optional): skip timepoints when playback cannot keep up
+                instead of lowering the frame rate. Defaults to True.
+            show_stats (bool, optional): show a panel with frame time percentiles,
+                cache hit rate and dropped frames below the figure (see get_stats).
+                Defaults to False.
+            crop_to_view (bool, optional): when zoomed in, extract, overlay and send
+                only the visible part of the slice (plus a margin), always at full
+                resolution. Panning within the margin needs no update. Defaults to
+                True.
 
         Raises:
-            ValueError: if image3D has the wrong dimensions
+            ValueError: if image3D has the wrong dimensions or overlay_mode or transport
+                is unknown
         """
-        if image3D.ndim != 3:
-            raise ValueError("input image must be 3D")
-
-        self.image3D = image3D  # input image
+        if isinstance(image3D, Image):
+            self.image4D = image3D
+        elif image3D.ndim == 4:
+            self.image4D = Image(image3D)
+        elif image3D.ndim == 3:
+            self.image4D = None
+        else:
+            raise ValueError("input image must be 3D or 4D")
+        if overlay_mode not in ("image", "markers", "outline"):
+            raise ValueError("overlay_mode must be 'image', 'markers' or 'outline'")
+        if transport not in ("json", "png", "jpeg"):
+            raise ValueError("transport must be 'json', 'png' or 'jpeg'")
+
+        # input image (the current timepoint of 4D images)
+        self.n_timepoints = 1 if self.image4D is None else self.image4D.data.shape[3]
+        self.curr_t = 0
+        self.image3D = image3D
+        if self.image4D is not None:
+            self.image3D = self.image4D.get_timepoint(0)
+        self.orientation = Orientation()  # rotations/flips, applied to slices only
 
         # initializing segmentations and classes
         self.seg3D = None
@@ -35,11 +142,51 @@ class SliceWidget:
         self.class_names = {}
         self.class_names_validation = {}
         self.class_colors = {}
+        self.class_colors_validation = {}
+        self.overlay_mode = overlay_mode
+        self.sparse_segmentations = sparse_segmentations
+        self.cache_dir = cache_dir
+        self._lut = None  # RGBA lookup tables for "image" overlays
+        self._lut_validation = None
+        self._label_index = {"seg": None, "validation": None}  # labels per slice
+        self.metrics = None  # per-class metrics of the last validation
+
+        # latencies of the update stages and payload bytes per frame, see get_stats
+        self.timings = StageTimings()
+        self.show_stats = show_stats
+        self._stats_shown = 0.0  # last refresh of the stats panel
+
+        # LRU cache of prepared slices, keys include the view and segmentation state
+        self._cache = SliceCache(cache_bytes)
+        self._seg_version = 0
+        self._display_version = 0  # window and colormap of encoded slices
+        self._prefetcher = SlicePrefetcher(
+            self._prepare_frame, self._cache, prefetch_depth, prefetch_workers
+        )
+        self._scheduler = UpdateScheduler(
+            lambda request: self._get_frame(*request),
+            lambda request, frame: self._publish(request[0], request[1], frame),
+            debounce,
+        )
+
+        # level of detail: coarse previews while navigating, full resolution on settle
+        self.pyramid_levels = int(pyramid_levels)
+        self.settle_delay = float(settle_delay)
+        self._pyramids = {}
+        self._layouts = AxisLayoutCache(layout_bytes)  # full resolution slices
+        self._update_pyramids()
+        self._last_change = 0.0
+        self._settle_timer = None
+
+        # region of interest when zoomed in: (axis, orientation, (r0, r1, c0, c1))
+        self.crop_to_view = crop_to_view
+        self._roi = None
+        self._orthogonal = None  # linked three-pane view, see show_orthogonal
 
         # default slice
         self.curr_axis = 2  # z = const plane
-        default_slice = int(image3D.shape[self.curr_axis] / 2)  # axial slice
-        self.image2D = image3D[:, :, default_slice]  # current slice
+        default_slice = int(self.image3D.shape[self.curr_axis] / 2)  # axial slice
+        self.image2D = self.image3D[:, :, default_slice]  # current slice
 
         # slice buttons in horizontal layout
         self.b_axial = widgets.Button(description="Show axial")
@@ -55,9 +202,18 @@ class SliceWidget:
         self.b_flip_lr = widgets.Button(description="Flip left to right")
         self.util_layout = widgets.HBox([self.b_rot, self.b_flip_ud, self.b_flip_lr])
 
+        # intensity window: full range, percentiles or presets (level, width)
+        self.window_select = widgets.Dropdown(
+            options=["Full range", "Auto"] + list(WINDOW_PRESETS),
+            value="Full range",
+            description="Window",
+        )
+        self.window_label = widgets.Label(value="")
+        self.window_layout = widgets.HBox([self.window_select, self.window_label])
+
         # stack buttons
         self.b_layout_vertical = widgets.VBox(
-            [self.b_layout, self.util_layout],
+            [self.b_layout, self.util_layout, self.window_layout],
             layout=widgets.Layout(width="80%", align_items="center"),
         )
 
@@ -79,13 +235,29 @@ class SliceWidget:
         )
         self.min_label = widgets.Label(value="Min = 0")
         self.max_label = widgets.Label(value="Max = " + str(max))
+        self.skipped_label = widgets.Label(value="Skipped: 0")
         self.slider_layout = widgets.VBox(
-            [self.max_label, self.b_up, self.slider, self.b_down, self.min_label],
+            [
+                self.max_label,
+                self.b_up,
+                self.slider,
+                self.b_down,
+                self.min_label,
+                self.skipped_label,
+            ],
             layout=widgets.Layout(align_items="center"),
         )
 
         # figure setup
         self.color = "gray"
+        self.transport = transport
+        # axis, index and orientation of the slice in the figure
+        self._shown = (self.curr_axis, default_slice, self.orientation, self.curr_t)
+        self._stats3D = None  # intensity statistics of 3D arrays (Images cache them)
+        stats = self.get_intensity_stats()
+        self._window = (stats.min, stats.max)
+        if transport != "json":  # window and colormap applied before encoding
+            self._color_lut = colorscale_lut(self.color)
         xlabel = "Y"
         ylabel = "X"
 
@@ -98,7 +270,17 @@ class SliceWidget:
             height=600,
         )
         self.widget = go.FigureWidget(data=self.fig)  # dynamic figure widget
-        self.widget_box = widgets.Box([self.widget])
+        self.value_label = widgets.Label(value="")
+        if transport != "json":  # encoded image instead of heatmap values
+            self.widget.data = []
+            self.widget.add_trace(
+                go.Image(
+                    source=self._get_frame(self.curr_axis, default_slice)["source"],
+                    hovertemplate="x: %{x}<br>y: %{y}<extra></extra>",
+                )
+            )
+            self.widget.data[0].on_hover(self._hovered)
+        self.widget_box = widgets.VBox([self.widget, self.value_label])
 
         # load buttons
         self.b_load_seg = widgets.Button(description="Load")
@@ -107,6 +289,12 @@ class SliceWidget:
             placeholder="Segmentation file",
             layout=widgets.Layout(width="90%"),
         )
+        # jump to the previous/next slice that contains a class
+        self.class_select = widgets.Dropdown(
+            options=[], layout=widgets.Layout(width="90%")
+        )
+        self.b_prev_class = widgets.Button(description="◀ Class")
+        self.b_next_class = widgets.Button(description="Class ▶")
         self.load_seg_box = widgets.VBox(
             [
                 self.segmentation_path,
@@ -114,6 +302,11 @@ class SliceWidget:
                     [self.b_load_seg, self.b_clear_seg],
                     layout=widgets.Layout(width="95%"),
                 ),
+                self.class_select,
+                widgets.HBox(
+                    [self.b_prev_class, self.b_next_class],
+                    layout=widgets.Layout(width="95%"),
+                ),
             ],
             layout=widgets.Layout(width="20%", align_items="center"),
         )
@@ -147,6 +340,30 @@ class SliceWidget:
             ),
         )
 
+        # progress of background segmentation loads (hidden while nothing is loading)
+        self.load_progress = widgets.FloatProgress(
+            value=0,
+            min=0,
+            max=1,
+            description="Loading",
+            layout=widgets.Layout(width="40%", visibility="hidden"),
+        )
+        self.b_cancel_load = widgets.Button(
+            description="Cancel", layout=widgets.Layout(visibility="hidden")
+        )
+        self.load_status = widgets.Label(value="")
+        self.load_box = widgets.HBox(
+            [self.load_progress, self.b_cancel_load, self.load_status],
+            layout=widgets.Layout(align_items="center"),
+        )
+        self._loader = ThreadPoolExecutor(max_workers=1)  # one load at a time
+        self._load_jobs = set()  # cancel events of queued and running loads
+        self._load_lock = threading.Lock()
+
+        # metrics table (filled when a validation segmentation is loaded)
+        self.metrics_view = widgets.HTML()
+        self.stats_view = widgets.HTML()  # performance panel (optional)
+
         # optional debug output
         self.out = widgets.Output()
         self.b_clear = widgets.Button(description="Clear")
@@ -157,18 +374,63 @@ class SliceWidget:
             layout=widgets.Layout(align_items="center"),
         )
 
+        # time slider and playback (4D images only)
+        self.t_slider = widgets.IntSlider(
+            description="T", value=0, min=0, max=self.n_timepoints - 1, step=1
+        )
+        self.b_play = widgets.ToggleButton(description="Play", icon="play")
+        self.fps_input = widgets.BoundedFloatText(
+            value=playback_fps,
+            min=0.5,
+            max=60,
+            step=0.5,
+            description="fps",
+            layout=widgets.Layout(width="150px"),
+        )
+        self.fps_label = widgets.Label(value="")
+        self.time_layout = widgets.HBox(
+            [self.t_slider, self.b_play, self.fps_input, self.fps_label],
+            layout=widgets.Layout(align_items="center"),
+        )
+        self._playback = PlaybackPipeline(
+            self._prepare_playback_frame,
+            self._play_frame,
+            playback_fps,
+            playback_buffer,
+            prefetch_workers,
+            drop_frames,
+        )
+        self._publishing_t = False  # the time slider is moved by playback
+        self._t_timer = None  # debounces time slider changes
+        if self.n_timepoints > 1:
+            self.slice_layout = widgets.VBox(
+                [self.slice_layout, self.time_layout],
+                layout=widgets.Layout(align_items="center"),
+            )
+
         global is_debug
         is_debug = debug
         if is_debug:
             self.app = widgets.VBox(
                 [
                     self.b_layout_horizontal,
+                    self.load_box,
                     self.slice_layout,
+                    self.metrics_view,
                     widgets.VBox([self.b_clear, self.out]),
                 ]
             )
         else:
-            self.app = widgets.VBox([self.b_layout_horizontal, self.slice_layout])
+            self.app = widgets.VBox(
+                [
+                    self.b_layout_horizontal,
+                    self.load_box,
+                    self.slice_layout,
+                    self.metrics_view,
+                ]
+            )
+        if show_stats:
+            self.app.children += (self.stats_view,)
         self.app.layout.justify_content = (
             "flex-start"  # main axis = vertical (no effect)
         )
@@ -190,8 +452,18 @@ class SliceWidget:
         self.b_clear_seg.on_click(self._clear_segmentation)
         self.b_load_valid.on_click(self._load_validation_segmentation)
         self.b_clear_valid.on_click(self._clear_validation)
+        self.b_cancel_load.on_click(self._cancel_load)
+        self.b_prev_class.on_click(self._prev_class_slice)
+        self.b_next_class.on_click(self._next_class_slice)
+        self.window_select.observe(self._window_selected, names="value")
 
         self.slider.observe(self._slice_changed, names="value")
+        if crop_to_view:
+            self.widget.layout.on_change(
+                self._view_range_changed, "xaxis.range", "yaxis.range"
+            )
+        self.t_slider.observe(self._time_changed, names="value")
+        self.b_play.observe(self._play_toggled, names="value")
         self.b_up.on_click(self._up_pressed)
         self.b_down.on_click(self._down_pressed)
 
@@ -215,15 +487,15 @@ class SliceWidget:
         """
 
         self.curr_axis = 2  # z = const
-        default_slice = int(self.image3D.shape[self.curr_axis] / 2)  # default z index
+        default_slice = int(self._view_shape()[self.curr_axis] / 2)  # default z index
         self.slider.value = default_slice  # calls _update2D
 
         xlabel = "Y"
         ylabel = "X"
 
         self.widget.update_layout(
-            xaxis=dict(title_text=xlabel, range=[0, self.image3D.shape[1]]),
-            yaxis=dict(title_text=ylabel, range=[self.image3D.shape[0], 0]),
+            xaxis=dict(title_text=xlabel, range=[0, self._view_shape()[1]]),
+            yaxis=dict(title_text=ylabel, range=[self._view_shape()[0], 0]),
         )
 
         self._debug("Show axial.")
@@ -236,15 +508,15 @@ class SliceWidget:
         """
 
         self.curr_axis = 1  # y = const
-        default_slice = int(self.image3D.shape[self.curr_axis] / 2)  # default y index
+        default_slice = int(self._view_shape()[self.curr_axis] / 2)  # default y index
         self.slider.value = default_slice  # calls _update2D
 
         xlabel = "Z"
         ylabel = "X"
 
         self.widget.update_layout(
-            xaxis=dict(title_text=xlabel, range=[0, self.image3D.shape[2]]),
-            yaxis=dict(title_text=ylabel, range=[self.image3D.shape[0], 0]),
+            xaxis=dict(title_text=xlabel, range=[0, self._view_shape()[2]]),
+            yaxis=dict(title_text=ylabel, range=[self._view_shape()[0], 0]),
         )
 
         self._debug("Show coronal.")
@@ -256,15 +528,15 @@ class SliceWidget:
             b (dict): required for on_click callback
         """
         self.curr_axis = 0  # x = const
-        default_slice = int(self.image3D.shape[self.curr_axis] / 2)  # default x index
+        default_slice = int(self._view_shape()[self.curr_axis] / 2)  # default x index
         self.slider.value = default_slice  # calls _update2D
 
         xlabel = "Z"
         ylabel = "Y"
 
         self.widget.update_layout(
-            xaxis=dict(title_text=xlabel, range=[0, self.image3D.shape[2]]),
-            yaxis=dict(title_text=ylabel, range=[self.image3D.shape[1], 0]),
+            xaxis=dict(title_text=xlabel, range=[0, self._view_shape()[2]]),
+            yaxis=dict(title_text=ylabel, range=[self._view_shape()[1], 0]),
         )
 
         self._debug("Show sagittal.")
@@ -275,7 +547,7 @@ class SliceWidget:
         Args:
             change (dict): required for on_click callback
         """
-        max = self.image3D.shape[self.curr_axis] - 1
+        max = self._view_shape()[self.curr_axis] - 1
         self.slider.max = max
         self.max_label.value = "Max = " + str(max)
 
@@ -291,15 +563,13 @@ class SliceWidget:
     def _rotate_view(self, b):
         """Rotates the 3D dataset by 90 degrees in the current plane.
 
+        Only the orientation state changes, it is applied to every extracted slice.
+
         Args:
             b (dict): required for on_click callback
         """
-        rot_axes = self._get_rot_axes()
-        self.image3D = np.rot90(
-            self.image3D, axes=rot_axes
-        )  # rotated "view" on ndarray
-        if self.seg3D is not None:
-            self.seg3D = np.rot90(self.seg3D, axes=rot_axes)
+        self.orientation = self.orientation.rotate(self._get_rot_axes())
+        self._invalidate_frames()
         self._update2D(None)  # index unchanged
 
     def _flip_up(self, b):
@@ -309,9 +579,8 @@ class SliceWidget:
             b (dict): required for on_click callback
         """
         flip_axis = self._get_rot_axes()[0]
-        self.image3D = np.flip(self.image3D, axis=flip_axis)
-        if self.seg3D is not None:
-            self.seg3D = np.flip(self.seg3D, axis=flip_axis)
+        self.orientation = self.orientation.flip(flip_axis)
+        self._invalidate_frames()
         self._update2D(None)
 
     def _flip_lr(self, b):
@@ -321,19 +590,102 @@ class SliceWidget:
             b (dict): required for on_click callback
         """
         flip_axis = self._get_rot_axes()[1]
-        self.image3D = np.flip(self.image3D, axis=flip_axis)
-        if self.seg3D is not None:
-            self.seg3D = np.flip(self.seg3D, axis=flip_axis)
+        self.orientation = self.orientation.flip(flip_axis)
+        self._invalidate_frames()
         self._update2D(None)
 
+    def _view_shape(self):
+        """Returns the shape of the (rotated/flipped) view on the image.
+
+        Returns:
+            tuple: the view shape
+        """
+        return self.orientation.shape(self.image3D.shape)
+
     def _slice_changed(self, change):
         """Callback that triggers if the slider changed its value.
 
+        Bursts of changes (e.g. while dragging) are coalesced by the update scheduler.
+        Changes that follow each other within the settle delay are shown at the
+        coarsest pyramid level first and at full resolution once navigation stops.
+
         Args:
             b (dict): the new value is retrieved as b.new
         """
+        if self._playback.is_running():  # the next playback frame shows the slice
+            return
+        now = time.monotonic()
+        rapid = now - self._last_change < self.settle_delay
+        self._last_change = now
+
+        cropped = self._view_roi(self.curr_axis, self.orientation) is not None
+        if self.pyramid_levels > 0 and rapid and not cropped:  # small crops: full res
+            self._scheduler.request((self.curr_axis, change.new, self.pyramid_levels))
+            if self._settle_timer is not None:
+                self._settle_timer.cancel()
+            self._settle_timer = threading.Timer(self.settle_delay, self._settled)
+            self._settle_timer.daemon = True
+            self._settle_timer.start()
+        else:
+            self._scheduler.request((self.curr_axis, change.new, 0))
+
+    def _view_range_changed(self, layout, x_range, y_range):
+        """Callback of zooming and panning: crops the slices to the visible region.
+
+        The region is the visible rectangle plus a margin of half its size, aligned to
+        blocks of 32 pixels. It only changes when the view leaves it or becomes much
+        smaller, so panning within the margin needs no update.
+
+        Args:
+            layout (Layout): required for layout.on_change callback
+            x_range (tuple): visible column range (None if autoranged)
+            y_range (tuple): visible row range (None if autoranged)
+        """
+        axis, orientation = self.curr_axis, self.orientation
+        rows, cols = [n for k, n in enumerate(self._view_shape()) if k != axis]
+        roi = None
+        autorange = layout.xaxis.autorange or layout.yaxis.autorange
+        if x_range is not None and y_range is not None and not autorange:
+            visible = (
+                max(0, int(np.floor(min(y_range)))),
+                min(rows, int(np.ceil(max(y_range))) + 1),
+                max(0, int(np.floor(min(x_range)))),
+                min(cols, int(np.ceil(max(x_range))) + 1),
+            )
+            current = self._view_roi(axis, orientation)
+            if current is not None and _box_contains(current, visible):
+                if _box_area(current) <= 4 * _box_area(_roi_around(visible)):
+                    return  # still covered without shipping much more
+            roi = _roi_around(visible, rows, cols)
+            if roi == (0, rows, 0, cols) or _box_area(visible) <= 0:
+                roi = None  # (almost) everything is visible
+        if roi is None and self._view_roi(axis, orientation) is None:
+            return
+        self._roi = None if roi is None else (axis, orientation, roi)
+        self._prefetcher.cancel()
+        if not self._playback.is_running():  # playback frames pick up the region
+            self._scheduler.request((axis, self.slider.value, 0))
+
+    def _view_roi(self, axis, orientation):
+        """Returns the cropped region of a view (None if the full slice is shown).
+
+        Args:
+            axis (int): the slice axis
+            orientation (Orientation): the view orientation
+
+        Returns:
+            tuple: (r0, r1, c0, c1) in full resolution pixels, ends exclusive
+        """
+        roi = self._roi
+        if roi is None or roi[0] != axis or roi[1] != orientation:
+            return None  # the region belongs to another view
+        return roi[2]
 
-        self._update2D(change.new)
+    def _settled(self):
+        """Timer callback: replaces the preview by the full resolution slice."""
+        if self._playback.is_running():
+            return
+        self._scheduler.request((self.curr_axis, self.slider.value, 0))
 
     def _clear_output(self, b):
         """Clears the debug output.
@@ -352,87 +704,560 @@ class SliceWidget:
         if index is None:  # index unchanged
             index = self.slider.value
 
-        # update image2D and segmentations according to axis and index
-        if self.curr_axis == 0:
-            self.image2D = self.image3D[index, :, :]
-            if self.seg3D is not None:
-                self.seg2D = self.seg3D[index, :, :]
-            if self.seg3D_validation is not None:
-                self.seg2D_validation = self.seg3D_validation[index, :, :]
-        elif self.curr_axis == 1:
-            self.image2D = self.image3D[:, index, :]
-            if self.seg3D is not None:
-                self.seg2D = self.seg3D[:, index, :]
-            if self.seg3D_validation is not None:
-                self.seg2D_validation = self.seg3D_validation[:, index, :]
-        else:
-            self.image2D = self.image3D[:, :, index]
-            if self.seg3D is not None:
-                self.seg2D = self.seg3D[:, :, index]
-            if self.seg3D_validation is not None:
-                self.seg2D_validation = self.seg3D_validation[:, :, index]
+        if self._settle_timer is not None:
+            self._settle_timer.cancel()
+        with self.timings.measure("update"):
+            self._scheduler.render_now((self.curr_axis, index, 0))
+        if self._orthogonal is not None:  # segmentations, window or time changed
+            self._orthogonal.refresh()
+
+    def _publish(self, axis, index, frame):
+        """Shows a prepared slice in the figure.
+
+        Args:
+            axis (int): the slice axis
+            index (int): the slice index
+            frame (dict): the frame payload, see _prepare_frame
+        """
+        self.image2D = frame["image"]
+        self.seg2D = frame["seg"]
+        self.seg2D_validation = frame["validation"]
+        self._shown = (axis, index, frame["orientation"], frame["t"])
 
         # generate segmentations (optional)
-        trace_list = []
+        trace_list = self._overlay_traces(frame)
 
-        if self.seg3D_validation is not None:  # validation segmentation first
-            for c in self.class_names_validation.values():
-                if c == 0:  # unclassified
-                    continue
-                c_indices = np.nonzero(self.seg2D_validation == c)  # tuple of arrays
-                class_name = list(self.class_names.keys())[
-                    list(self.class_names.values()).index(c)
-                ]
-                color = self.class_colors[class_name]
-                if len(self.class_names_validation) == 2:  # white if only one class
-                    color = "rgb(255,255,255)"
-                    class_name = list(self.class_names_validation.keys())[
-                        list(self.class_names_validation.values()).index(c)
-                    ]
-                trace_list.append(
-                    go.Scatter(
-                        y=c_indices[0],
-                        x=c_indices[1],
-                        opacity=0.3,
-                        mode="markers",
-                        marker_color=color,
-                        marker_symbol="square",
-                        showlegend=True,
-                        name=class_name,
+        # pixel centers of (coarse, cropped) slices in full resolution coordinates
+        f = Pyramid.factor(frame["level"])
+        y0, x0 = (o + (f - 1) / 2 for o in frame["origin"])
+
+        # batch update
+        if self.transport == "json":
+            overlay = frame.get("overlay_source", frame.get("overlay"))
+            nbytes = payload_nbytes([frame["image"], frame.get("markers"), overlay])
+        else:
+            nbytes = len(frame["source"])
+        self.timings.record("payload bytes", nbytes, BYTE_BUCKETS)
+        with self.timings.measure("figure update"), self.widget.batch_update():
+            if self.transport == "json":
+                self.widget.data[0]["z"] = self.image2D
+            else:
+                self.widget.data[0]["source"] = frame["source"]
+            self.widget.data[0].update(x0=x0, dx=f, y0=y0, dy=f)
+            self.widget.data = [self.widget.data[0]]  # clear segmentations
+            self.widget.add_traces(trace_list)
+            self.widget.update_layout(
+                legend=dict(x=0, y=1, orientation="h", yanchor="bottom", xanchor="left")
+            )
+        self.skipped_label.value = "Skipped: " + str(self._scheduler.skipped)
+        self._debug("update.")
+        if self.show_stats:
+            now = time.monotonic()
+            if now - self._stats_shown > 0.5:  # at most twice per second
+                self._stats_shown = now
+                self._show_stats()
+
+        if self._playback.is_running():  # the playback buffer prepares the frames
+            return
+
+        # prepare the neighbours while the user looks at this slice
+        orientation, t, roi = frame["orientation"], frame["t"], frame["roi"]
+        for layer in ("image", "seg", "validation"):
+            self._layouts.prepare(layer, orientation.perm[axis])
+        self._prefetcher.prefetch(
+            lambda i: (
+                self._frame_key(axis, i, 0, orientation, t, roi),
+                (axis, i, 0, orientation, t, roi),
+            ),
+            index,
+            orientation.shape(self.image3D.shape)[axis],
+        )
+
+    def _frame_key(self, axis, index, level=0, orientation=None, t=None, roi=None):
+        """Returns the cache key of a slice.
+
+        Args:
+            axis (int): the slice axis
+            index (int): the slice index
+            level (int, optional): the pyramid level. Defaults to 0.
+            orientation (Orientation, optional): the view orientation. Defaults to the
+                current one.
+            t (int, optional): the timepoint. Defaults to the current one.
+            roi (tuple, optional): the cropped region. Defaults to None (full slice).
+
+        Returns:
+            tuple: axis, index, level, orientation, timepoint, region, segmentation and
+                display state
+        """
+        if orientation is None:
+            orientation = self.orientation
+        if t is None:
+            t = self.curr_t
+        return (
+            axis,
+            index,
+            level,
+            orientation,
+            t,
+            roi,
+            self._seg_version,
+            self._display_version,
+        )
+
+    def _get_frame(self, axis, index, level=0, t=None, crop=True):
+        """Returns the prepared slice from the cache or prepares it.
+
+        Args:
+            axis (int): the slice axis
+            index (int): the slice index
+            level (int, optional): the pyramid level. Defaults to 0.
+            t (int, optional): the timepoint. Defaults to the current one.
+            crop (bool, optional): crop to the zoomed region of the figure. Defaults
+                to True.
+
+        Returns:
+            dict: the frame payload, see _prepare_frame
+        """
+        orientation = self.orientation  # key and frame use the same orientation
+        if t is None:
+            t = self.curr_t
+        roi = self._view_roi(axis, orientation) if crop else None
+        if roi is not None:
+            level = 0
+        key = self._frame_key(axis, index, level, orientation, t, roi)
+        frame = self._cache.get(key)
+        if frame is None:  # maybe it is being prefetched right now
+            frame = self._prefetcher.result(key)
+        if frame is None:
+            with self.timings.measure("prepare"):
+                frame = self._prepare_frame(axis, index, level, orientation, t, roi)
+            self._cache.put(key, frame)
+        return frame
+
+    def _prepare_frame(
+        self, axis, index, level=0, orientation=None, t=None, roi=None
+    ):
+        """Extracts a slice of the image and segmentations and builds its overlay.
+
+        Also runs on prefetch threads, so it must not modify the widget.
+
+        Args:
+            axis (int): the slice axis (of the view)
+            index (int): the slice index (of the view)
+            level (int, optional): the pyramid level. Defaults to 0.
+            orientation (Orientation, optional): the view orientation. Defaults to the
+                current one.
+            t (int, optional): the timepoint, other timepoints than the current one
+                are read at full resolution. Defaults to the current one.
+            roi (tuple, optional): (r0, r1, c0, c1) region of the view slice in full
+                resolution pixels (ends exclusive), only this part is extracted.
+                Defaults to None (full slice).
+
+        Returns:
+            dict: "image", "seg" and "validation" slices (None if not loaded), the
+                pyramid "level", the "orientation", the timepoint "t", the "roi" and
+                the "origin" (first row and column of the slices in full resolution
+                pixels), the indexed "labels" of the segmentation slices and either
+                the RGBA "overlay" (PNG encoded as "overlay_source" with the json
+                transport) or the per-class "markers" indices; cropped frames also
+                tell whether the slice "continued" beyond their (top, bottom, left,
+                right) edge
+        """
+        if orientation is None:
+            orientation = self.orientation
+        if t is None:
+            t = self.curr_t
+        pyramids = self._pyramids
+        current = pyramids["image_t"] == t  # pyramids belong to one timepoint
+        if not current:
+            level = 0
+        source_axis, source_index = orientation.source_index(
+            axis, index, self.image3D.shape
+        )
+        f = Pyramid.factor(level)
+        crop = (slice(None), slice(None))
+        origin = (0, 0)
+        if roi is not None:  # pixels of the (coarse) slice that cover the region
+            r0, r1, c0, c1 = roi
+            crop = (slice(r0 // f, -(-r1 // f)), slice(c0 // f, -(-c1 // f)))
+            origin = ((r0 // f) * f, (c0 // f) * f)
+        frame = {
+            "level": level,
+            "orientation": orientation,
+            "t": t,
+            "roi": roi,
+            "origin": origin,
+            "image": None,
+            "seg": None,
+            "validation": None,
+        }
+        for layer in ("image", "seg", "validation"):
+            if pyramids.get(layer) is not None:
+                if layer == "image" and not current:
+                    slice2D = self._time_slice(t, source_axis, source_index)
+                elif level == 0:  # contiguous copy along the slice axis (if available)
+                    slice2D = self._layouts.get_slice(
+                        layer, pyramids[layer].volume, source_axis, source_index
+                    )
+                else:
+                    slice2D = pyramids[layer].get_slice(
+                        source_axis, source_index, level
+                    )
+                oriented = orientation.orient_slice(slice2D, axis)
+                frame[layer] = np.ascontiguousarray(oriented[crop])  # region only
+                if roi is not None:  # edges of the region inside the slice
+                    (rows, cols), (n_rows, n_cols) = crop, oriented.shape
+                    frame["continued"] = (
+                        rows.start > 0,
+                        rows.stop < n_rows,
+                        cols.start > 0,
+                        cols.stop < n_cols,
                     )
+
+        frame["labels"] = self._slice_labels(
+            axis, source_axis, source_index, level, orientation, roi
+        )
+        with self.timings.measure("overlay"):
+            if self.overlay_mode == "markers":
+                frame["markers"] = self._marker_payload(frame)
+            else:
+                frame["overlay"] = self._overlay_payload(frame)
+            if frame.get("overlay") is not None and self.transport == "json":
+                # one PNG layer instead of a nested JSON list of RGBA values; mostly
+                # uniform or transparent, so it compresses well
+                frame["overlay_source"] = encode_image(frame["overlay"], "png")
+
+        if self.transport != "json":  # one compressed image including the overlay
+            with self.timings.measure("encode"):
+                rgb = render_rgb(
+                    frame["image"],
+                    *self._window,
+                    self._color_lut,
+                    frame.get("overlay"),
                 )
+                frame["source"] = encode_image(rgb, self.transport)
+        return frame
+
+    def _slice_labels(
+        self, axis, source_axis, source_index, level, orientation, roi=None
+    ):
+        """Looks up the labels of the segmentation slices in the label indices.
+
+        Args:
+            axis (int): the slice axis (of the view)
+            source_axis (int): the slice axis of the volume
+            source_index (int): the slice index of the volume
+            level (int): the pyramid level
+            orientation (Orientation): the view orientation
+            roi (tuple, optional): cropped region of the view slice, labels outside
+                it are left out (full resolution only). Defaults to None.
+
+        Returns:
+            dict: per indexed layer, the set of present labels and their bounding boxes
+                in the (cropped) view slice (full resolution only, empty otherwise)
+        """
+        labels = {}
+        f = Pyramid.factor(level)
+        for layer, label_index in self._label_index.items():
+            if label_index is None:
+                continue
+            # coarse slices show every f-th voxel of this slice, so no more labels
+            index = (source_index // f) * f
+            present = set(int(c) for c in label_index.present(source_axis, index))
+            boxes = {}
+            if level == 0:
+                for c in present:
+                    boxes[c] = orientation.orient_box(
+                        label_index.bbox(source_axis, index, c),
+                        axis,
+                        label_index.shape,
+                    )
+                if roi is not None:
+                    boxes = _crop_boxes(boxes, roi)
+                    present = set(boxes)
+            labels[layer] = (present, boxes)
+        return labels
+
+    def _invalidate_frames(self, segmentation=False, display=False):
+        """Drops cached slices after the view or the segmentations changed.
 
-        # segmentation "overlay"
+        Slices are keyed by orientation, so after a rotation or flip only scheduled
+        prefetches are cancelled; cached slices of other orientations remain valid.
+
+        Args:
+            segmentation (bool, optional): the segmentations changed (instead of the
+                orientation). Defaults to False.
+            display (bool, optional): only window or colormap changed. Defaults to False.
+        """
+        self._prefetcher.cancel()
+        if display:
+            self._display_version += 1
+            self._cache.clear()
+        elif segmentation:
+            self._seg_version += 1
+            self._cache.clear()
+            self._update_pyramids(image=False)
+
+    def _update_pyramids(self, image=True):
+        """Creates the multi-resolution pyramids of the current volumes.
+
+        Image levels are averaged on a background thread (in memory volumes only),
+        segmentation levels use every n-th voxel and need no extra memory. The volumes
+        are also registered with the per-axis layout cache.
+
+        Args:
+            image (bool, optional): also recreate the image pyramid. Defaults to True.
+        """
+        pyramids = dict(self._pyramids)
+        if image:
+            if pyramids.get("image") is not None:  # stop averaging the old volume
+                pyramids["image"].cancel()
+            mode = "mean" if isinstance(self.image3D, np.ndarray) else "nearest"
+            pyramids["image"] = Pyramid(self.image3D, self.pyramid_levels, mode)
+            pyramids["image_t"] = self.curr_t
+        pyramids["seg"] = None
+        pyramids["validation"] = None
         if self.seg3D is not None:
-            for c in self.class_names.values():
-                if c == 0:  # unclassified
-                    continue
-                c_indices = np.nonzero(self.seg2D == c)  # tuple of arrays
-                class_name = list(self.class_names.keys())[
-                    list(self.class_names.values()).index(c)
-                ]
+            pyramids["seg"] = Pyramid(self.seg3D, self.pyramid_levels, "nearest")
+        if self.seg3D_validation is not None:
+            pyramids["validation"] = Pyramid(
+                self.seg3D_validation, self.pyramid_levels, "nearest"
+            )
+        self._pyramids = pyramids  # swapped at once for prefetch threads
+        for layer in ("image", "seg", "validation"):
+            pyramid = pyramids[layer]
+            self._layouts.set_volume(layer, None if pyramid is None else pyramid.volume)
+
+    def _time_slice(self, t, axis, index):
+        """Extracts a slice of the image at any timepoint (full resolution).
+
+        Args:
+            t (int): the timepoint
+            axis (int): the slice axis of the volume
+            index (int): the slice index of the volume
+
+        Returns:
+            ndarray: the scaled 2D slice
+        """
+        key = [slice(None)] * 4
+        key[axis] = index
+        key[3] = t
+        return self.image4D.apply_scaling(self.image4D.data[tuple(key)])
+
+    def _overlay_classes(self, is_validation=False):
+        """Returns the classes that are painted on top of the image.
+
+        Args:
+            is_validation (bool, optional): Flag for validation segmentation. Defaults to False.
+
+        Returns:
+            list: (index, name, color) tuples, unclassified excluded, see
+                overlay_classes
+        """
+        if is_validation:
+            return overlay_classes(
+                self.class_names_validation,
+                self.class_colors_validation,
+                self.class_names,
+                self.class_colors,
+            )
+        return overlay_classes(self.class_names, self.class_colors)
+
+    def _update_luts(self):
+        """Rebuilds the RGBA lookup tables of the loaded segmentations."""
+        self._lut = None
+        self._lut_validation = None
+        opacities = (SEG_OPACITY, VALIDATION_OPACITY)
+        if self.overlay_mode == "outline":
+            opacities = (SEG_OUTLINE_OPACITY, VALIDATION_OUTLINE_OPACITY)
+        if self.seg3D is not None:
+            classes = self._overlay_classes()
+            self._lut = build_label_lut(
+                [(c, color) for c, _, color in classes], opacities[0]
+            )
+        if self.seg3D_validation is not None:
+            classes = self._overlay_classes(is_validation=True)
+            self._lut_validation = build_label_lut(
+                [(c, color) for c, _, color in classes], opacities[1]
+            )
+
+    def _overlay_payload(self, frame):
+        """Builds the segmentation overlay of a slice as a single RGBA image.
+
+        Args:
+            frame (dict): frame with "seg" and "validation" slices
+
+        Returns:
+            ndarray: the composited RGBA image (None without segmentations), filled
+                regions or outlines depending on the overlay mode
+        """
+        return overlay_rgba(
+            [
+                (frame[layer], lut, frame["labels"].get(layer))
+                for layer, lut in (  # validation segmentation first
+                    ("validation", self._lut_validation),
+                    ("seg", self._lut),
+                )
+            ],
+            outline=self.overlay_mode == "outline",
+            continued=frame.get("continued"),
+        )
+
+    def _marker_payload(self, frame):
+        """Collects the pixel indices of every class in a slice.
+
+        Args:
+            frame (dict): frame with "seg" and "validation" slices
+
+        Returns:
+            dict: "validation" and "seg" lists of (rows, columns) per overlay class
+        """
+        markers = {"validation": [], "seg": []}
+        for layer in ("validation", "seg"):
+            if frame[layer] is None:
+                continue
+            labels = frame["labels"].get(layer)
+            for c, _, _ in self._overlay_classes(is_validation=layer == "validation"):
+                markers[layer].append(class_pixels(frame[layer], c, labels))
+        return markers
+
+    def _overlay_traces(self, frame):
+        """Builds the plotly traces of the segmentation overlay.
+
+        Args:
+            frame (dict): the frame payload
+
+        Returns:
+            list: overlay traces (an RGBA image with legend entries or scatter markers)
+        """
+        if self.overlay_mode == "markers":
+            return self._marker_traces(frame)
+        return self._image_traces(frame)
+
+    def _image_traces(self, frame):
+        """Draws the segmentation overlay as a single RGBA image layer.
+
+        With the json transport the layer is sent as a PNG. Encoded slices (png/jpeg
+        transports) already contain the overlay, so only legend entries are added.
+
+        Args:
+            frame (dict): the frame payload
+
+        Returns:
+            list: the image trace followed by one legend entry per class
+        """
+        if frame["seg"] is None and frame["validation"] is None:
+            return []
+        f = Pyramid.factor(frame["level"])
+        row0, col0 = frame["origin"]
+        trace_list = []
+        if "overlay_source" in frame:
+            trace_list = [
+                go.Image(
+                    source=frame["overlay_source"],
+                    hoverinfo="skip",
+                    name="",
+                    x0=col0 + (f - 1) / 2,
+                    dx=f,
+                    y0=row0 + (f - 1) / 2,
+                    dy=f,
+                )
+            ]
+        if frame["validation"] is not None:  # validation segmentation first
+            trace_list += self._legend_traces(
+                self._overlay_classes(is_validation=True), VALIDATION_OPACITY
+            )
+        if frame["seg"] is not None:
+            trace_list += self._legend_traces(self._overlay_classes(), SEG_OPACITY)
+        return trace_list
+
+    def _legend_traces(self, classes, opacity):
+        """Builds empty scatter traces that only provide legend entries.
+
+        Args:
+            classes (list): (index, name, color) tuples
+            opacity (float): opacity of the legend markers
+
+        Returns:
+            list: one go.Scatter per class
+        """
+        return [
+            go.Scatter(
+                x=[None],
+                y=[None],
+                opacity=opacity,
+                mode="markers",
+                marker_symbol="square",
+                marker_color=color,
+                showlegend=True,
+                name=class_name,
+            )
+            for _, class_name, color in classes
+        ]
+
+    def _marker_traces(self, frame):
+        """Draws the segmentation overlay with one scatter trace per class.
+
+        Args:
+            frame (dict): the frame payload
+
+        Returns:
+            list: one go.Scatter per class
+        """
+        trace_list = []
+        f = Pyramid.factor(frame["level"])
+        row0, col0 = frame["origin"]
+        layers = [
+            (
+                "validation",
+                self._overlay_classes(is_validation=True),
+                VALIDATION_OPACITY,
+            ),
+            ("seg", self._overlay_classes(), SEG_OPACITY),
+        ]  # validation segmentation first
+        for layer, classes, opacity in layers:
+            if frame[layer] is None:
+                continue
+            for (_, class_name, color), c_indices in zip(
+                classes, frame["markers"][layer]
+            ):
                 trace_list.append(
                     go.Scatter(
-                        y=c_indices[0],
-                        x=c_indices[1],
-                        opacity=0.5,
+                        y=row0 + c_indices[0] * f + (f - 1) / 2,
+                        x=col0 + c_indices[1] * f + (f - 1) / 2,
+                        opacity=opacity,
                         mode="markers",
                         marker_symbol="square",
-                        marker_color=self.class_colors[class_name],
+                        marker_color=color,
                         showlegend=True,
                         name=class_name,
                     )
                 )
+        return trace_list
 
-        # batch update
-        with self.widget.batch_update():
-            self.widget.data[0]["z"] = self.image2D
-            self.widget.data = [self.widget.data[0]]  # clear segmentations
-            self.widget.add_traces(trace_list)
-            self.widget.update_layout(
-                legend=dict(x=0, y=1, orientation="h", yanchor="bottom", xanchor="left")
-            )
-        self._debug("update.")
+    def _hovered(self, trace, points, state):
+        """Shows the original voxel value under the cursor (encoded transports only).
+
+        Args:
+            trace (BaseTraceType): required for on_hover callback
+            points (Points): the hovered point in figure coordinates
+            state (InputDeviceState): required for on_hover callback
+        """
+        if len(points.xs) == 0:
+            return
+        axis, index, orientation, t = self._shown
+        key = [int(round(points.ys[0])), int(round(points.xs[0]))]
+        key.insert(axis, index)
+        if not all(
+            0 <= i < n for i, n in zip(key, orientation.shape(self.image3D.shape))
+        ):
+            return
+        key = orientation.source_voxel(key, self.image3D.shape)
+        if t == self.curr_t:
+            value = np.asarray(self.image3D[key]).item()
+        else:
+            value = self.image4D.apply_scaling(self.image4D.data[key + (t,)]).item()
+        self.value_label.value = "Value: " + str(value)
 
     def _up_pressed(self, b):
         """Increments slider by one.
@@ -453,15 +1278,18 @@ class SliceWidget:
         self.slider.value = new_value
 
     def _load_segmentation(self, b, is_validation=False):
-        """Loads a segmentation file with class names and colors.
+        """Loads a segmentation file with class names and colors in the background.
+
+        The figure stays interactive while loading. The new layer is swapped in at once
+        when it is ready, unless the load was cancelled.
 
         Args:
             b (dict): required for on_click callback
             is_validation (bool, optional): Flag for validation segmentation. Defaults to False.
 
-        Raises:
-            ValueError: If the segmentation shape (dimension) does not match the image.
-            FileNotFoundError: If the filename is invalid.
+        Returns:
+            Future: resolves to the metrics for validation segmentations (None otherwise
+                or if the load failed), None if no file name was entered
         """
         # read filename from text entry field
         file = None
@@ -470,80 +1298,241 @@ class SliceWidget:
         else:
             file = self.segmentation_path.value
 
-        if str(file):  # not empty
-            try:
-                seg_image = load_image(file, is_segmentation=True)
+        if not str(file):  # empty
+            return None
+        cancelled = threading.Event()
+        with self._load_lock:
+            self._load_jobs.add(cancelled)
+        self.load_status.value = "Loading " + str(file)
+        self.load_progress.value = 0
+        self.load_progress.layout.visibility = "visible"
+        self.b_cancel_load.layout.visibility = "visible"
+        future = self._loader.submit(self._run_load, file, is_validation, cancelled)
+        future.add_done_callback(self._load_done)
+        return future
+
+    def _run_load(self, file, is_validation, cancelled):
+        """Worker: loads a segmentation and swaps it in.
+
+        Like the debounce timer and the playback thread, the worker updates the figure
+        itself (ipywidgets sends the changes from any thread). Only the swap of the
+        layer holds _load_lock, the slice is redrawn after releasing it.
 
-                if is_validation:
-                    self.seg3D_validation = seg_image.get_timepoint(0)
-                else:
-                    self.seg3D = seg_image.get_timepoint(0)  # 3D
+        Args:
+            file (str): the segmentation file
+            is_validation (bool): Flag for validation segmentation
+            cancelled (Event): set when the user cancels the load
 
-                # check shape of segmentation
-                if is_validation:
-                    if (
-                        self.seg3D_validation.shape != self.image3D.shape
-                        and self.seg3D.shape != self.image3D.shape
-                    ):
-                        raise ValueError("Validation segmentation shape mismatch.")
-                else:
-                    if self.seg3D.shape != self.image3D.shape:
-                        raise ValueError("Segmentation shape mismatch.")
+        Returns:
+            DataFrame: per-class metrics after loading a validation (None otherwise)
+        """
+        try:
+            if cancelled.is_set():
+                raise _LoadCancelled()
+            seg_image = load_image(
+                file,
+                is_segmentation=True,
+                sparse=self.sparse_segmentations,
+                cache=self.cache_dir,
+                progress=lambda done, total: self._loading_progress(
+                    done, total, cancelled
+                ),
+                timings=self.timings,
+            )
+            seg3D = seg_image.get_timepoint(0)  # 3D, compact unsigned integers
 
-                # rename validation segmentation class names
+            # check shape of segmentation
+            if seg3D.shape != self.image3D.shape:
                 if is_validation:
-                    self.class_names_validation = seg_image.get_class_names()
-                    tmp = {}
-                    for i in self.class_names_validation.keys():
-                        tmp[i + "_v"] = self.class_names_validation[i]
-                    self.class_names_validation = tmp
-                    self.class_colors = seg_image.get_class_colors()
-                else:
-                    self.class_names = seg_image.get_class_names()
+                    raise ValueError("Validation segmentation shape mismatch.")
+                raise ValueError("Segmentation shape mismatch.")
+            with self.timings.measure("label index"):
+                label_index = _cached_label_index(seg_image, seg3D)
+
+            with self._load_lock:  # the last chance to cancel
+                if cancelled.is_set():
+                    raise _LoadCancelled()
+                self._swap_segmentation(seg_image, seg3D, label_index, is_validation)
+            self._update2D(index=None)  # sets seg2D and paints it
+            self.load_status.value = "Loaded " + str(file)
+            if is_validation:
+                return self._compute_dice_score()
+        except _LoadCancelled:
+            self.load_status.value = "Cancelled loading " + str(file)
+        except FileNotFoundError:
+            self.load_status.value = "Segmentation file name invalid."
+        except ValueError as valErr:
+            self.load_status.value = "Error: " + str(valErr)
+        except Exception as err:  # e.g. corrupt files, OSError or MemoryError
+            self.load_status.value = "Error: " + type(err).__name__ + ": " + str(err)
+            self.out.append_stderr(traceback.format_exc())
+        finally:
+            with self._load_lock:
+                self._load_jobs.discard(cancelled)
+                if not self._load_jobs:
+                    self.load_progress.layout.visibility = "hidden"
+                    self.b_cancel_load.layout.visibility = "hidden"
+        return None
+
+    def _swap_segmentation(self, seg_image, seg3D, label_index, is_validation):
+        """Replaces a segmentation layer (the caller redraws the slice).
+
+        Renders wait until volume, label index, lookup tables and cached frames are
+        all replaced, so that no frame mixes the old and the new segmentation.
+
+        Args:
+            seg_image (Image): the loaded segmentation
+            seg3D (ndarray): its first timepoint
+            label_index (LabelIndex): the label index of seg3D
+            is_validation (bool): Flag for validation segmentation
+        """
+        with self._hold_renders():
+            if is_validation:
+                self.seg3D_validation = seg3D
+                self._label_index["validation"] = label_index
+            else:
+                self.seg3D = seg3D
+                self._label_index["seg"] = label_index
+
+            # rename validation segmentation class names
+            if is_validation:
+                self.class_names_validation = seg_image.get_class_names()
+                tmp = {}
+                for i in self.class_names_validation.keys():
+                    tmp[i + "_v"] = self.class_names_validation[i]
+                self.class_names_validation = tmp
+                colors = seg_image.get_class_colors() or {}  # "rgb(a,b,c)"
+                self.class_colors_validation = {i + "_v": colors[i] for i in colors}
+            else:
+                self.class_names = seg_image.get_class_names()
+                self.class_colors = seg_image.get_class_colors() or {}
+            self._update_luts()
+            self._invalidate_frames(segmentation=True)
+        self._update_class_select()
+
+    def _hold_renders(self):
+        """Returns a context that blocks the renders of the figure and of the panes.
+
+        Returns:
+            ExitStack: the context, see UpdateScheduler.hold
+        """
+        stack = contextlib.ExitStack()
+        stack.enter_context(self._scheduler.hold())
+        if self._orthogonal is not None:
+            stack.enter_context(self._orthogonal._scheduler.hold())
+        return stack
+
+    def _load_done(self, future):
+        """Done callback of a load, reports errors that escaped _run_load.
+
+        Args:
+            future (Future): the finished load
+        """
+        if future.cancelled():
+            return
+        err = future.exception()
+        if err is not None:
+            self.load_status.value = "Error: " + type(err).__name__ + ": " + str(err)
+            self.out.append_stderr(
+                "".join(traceback.format_exception(type(err), err, err.__traceback__))
+            )
+
+    def _cancel_load(self, b):
+        """Cancels all segmentation loads that were not swapped in yet.
+
+        Args:
+            b (dict): required for on_click callback
+        """
+        with self._load_lock:
+            for cancelled in self._load_jobs:
+                cancelled.set()
+
+    def _loading_progress(self, done, total, cancelled=None):
+        """Progress callback of load_image, updates the progress bar.
 
-                self.class_colors = seg_image.get_class_colors()  # "rgb(a,b,c)"
+        Args:
+            done (int): decoded bytes
+            total (int): total bytes
+            cancelled (Event, optional): aborts the load when set. Defaults to None.
 
-                self._update2D(index=None)  # sets seg2D and paints it
-            except FileNotFoundError:
-                print("Segmentation file name invalid.")
-            except ValueError as valErr:
-                print("Error: " + valErr)
+        Raises:
+            _LoadCancelled: if the load was cancelled
+        """
+        if cancelled is not None and cancelled.is_set():
+            raise _LoadCancelled()
+        self.load_progress.value = done / total if total else 1.0
 
     def _load_validation_segmentation(self, b):
-        """Loads a validation segmentation.
+        """Loads a validation segmentation in the background.
 
         Args:
             b (dict): required for on_click callback
+
+        Returns:
+            Future: resolves to the per-class metrics (None if no segmentation is
+                loaded)
         """
-        self._load_segmentation(b, True)
-        self._compute_dice_score()
+        return self._load_segmentation(b, True)
 
     def _compute_dice_score(self):
-        """Computes the Sorensen-Dice similarity coefficient between the segmentation and validation segmentation."""
+        """Computes the Sorensen-Dice similarity coefficient (and IoU, volume, precision and
+        recall) between the segmentation and validation segmentation.
 
+        Returns:
+            DataFrame: per-class metrics (None if a segmentation is missing)
+        """
+        self.metrics = None
         if self.seg3D is not None and self.seg3D_validation is not None:
-            for i in self.class_names:
-                index = self.class_names[i]
-                if index == 0:  # unclassified
-                    continue
-                X_i = self.seg3D[self.seg3D == index]
-                X = len(X_i)  # number of voxels in class i
-                Y_i = self.seg3D_validation[self.seg3D_validation == index]
-                Y = len(Y_i)
-
-                # intersection of segmentation and validation for class i
-                intersection = np.sum(
-                    np.where(
-                        (self.seg3D == index)
-                        & (self.seg3D_validation == index)
-                        & (self.seg3D != 0),
-                        1,
-                        0,
-                    )
+            with self.timings.measure("metrics"):
+                self.metrics = compare_segmentations(
+                    self.seg3D, self.seg3D_validation, self.class_names
                 )
-                Dice = 2 * intersection / (X + Y)
+            self._debug(self.metrics.to_string())
+
+        self._show_metrics()
+        return self.metrics
 
-                print("Dice score for class " + i + ": " + str(Dice) + "\n")
+    def _show_metrics(self):
+        """Displays the current metrics below the figure."""
+        if self.metrics is None:
+            self.metrics_view.value = ""
+        else:
+            self.metrics_view.value = self.metrics[
+                ["dice", "iou", "precision", "recall", "volume", "reference_volume"]
+            ].to_html(float_format="{:.4f}".format)
+
+    def _show_stats(self):
+        """Refreshes the performance panel."""
+        stats = self.get_stats()
+        rows = []
+        for stage, summary in stats["stages"].items():
+            if stage == "payload bytes":
+                continue
+            rows.append(
+                "<tr><td>{}</td><td>{}</td>{}</tr>".format(
+                    stage,
+                    summary["count"],
+                    "".join(
+                        "<td>{:.1f}</td>".format(1000 * summary[p])
+                        for p in ("p50", "p90", "p99", "max")
+                    ),
+                )
+            )
+        payload = stats["stages"].get("payload bytes")
+        self.stats_view.value = (
+            "<table><tr><th>stage</th><th>n</th><th>p50 ms</th><th>p90 ms</th>"
+            + "<th>p99 ms</th><th>max ms</th></tr>"
+            + "".join(rows)
+            + "</table>"
+            + "cache hit rate: {:.0%}".format(stats["cache"]["hit_rate"])
+            + ", skipped: {}".format(stats["skipped"])
+            + ", dropped: {}".format(stats["dropped"])
+            + (
+                ""
+                if payload is None
+                else ", payload: {:.0f} KiB/frame".format(payload["mean"] / 1024)
+            )
+        )
 
     def _debug(self, string):
         """Prints a string to the debug output (if enabled).
@@ -574,9 +1563,18 @@ class SliceWidget:
         Args:
             b (dict): required for on_click callback
         """
-        if self.seg3D is not None:
-            self.seg3D = None
-            self.seg2D = None
+        with self._load_lock:  # not while a background load swaps layers
+            if self.seg3D is None:
+                return
+            with self._hold_renders():
+                self.seg3D = None
+                self.seg2D = None
+                self._label_index["seg"] = None
+                self._update_luts()
+                self._invalidate_frames(segmentation=True)
+            self._update_class_select()
+            self.metrics = None
+            self._show_metrics()
             self._update2D(None)
 
     def _clear_validation(self, b):
@@ -585,13 +1583,303 @@ class SliceWidget:
         Args:
             b (dict): required for on_click callback
         """
-        if self.seg3D_validation is not None:
-            self.seg3D_validation = None
-            self.seg2D_validation = None
+        with self._load_lock:  # not while a background load swaps layers
+            if self.seg3D_validation is None:
+                return
+            with self._hold_renders():
+                self.seg3D_validation = None
+                self.seg2D_validation = None
+                self._label_index["validation"] = None
+                self._update_luts()
+                self._invalidate_frames(segmentation=True)
+            self.metrics = None
+            self._show_metrics()
             self._update2D(None)
 
+    def _time_changed(self, change):
+        """Callback that triggers if the time slider changed its value.
+
+        Args:
+            change (dict): the new timepoint is retrieved as change.new
+        """
+        if self._publishing_t:  # moved by playback
+            return
+        if self._playback.is_running():
+            self.b_play.value = False  # stops playback, calls _play_toggled
+        if self._scheduler.interval <= 0:
+            self._set_timepoint(change.new)
+            return
+        # debounce like the slice slider: only the timepoint the user stops at is
+        # shown (and gets its image pyramid)
+        if self._t_timer is not None:
+            self._t_timer.cancel()
+        self._t_timer = threading.Timer(self._scheduler.interval, self._t_settled)
+        self._t_timer.daemon = True
+        self._t_timer.start()
+
+    def _t_settled(self):
+        """Timer callback: shows the timepoint of the time slider."""
+        if self._playback.is_running():  # playback owns the timepoint
+            return
+        self._set_timepoint(self.t_slider.value)
+
+    def _set_timepoint(self, t):
+        """Makes a timepoint the current one and shows it.
+
+        Cached slices of other timepoints stay valid, since they are keyed by time.
+
+        Args:
+            t (int): the timepoint
+        """
+        if t != self.curr_t:
+            with self._hold_renders():  # renders read the volume and its pyramids
+                self.curr_t = t
+                self.image3D = self.image4D.get_timepoint(t)
+                self._prefetcher.cancel()
+                self._update_pyramids(image=True)
+        self._update2D(None)
+
+    def _play_toggled(self, change):
+        """Callback of the play button: starts or stops playback.
+
+        Args:
+            change (dict): change.new is True while playing
+        """
+        if change.new:
+            self.b_play.description = "Pause"
+            self.b_play.icon = "pause"
+            if self._t_timer is not None:
+                self._t_timer.cancel()
+            self._scheduler.cancel()
+            self._prefetcher.cancel()
+            self._playback.fps = self.fps_input.value
+            self._playback.start(self.t_slider.value, self.n_timepoints)
+        else:
+            self._playback.stop()
+            self.b_play.description = "Play"
+            self.b_play.icon = "play"
+            self._set_timepoint(self.t_slider.value)  # full quality, prefetching
+
+    def _prepare_playback_frame(self, t):
+        """Producer of the playback pipeline: prepares the current slice at time t.
+
+        Args:
+            t (int): the timepoint
+
+        Returns:
+            tuple: (axis, index, frame)
+        """
+        axis, index = self.curr_axis, self.slider.value
+        return axis, index, self._get_frame(axis, index, 0, t)
+
+    def _play_frame(self, t, prepared):
+        """Consumer of the playback pipeline: shows a frame and the playback rate.
+
+        Args:
+            t (int): the timepoint
+            prepared (tuple): (axis, index, frame) as returned by
+                _prepare_playback_frame
+        """
+        axis, index, frame = prepared
+        with self._scheduler.hold():  # not interleaved with other figure updates
+            self._publish(axis, index, frame)
+        self._publishing_t = True
+        try:
+            self.t_slider.value = t
+        finally:
+            self._publishing_t = False
+        self.fps_label.value = (
+            "fps: "
+            + "{:.1f}".format(self._playback.measured_fps())
+            + ", dropped: "
+            + str(self._playback.dropped)
+        )
+
+    def _window_selected(self, change):
+        """Callback of the window dropdown: applies the full range, auto or a preset.
+
+        Args:
+            change (dict): change.new is the selected entry
+        """
+        stats = self.get_intensity_stats()
+        if change.new == "Auto":
+            self._apply_window(*stats.auto_window())
+        elif change.new in WINDOW_PRESETS:
+            self.set_window(*WINDOW_PRESETS[change.new])
+        else:
+            self._apply_window(stats.min, stats.max)
+
+    def _apply_window(self, cmin, cmax):
+        """Maps the intensities cmin..cmax to the colormap and redraws the slice.
+
+        Args:
+            cmin (float): intensity shown with the first color
+            cmax (float): intensity shown with the last color
+        """
+        self._window = (float(cmin), float(cmax))
+        level, width = (cmin + cmax) / 2, cmax - cmin
+        self.window_label.value = "L {:g} / W {:g}".format(level, width)
+        if self.transport != "json":  # the window is applied before encoding
+            self._invalidate_frames(display=True)
+            self._update2D(None)
+        else:
+            self.widget.update_coloraxes(cmin=cmin, cmax=cmax)
+            if self._orthogonal is not None:  # the panes set window and colormap
+                self._orthogonal.refresh()
+        self._debug("cmin=" + str(cmin) + ", cmax=" + str(cmax))
+
+    def _update_class_select(self):
+        """Lists the classes of the segmentation in the class navigation."""
+        if self.seg3D is None:
+            self.class_select.options = []
+        else:
+            self.class_select.options = [
+                (name, c) for c, name, _ in self._overlay_classes()
+            ]
+
+    def _jump_to_class(self, step):
+        """Moves the slider to the closest slice that contains the selected class.
+
+        Args:
+            step (int): 1 for the next slice, -1 for the previous one
+        """
+        label_index = self._label_index["seg"]
+        if label_index is None or self.class_select.value is None:
+            return
+        shape = self.image3D.shape
+        source_axis, source_index = self.orientation.source_index(
+            self.curr_axis, self.slider.value, shape
+        )
+        if self.orientation.flips[self.curr_axis]:  # view runs against the volume
+            step = -step
+        found = label_index.next_slice(
+            source_axis, source_index, self.class_select.value, step
+        )
+        if found is None:
+            self._debug("No further slice with class " + str(self.class_select.label))
+            return
+        # flipping an index is its own inverse
+        _, index = self.orientation.source_index(self.curr_axis, found, shape)
+        self.slider.value = index
+
+    def _prev_class_slice(self, b):
+        """Shows the previous slice that contains the selected class.
+
+        Args:
+            b (dict): required for on_click callback
+        """
+        self._jump_to_class(-1)
+
+    def _next_class_slice(self, b):
+        """Shows the next slice that contains the selected class.
+
+        Args:
+            b (dict): required for on_click callback
+        """
+        self._jump_to_class(1)
+
     # --- public methods --- #
 
+    def get_metrics(self):
+        """Returns the per-class metrics of the segmentation against the validation.
+
+        Returns:
+            DataFrame: Dice, IoU, precision, recall and volumes per class (None if
+                no validation segmentation is loaded)
+        """
+        return self.metrics
+
+    def get_intensity_stats(self):
+        """Returns the intensity statistics of the current timepoint.
+
+        They are computed once per volume (and cached on Images), so windowing never
+        scans the voxels again.
+
+        Returns:
+            IntensityStats: range, histogram and percentiles of the image
+        """
+        if self.image4D is not None:
+            return self.image4D.get_intensity_stats(self.curr_t)
+        if self._stats3D is None:
+            self._stats3D = IntensityStats.from_volume(self.image3D)
+        return self._stats3D
+
+    def set_window(self, level, width):
+        """Sets the intensity window by its center and width.
+
+        Args:
+            level (float): the intensity in the middle of the colormap
+            width (float): the range of intensities mapped to the colormap
+        """
+        width = max(float(width), 1e-6)
+        self._apply_window(level - width / 2, level + width / 2)
+
+    def auto_window(self, low=0.5, high=99.5):
+        """Sets the intensity window between two percentiles of the image.
+
+        Args:
+            low (float, optional): lower percentile. Defaults to 0.5.
+            high (float, optional): upper percentile. Defaults to 99.5.
+        """
+        self._apply_window(*self.get_intensity_stats().auto_window(low, high))
+
+    def show_orthogonal(self, size=350):
+        """Shows linked axial, coronal and sagittal panes below the widget.
+
+        The panes share the slice cache, prefetching and label indices of the widget.
+        Clicking into a pane moves the crosshair and updates the other two panes.
+
+        Args:
+            size (int, optional): width and height of each pane in pixels. Defaults
+                to 350.
+
+        Returns:
+            OrthogonalView: the view
+        """
+        if self._orthogonal is None:
+            self._orthogonal = OrthogonalView(self, size)
+        display(self._orthogonal.app)
+        return self._orthogonal
+
+    def get_stats(self):
+        """Returns performance statistics of the widget.
+
+        Stages are "update" (a synchronous slice change), "prepare" (extraction of a
+        slice that was not cached), "overlay", "encode" (png/jpeg transports),
+        "figure update" (the batch update of the figure), "load", "label index" and
+        "metrics" (of loaded segmentations). "payload bytes" records the size of the
+        slice data sent per frame (before JSON serialization for the json transport),
+        its histogram uses BYTE_BUCKETS. Overlay and encode times include slices
+        prepared by prefetching.
+
+        Returns:
+            dict: "stages" (summaries with count, mean, max, p50, p90, p99 and a
+                histogram, see StageTimings.summary), "cache" (hit_rate, hits,
+                misses, bytes), "skipped" slider updates and "dropped"
+                playback frames
+        """
+        return {
+            "stages": self.timings.summaries(),
+            "cache": {
+                "hit_rate": self._cache.hit_rate(),
+                "hits": self._cache.hits,
+                "misses": self._cache.misses,
+                "bytes": self._cache.nbytes,
+            },
+            "skipped": self._scheduler.skipped,
+            "dropped": self._playback.dropped,
+        }
+
+    def reset_stats(self):
+        """Discards the recorded timings and resets the counters of get_stats."""
+        self.timings.reset()
+        self._cache.hits = 0
+        self._cache.misses = 0
+        self._scheduler.skipped = 0
+        self._playback.dropped = 0
+        if self.show_stats:
+            self._show_stats()
+
     def set_figure_size(self, width, height):
         """Set size of figure.
 
@@ -608,16 +1896,24 @@ class SliceWidget:
         Args:
             cmap (str): Name of Plotly colorscale. See https://plotly.com/python/builtin-colorscales/
         """
+        self.color = cmap
+        if self.transport != "json":  # colors are applied before encoding
+            self._color_lut = colorscale_lut(cmap)
+            self._invalidate_frames(display=True)
+            self._update2D(None)
+            return
+
+        cmin, cmax = self._window
         self.widget.update_coloraxes(
-            cmin=np.min(self.image3D),
-            cmax=np.max(self.image3D),
+            cmin=cmin,
+            cmax=cmax,
             colorscale=cmap,
             title="Class",
         )
+        if self._orthogonal is not None:  # the panes set window and colormap
+            self._orthogonal.refresh()
 
-        self._debug(
-            "cmin=" + str(np.min(self.image3D)) + ", cmax=" + str(np.max(self.image3D))
-        )
+        self._debug("cmin=" + str(cmin) + ", cmax=" + str(cmax))
 
     def add_class_names(self, names, indices):
         """Sets class indices as colorbar ticks and class names as tick labels.
@@ -631,3 +1927,277 @@ class SliceWidget:
             colorbar_tickvals=indices,
             colorbar_ticktext=names,
         )
+
+
+class OrthogonalView:
+    """Three linked panes with orthogonal slices through a crosshair position.
+
+    The panes are drawn from the slice engine of a SliceWidget: slices come from its
+    cache (or are prepared with its layout copies and label indices), and neighbours
+    are prefetched by its prefetcher. A crosshair move is one scheduler request, which
+    prepares the slices of all panes together, and only panes whose slice changed are
+    sent to the front-end again. Positions are view coordinates, i.e. the rotation
+    and flips of the widget apply.
+    """
+
+    def __init__(self, slice_widget, size=350) -> None:
+        """Constructor
+
+        Args:
+            slice_widget (SliceWidget): the widget that provides image, segmentations,
+                view orientation and slice engine
+            size (int, optional): width and height of each pane in pixels. Defaults
+                to 350.
+        """
+        self.slice_widget = slice_widget
+        self.position = [n // 2 for n in slice_widget._view_shape()]
+        self._shown = {0: None, 1: None, 2: None}  # frame keys shown in the panes
+        self._scheduler = UpdateScheduler(
+            self._prepare, self._publish, slice_widget._scheduler.interval
+        )
+
+        self.panes = {}
+        for axis, title in ((2, "Axial"), (1, "Coronal"), (0, "Sagittal")):
+            pane = go.FigureWidget()
+            if slice_widget.transport == "json":
+                pane.add_trace(go.Heatmap(z=[[0]], showscale=False))
+            else:
+                pane.add_trace(go.Image(source=None))
+            pane.update_layout(
+                title=dict(text=title, x=0.5),
+                width=size,
+                height=size,
+                margin=dict(l=10, r=10, t=30, b=10),
+                showlegend=False,
+                xaxis=dict(visible=False, constrain="domain"),
+                yaxis=dict(visible=False, autorange="reversed", scaleanchor="x"),
+            )
+            pane.data[0].on_click(
+                lambda trace, points, state, axis=axis: self._clicked(axis, points)
+            )
+            self.panes[axis] = pane
+        self.position_label = widgets.Label(value="")
+        self.app = widgets.VBox(
+            [widgets.HBox(list(self.panes.values())), self.position_label],
+            layout=widgets.Layout(align_items="center"),
+        )
+        self.refresh()
+
+    def set_position(self, position):
+        """Moves the crosshair and updates the panes whose slice changed.
+
+        Args:
+            position (list): (x, y, z) in view coordinates, clipped to the view
+        """
+        shape = self.slice_widget._view_shape()
+        self.position = [min(max(int(p), 0), n - 1) for p, n in zip(position, shape)]
+        self._scheduler.request(tuple(self.position))
+
+    def refresh(self):
+        """Redraws the panes synchronously (e.g. after segmentations changed)."""
+        shape = self.slice_widget._view_shape()
+        self.position = [min(p, n - 1) for p, n in zip(self.position, shape)]
+        self._scheduler.render_now(tuple(self.position))
+
+    def _clicked(self, axis, points):
+        """Click callback of a pane: moves the crosshair to the clicked pixel.
+
+        Args:
+            axis (int): the slice axis of the pane
+            points (Points): the clicked point in pane coordinates
+        """
+        if len(points.xs) == 0:
+            return
+        row_axis, col_axis = [k for k in range(3) if k != axis]
+        position = list(self.position)
+        position[row_axis] = int(round(points.ys[0]))
+        position[col_axis] = int(round(points.xs[0]))
+        self.set_position(position)
+
+    def _prepare(self, position):
+        """Scheduler callback: prepares the slices of the panes that changed.
+
+        Args:
+            position (tuple): the crosshair position
+
+        Returns:
+            dict: per pane axis (frame key, frame), None if the pane is up to date
+        """
+        slice_widget = self.slice_widget
+        frames = {}
+        for axis in self.panes:
+            key = slice_widget._frame_key(axis, position[axis])
+            if key == self._shown[axis]:
+                frames[axis] = None
+            else:
+                frame = slice_widget._get_frame(axis, position[axis], crop=False)
+                frames[axis] = (key, frame)
+        return frames
+
+    def _publish(self, position, frames):
+        """Scheduler callback: sends the changed slices and moves the crosshairs.
+
+        Args:
+            position (tuple): the crosshair position
+            frames (dict): as returned by _prepare
+        """
+        slice_widget = self.slice_widget
+        for axis, pane in self.panes.items():
+            row_axis, col_axis = [k for k in range(3) if k != axis]
+            with pane.batch_update():
+                if frames[axis] is not None:
+                    key, frame = frames[axis]
+                    self._shown[axis] = key
+                    f = Pyramid.factor(frame["level"])
+                    if slice_widget.transport == "json":
+                        pane.data[0]["z"] = frame["image"]
+                    else:
+                        pane.data[0]["source"] = frame["source"]
+                    pane.data[0].update(x0=(f - 1) / 2, dx=f, y0=(f - 1) / 2, dy=f)
+                    pane.data = [pane.data[0]]  # clear segmentations
+                    pane.add_traces(slice_widget._overlay_traces(frame))
+                if slice_widget.transport == "json":  # window and colormap
+                    cmin, cmax = slice_widget._window
+                    pane.data[0].update(
+                        zmin=cmin, zmax=cmax, colorscale=slice_widget.color
+                    )
+                pane.layout.shapes = [
+                    _crosshair_line(col=position[col_axis]),
+                    _crosshair_line(row=position[row_axis]),
+                ]
+
+        shape = slice_widget._view_shape()
+        voxel = slice_widget.orientation.source_voxel(
+            list(position), slice_widget.image3D.shape
+        )
+        value = np.asarray(slice_widget.image3D[voxel]).item()
+        self.position_label.value = "x={}, y={}, z={}, value: {}".format(
+            *position, value
+        )
+
+        # prepare the neighbouring slices of the panes that changed
+        orientation, t = slice_widget.orientation, slice_widget.curr_t
+        for axis in self.panes:
+            if frames[axis] is None:
+                continue
+            slice_widget._prefetcher.prefetch(
+                lambda i, axis=axis: (
+                    slice_widget._frame_key(axis, i, 0, orientation, t),
+                    (axis, i, 0, orientation, t),
+                ),
+                position[axis],
+                shape[axis],
+            )
+
+
+def _crosshair_line(col=None, row=None):
+    """Returns a crosshair line that spans a pane.
+
+    Args:
+        col (int, optional): column of a vertical line. Defaults to None.
+        row (int, optional): row of a horizontal line. Defaults to None.
+
+    Returns:
+        dict: the plotly shape
+    """
+    if col is not None:
+        return dict(
+            type="line",
+            xref="x",
+            yref="paper",
+            x0=col,
+            x1=col,
+            y0=0,
+            y1=1,
+            line=dict(color="yellow", width=1),
+        )
+    return dict(
+        type="line",
+        xref="paper",
+        yref="y",
+        x0=0,
+        x1=1,
+        y0=row,
+        y1=row,
+        line=dict(color="yellow", width=1),
+    )
+
+
+class _LoadCancelled(Exception):
+    """Raised inside a background load that the user cancelled."""
+
+
+def _cached_label_index(seg_image, seg3D):
+    """Returns the label index of a segmentation, from its disk cache entry if possible.
+
+    Args:
+        seg_image (Image): the loaded segmentation
+        seg3D (ndarray): its first timepoint
+
+    Returns:
+        LabelIndex: the index
+    """
+    entry = seg_image.cache_entry
+    arrays = None if entry is None else entry.get_arrays("labelindex_t0")
+    if arrays is not None:
+        return LabelIndex.from_arrays(arrays)
+    label_index = LabelIndex(seg3D)
+    if entry is not None:
+        entry.put_arrays("labelindex_t0", label_index.to_arrays())
+    return label_index
+
+
+def _roi_around(box, rows=None, cols=None, block=32):
+    """Returns a region around a box with half its size as margin on each side.
+
+    Args:
+        box (tuple): (r0, r1, c0, c1) visible rectangle, ends exclusive
+        rows (int, optional): number of rows of the slice. Defaults to no clipping.
+        cols (int, optional): number of columns of the slice. Defaults to no clipping.
+        block (int, optional): the region is aligned to multiples of block.
+            Defaults to 32.
+
+    Returns:
+        tuple: (r0, r1, c0, c1) of the region
+    """
+    r0, r1, c0, c1 = box
+    dr, dc = (r1 - r0 + 1) // 2, (c1 - c0 + 1) // 2
+    r0, c0 = (max(0, v) // block * block for v in (r0 - dr, c0 - dc))
+    r1, c1 = (-(-v // block) * block for v in (r1 + dr, c1 + dc))
+    if rows is not None:
+        r1, c1 = min(r1, rows), min(c1, cols)
+    return r0, r1, c0, c1
+
+
+def _crop_boxes(boxes, roi):
+    """Clips label bounding boxes to a region and shifts them into its coordinates.
+
+    Args:
+        boxes (dict): inclusive (r0, r1, c0, c1) per label in slice coordinates
+        roi (tuple): (r0, r1, c0, c1) region, ends exclusive
+
+    Returns:
+        dict: the boxes of the labels inside the region, relative to the region
+    """
+    cropped = {}
+    for c, (b0, b1, b2, b3) in boxes.items():
+        r0, r1 = max(b0, roi[0]), min(b1, roi[1] - 1)
+        c0, c1 = max(b2, roi[2]), min(b3, roi[3] - 1)
+        if r0 <= r1 and c0 <= c1:
+            cropped[c] = (r0 - roi[0], r1 - roi[0], c0 - roi[2], c1 - roi[2])
+    return cropped
+
+
+def _box_contains(outer, inner):
+    """Returns whether a box (r0, r1, c0, c1) contains another one."""
+    return (
+        outer[0] <= inner[0]
+        and inner[1] <= outer[1]
+        and outer[2] <= inner[2]
+        and inner[3] <= outer[3]
+    )
+
+
+def _box_area(box):
+    """Returns the number of pixels of a box (r0, r1, c0, c1), ends exclusive."""
+    return max(0, box[1] - box[0]) * max(0, box[3] - box[2])
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from slicevis.image import SparseLabels
+from slicevis.metrics import compare_segmentations, confusion_matrix
+
+
+def _naive_confusion(prediction, reference, num_labels):
+    """Counts every label pair with one comparison per class pair."""
+    counts = np.zeros((num_labels, num_labels), dtype=np.int64)
+    for i in range(num_labels):
+        for j in range(num_labels):
+            counts[i, j] = np.count_nonzero((prediction == i) & (reference == j))
+    return counts
+
+
+@pytest.fixture(scope="module")
+def pair():
+    rng = np.random.default_rng(0)
+    prediction = np.zeros((20, 17, 9), dtype=np.uint8)
+    prediction[3:15, 2:12, 1:8] = rng.integers(0, 5, size=(12, 10, 7))
+    reference = np.roll(prediction, 2, axis=(0, 1))
+    reference[10:14, :, :4] = 3
+    return prediction, reference
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 16, 64])
+def test_dense(pair, chunk_size):
+    prediction, reference = pair
+    np.testing.assert_array_equal(
+        confusion_matrix(prediction, reference, chunk_size=chunk_size),
+        _naive_confusion(prediction, reference, 5),
+    )
+
+
+def test_sparse(pair):
+    prediction, reference = pair
+    expected = _naive_confusion(prediction, reference, 5)
+    sparse = [SparseLabels.from_dense(v, block=(4, 6, 5)) for v in pair]
+    np.testing.assert_array_equal(confusion_matrix(*sparse), expected)
+    # different blocks and mixed inputs are compared slab by slab
+    other = SparseLabels.from_dense(reference, block=3)
+    np.testing.assert_array_equal(confusion_matrix(sparse[0], other), expected)
+    np.testing.assert_array_equal(confusion_matrix(prediction, sparse[1]), expected)
+
+
+@pytest.mark.parametrize("num_labels", [2, 4, 7])
+def test_num_labels(pair, num_labels):
+    prediction, reference = pair
+    expected = _naive_confusion(prediction, reference, num_labels)
+    sparse = [SparseLabels.from_dense(v, block=4) for v in pair]
+    for volumes in (pair, sparse):
+        np.testing.assert_array_equal(
+            confusion_matrix(*volumes, num_labels=num_labels), expected
+        )
+
+
+def test_float_and_bool_labels(pair):
+    prediction, reference = pair
+    expected = _naive_confusion(prediction, reference, 5)
+    result = confusion_matrix(prediction.astype(np.float32), reference.astype(np.int16))
+    np.testing.assert_array_equal(result, expected)
+    mask = prediction > 0
+    np.testing.assert_array_equal(
+        confusion_matrix(mask, reference > 0), _naive_confusion(mask, reference > 0, 2)
+    )
+
+
+def test_invalid_input(pair):
+    prediction, reference = pair
+    with pytest.raises(ValueError):
+        confusion_matrix(prediction, reference[:-1])
+    with pytest.raises(ValueError):
+        confusion_matrix(prediction.astype(np.int8) - 1, reference, num_labels=5)
+
+
+def test_compare_segmentations(pair):
+    prediction, reference = pair
+    class_names = {"a": 1, "b": 2, "absent": 9}
+    table = compare_segmentations(prediction, reference, class_names)
+    expected = _naive_confusion(prediction, reference, 5)
+    assert list(table.index) == ["a", "b", "absent"]
+    assert table.loc["b", "tp"] == expected[2, 2]
+    assert table.loc["a", "volume"] == expected[1].sum()
+    assert table.loc["absent", "volume"] == 0
@@ -0,0 +1,71 @@
+import itertools
+import numpy as np
+import pytest
+from slicevis.orientation import Orientation
+
+SHAPE = (4, 5, 6)
+
+
+def _random_orientations(count, seed=0):
+    """Yields random sequences of rotations and flips with the numpy equivalent."""
+    rng = np.random.default_rng(seed)
+    volume = np.arange(np.prod(SHAPE)).reshape(SHAPE)
+    for _ in range(count):
+        orientation, view = Orientation(), volume
+        for _ in range(rng.integers(1, 8)):
+            if rng.random() < 0.5:
+                axes = [int(a) for a in rng.permutation(3)[:2]]
+                orientation, view = orientation.rotate(axes), np.rot90(view, axes=axes)
+            else:
+                axis = int(rng.integers(3))
+                orientation, view = orientation.flip(axis), np.flip(view, axis)
+        yield volume, orientation, view
+
+
+def test_apply_matches_rot90_and_flip():
+    for volume, orientation, view in _random_orientations(200):
+        assert orientation.shape(volume.shape) == view.shape
+        np.testing.assert_array_equal(orientation.apply(volume), view)
+
+
+@pytest.mark.parametrize("axis", [0, 1, 2])
+def test_orient_slice(axis):
+    for volume, orientation, view in _random_orientations(50, seed=axis):
+        for index in range(view.shape[axis]):
+            source_axis, source_index = orientation.source_index(
+                axis, index, volume.shape
+            )
+            slice2D = np.take(volume, source_index, axis=source_axis)
+            np.testing.assert_array_equal(
+                orientation.orient_slice(slice2D, axis),
+                np.take(view, index, axis=axis),
+            )
+
+
+def test_source_voxel():
+    for volume, orientation, view in _random_orientations(20):
+        for view_index in itertools.product(*(range(n) for n in view.shape)):
+            voxel = orientation.source_voxel(view_index, volume.shape)
+            assert volume[voxel] == view[view_index]
+
+
+def _box(mask):
+    """Inclusive (row_min, row_max, col_min, col_max) of the True pixels."""
+    rows, cols = np.nonzero(mask)
+    return rows.min(), rows.max(), cols.min(), cols.max()
+
+
+@pytest.mark.parametrize("axis", [0, 1, 2])
+def test_orient_box(axis):
+    rng = np.random.default_rng(axis)
+    for volume, orientation, _ in _random_orientations(50, seed=axis):
+        mask = np.zeros(volume.shape, dtype=bool)
+        corner = [rng.integers(0, n - 1) for n in SHAPE]
+        mask[tuple(slice(c, c + rng.integers(1, 3)) for c in corner)] = True
+        view = orientation.apply(mask)
+        other = tuple(k for k in range(3) if k != axis)
+        index = int(np.flatnonzero(view.any(axis=other))[0])
+        source_axis, source_index = orientation.source_index(axis, index, SHAPE)
+        box = _box(np.take(mask, source_index, axis=source_axis))
+        expected = _box(np.take(view, index, axis=axis))
+        assert orientation.orient_box(box, axis, SHAPE) == expected
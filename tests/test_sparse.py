@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from slicevis.image import SparseLabels
+
+SHAPE = (11, 13, 7)
+BLOCK = (4, 5, 3)
+
+
+@pytest.fixture(scope="module")
+def dense():
+    """Labels with background, uniform and mixed blocks (and partial edge blocks)."""
+    rng = np.random.default_rng(0)
+    labels = np.zeros(SHAPE, dtype=np.uint8)
+    labels[:4, :5, 3:6] = 7  # uniform block
+    labels[4:, 5:, :] = rng.integers(0, 4, size=(7, 8, 7))  # mixed blocks
+    labels[8:, :3, 6] = 44  # partial edge blocks
+    return labels
+
+
+@pytest.fixture(scope="module")
+def sparse(dense):
+    return SparseLabels.from_dense(dense, block=BLOCK)
+
+
+def _random_index(rng, n):
+    """Returns a random integer (possibly negative) or slice for an axis of size n."""
+    if rng.random() < 0.3:
+        return int(rng.integers(-n, n))
+    bounds = [None] + list(range(-n - 2, n + 3))
+    start = bounds[rng.integers(len(bounds))]
+    stop = bounds[rng.integers(len(bounds))]
+    step = [None, 1, 2, 3, 5, -1, -2, -3, -4][rng.integers(9)]
+    return slice(start, stop, step)
+
+
+def test_from_dense_round_trip(dense, sparse):
+    assert sparse.shape == dense.shape
+    assert sparse.dtype == np.uint8
+    np.testing.assert_array_equal(np.asarray(sparse), dense)
+
+
+def test_random_basic_indices(dense, sparse):
+    rng = np.random.default_rng(1)
+    for _ in range(500):
+        item = tuple(_random_index(rng, n) for n in SHAPE)
+        expected = dense[item]
+        result = sparse[item]
+        assert result.shape == expected.shape, item
+        np.testing.assert_array_equal(result, expected, err_msg=str(item))
+
+
+@pytest.mark.parametrize(
+    "item",
+    [
+        5,
+        -1,
+        (Ellipsis, 2),
+        (3, Ellipsis),
+        (slice(None), -2),
+        (Ellipsis, slice(None, None, -1)),
+        (slice(10, 0, -3), Ellipsis, slice(6, None, -2)),
+        (slice(5, 5), 0, 0),
+    ],
+)
+def test_special_indices(dense, sparse, item):
+    np.testing.assert_array_equal(sparse[item], dense[item])
+
+
+@pytest.mark.parametrize("item", [11, -12, (0, 13), (0, 0, 0, 0), (Ellipsis, Ellipsis)])
+def test_invalid_indices(sparse, item):
+    with pytest.raises(IndexError):
+        sparse[item]
+
+
+@pytest.mark.parametrize("axis", [0, 1, 2])
+def test_select(dense, sparse, axis):
+    for index in range(SHAPE[axis]):
+        selected = sparse.select(axis, index)
+        np.testing.assert_array_equal(
+            np.asarray(selected), np.take(dense, index, axis=axis)
+        )
+        # indexing the selection decodes the same blocks
+        np.testing.assert_array_equal(
+            selected[::-2, 1:], np.take(dense, index, axis=axis)[::-2, 1:]
+        )
+
+
+def test_reductions(dense, sparse):
+    assert sparse.max() == dense.max()
+    assert sparse.min() == dense.min()
+    np.testing.assert_array_equal(sparse.unique(), np.unique(dense))
+
+
+def test_without_background():
+    dense = np.full((6, 4, 5), 2, dtype=np.uint16)
+    dense[1, 2, 3] = 1000
+    sparse = SparseLabels.from_dense(dense, block=2)
+    assert sparse.min() == 2
+    assert sparse.dtype == np.uint16
+    np.testing.assert_array_equal(sparse.unique(), [2, 1000])
+    np.testing.assert_array_equal(sparse[:, ::-1, 1:4], dense[:, ::-1, 1:4])
@@ -0,0 +1,56 @@
+import nibabel
+import numpy as np
+import pytest
+from slicevis.load import load_image
+from slicevis.stream import NiftiStream
+
+
+def _save(path, data, stored_dtype=None):
+    """Writes a NIfTI file, float data stored as integers gets scl_slope/inter."""
+    image = nibabel.Nifti1Image(data, np.eye(4))
+    if stored_dtype is not None:
+        image.set_data_dtype(stored_dtype)
+    nibabel.save(image, str(path))
+    return str(path)
+
+
+@pytest.fixture(params=[".nii", ".nii.gz"])
+def ext(request):
+    return request.param
+
+
+@pytest.mark.parametrize("scaled", [False, True])
+def test_stream_matches_nibabel(tmp_path, ext, scaled):
+    rng = np.random.default_rng(0)
+    data = rng.normal(100, 50, size=(9, 8, 7, 3)).astype(np.float32)
+    file = _save(tmp_path / ("image" + ext), data, np.int16 if scaled else None)
+    dataobj = nibabel.load(file).dataobj
+    assert (dataobj.slope, dataobj.inter) != (1.0, 0.0) or not scaled
+
+    stream = NiftiStream(file, chunk_bytes=100)
+    stream.run()
+    np.testing.assert_array_equal(stream.data, np.asarray(dataobj.get_unscaled()))
+    assert stream.scaling == (dataobj.slope, dataobj.inter)
+
+    image = load_image(file)
+    np.testing.assert_allclose(
+        image.apply_scaling(image.data), np.asarray(dataobj), rtol=1e-6, atol=1e-4
+    )
+
+
+def test_stream_timepoints(tmp_path, ext):
+    data = np.arange(6 * 5 * 4 * 3, dtype=np.int16).reshape(6, 5, 4, 3)
+    file = _save(tmp_path / ("image" + ext), data)
+    stream = NiftiStream(file, chunk_bytes=64).start()
+    np.testing.assert_array_equal(stream.timepoint(0), data[..., 0])
+    np.testing.assert_array_equal(stream.image().data, data)
+
+
+def test_segmentation_labels(tmp_path, ext):
+    rng = np.random.default_rng(1)
+    labels = rng.integers(0, 4, size=(10, 9, 8)).astype(np.uint8)
+    file = _save(tmp_path / ("labels" + ext), labels)
+    for sparse in (False, True):
+        image = load_image(file, is_segmentation=True, sparse=sparse)
+        np.testing.assert_array_equal(np.asarray(image.get_timepoint(0)), labels)
+        assert sorted(image.get_class_names().values()) == [0, 1, 2, 3]